@@ -0,0 +1,100 @@
+"""
+Benchmark aligning three year-long sensor series with different poll offsets and gaps on a common grid
+
+Checks the vectorised resampling against a plain Python loop on the first day. Run from the repo root:
+    python -m benchmark.bench_align [days] [interval]
+"""
+
+from datetime import datetime, timedelta
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmark.synthetic import SyntheticSensorDB
+from sensor_reading.align import FIELDS, align_columns, align_sensors, make_grid
+from sensor_reading.connection import connections
+from sensor_reading.epoch import to_epoch_ms
+from sensor_reading.storage import SensorStorage
+
+# Sensor id -> poll offset in seconds, polls don't line up between sources
+SENSOR_OFFSETS = {"bedroom": 0, "livingroom": 37, "outside": 81}
+N_GAPS = 50  # logging outages per sensor
+GAP_LENGTH = 3600  # in seconds
+
+
+def reference_linear(timestamps, values, grid, max_gap):
+    """Linear interpolation one grid point at a time"""
+    times = timestamps.astype("datetime64[ms]").astype(np.int64).tolist()
+    values = values.tolist()
+    resampled = []
+
+    i = 0
+    for grid_time in grid.astype(np.int64).tolist():
+        while (i < len(times)) and (times[i] < grid_time):
+            i += 1
+
+        if (i < len(times)) and (times[i] == grid_time):
+            resampled.append(values[i])
+        elif (0 < i < len(times)) and (times[i] - times[i - 1] <= max_gap * 1000):
+            weight = (grid_time - times[i - 1]) / (times[i] - times[i - 1])
+            resampled.append(values[i - 1] + weight * (values[i] - values[i - 1]))
+        else:
+            resampled.append(np.nan)
+
+    return np.array(resampled)
+
+
+if __name__ == "__main__":
+    days = float(sys.argv[1]) if len(sys.argv) > 1 else 365
+    interval = float(sys.argv[2]) if len(sys.argv) > 2 else 120
+    end_time = datetime(2024, 1, 1)
+    start_time = end_time - timedelta(days=days)
+    rng = np.random.default_rng(0)
+
+    with tempfile.TemporaryDirectory() as directory:
+        storage = SensorStorage(os.path.join(directory, "sensors.db"))
+        for seed, (sensor_id, offset) in enumerate(SENSOR_OFFSETS.items()):
+            SyntheticSensorDB(storage.database_filepath, sensor_id, seed).fill_history(
+                end_time + timedelta(seconds=offset), days
+            )
+
+            with connections.writer(storage.database_filepath) as conn:
+                for gap_start in rng.uniform(0, days * 24 * 3600, N_GAPS):
+                    gap_start = start_time + timedelta(seconds=float(gap_start))
+                    conn.execute(
+                        f"DELETE FROM {sensor_id} WHERE timestamp BETWEEN ? AND ?",
+                        (to_epoch_ms(gap_start), to_epoch_ms(gap_start + timedelta(seconds=GAP_LENGTH))),
+                    )
+
+        columns = storage.get_range_arrays(list(SENSOR_OFFSETS), start_time, end_time)
+        n_readings = sum(len(sensor_columns["timestamp"]) for sensor_columns in columns.values())
+        grid = make_grid(start_time, end_time, interval)
+        print(f"{n_readings} readings over {days} days, {len(grid)} grid points per sensor")
+
+        for method in ["previous", "nearest", "linear"]:
+            start = time.perf_counter()
+            aligned = align_columns(columns, grid, method)
+            elapsed = time.perf_counter() - start
+
+            gap_fraction = np.mean([aligned[sensor_id]["gap"].mean() for sensor_id in SENSOR_OFFSETS])
+            print(
+                f"{method:<10}{elapsed * 1e3:>10.1f} ms{n_readings / elapsed:>14.0f} readings/s   gaps {gap_fraction:.1%}"
+            )
+
+        start = time.perf_counter()
+        aligned = align_sensors(storage, list(SENSOR_OFFSETS), start_time, end_time, interval)
+        print(f"{'with query':<10}{(time.perf_counter() - start) * 1e3:>10.1f} ms")
+
+        # Vectorised result against the loop on the first day of one sensor
+        day_grid = grid[grid < grid[0] + np.timedelta64(1, "D")]
+        sensor_columns = columns["livingroom"]
+        for field in FIELDS:
+            expected = reference_linear(sensor_columns["timestamp"], sensor_columns[field], day_grid, 600)
+            actual = aligned["livingroom"][field][: len(day_grid)]
+            assert np.allclose(actual, expected, equal_nan=True), field
+        print("Matches reference interpolation")
+
+        connections.close_all()
@@ -0,0 +1,91 @@
+"""
+Benchmark database size and query latency before and after archiving closed months of multi-year history
+
+Run from the repo root:
+    python -m benchmark.bench_archive [years]
+"""
+
+from datetime import datetime, timedelta
+import os
+import sys
+import tempfile
+import time
+
+from benchmark.synthetic import SyntheticSensorDB
+from sensor_reading.archive import SensorArchive, archive_storage, vacuum
+from sensor_reading.connection import connections
+from sensor_reading.storage import SensorStorage
+
+SENSOR_IDS = ["bedroom", "livingroom", "outside"]
+N_REPEATS = 20
+
+
+def directory_size(directory):
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(directory) for f in files)
+
+
+def time_query(query):
+    """Best of N_REPEATS, in milliseconds"""
+    times = []
+    for _ in range(N_REPEATS):
+        start = time.perf_counter()
+        query()
+        times.append(time.perf_counter() - start)
+
+    return min(times) * 1e3
+
+
+def measure(storage, end_time):
+    old_week_start = end_time - timedelta(days=400)
+
+    return {
+        "latest": time_query(lambda: storage.get_latest(SENSOR_IDS)),
+        "last day raw": time_query(
+            lambda: storage.get_range_arrays(SENSOR_IDS, end_time - timedelta(days=1), end_time)
+        ),
+        "week a year ago raw": time_query(
+            lambda: storage.get_range_arrays(SENSOR_IDS, old_week_start, old_week_start + timedelta(days=7))
+        ),
+        "week a year ago 1m": time_query(
+            lambda: storage.get_range_arrays(SENSOR_IDS, old_week_start, old_week_start + timedelta(days=7), "1m")
+        ),
+        "all history 1d": time_query(
+            lambda: storage.get_range_arrays(SENSOR_IDS, end_time - timedelta(days=3650), end_time, "1d")
+        ),
+    }
+
+
+if __name__ == "__main__":
+    years = float(sys.argv[1]) if len(sys.argv) > 1 else 3
+    end_time = datetime.now()
+
+    with tempfile.TemporaryDirectory() as directory:
+        database_filepath = os.path.join(directory, "sensors.db")
+        archive = SensorArchive(os.path.join(directory, "archive"))
+
+        for seed, sensor_id in enumerate(SENSOR_IDS):
+            n_rows = SyntheticSensorDB(database_filepath, sensor_id, seed).fill_history(end_time, years * 365)
+        print(f"{len(SENSOR_IDS)} sensors x {n_rows} readings over {years} years")
+
+        connections.close_all()
+        storage = SensorStorage(database_filepath, archive)
+        size_before = os.path.getsize(database_filepath)
+        before = measure(storage, end_time)
+
+        start = time.perf_counter()
+        n_archived = sum(archive_storage(storage, archive, today=end_time).values())
+        vacuum(storage)
+        print(f"Archived {n_archived} readings in {time.perf_counter() - start:.1f} s")
+
+        # Fresh reader connections so the page cache of the old file isn't reused
+        connections.close_all()
+        size_after = os.path.getsize(database_filepath)
+        after = measure(storage, end_time)
+
+        print(f"{'':<24}{'before':>12}{'after':>12}")
+        print(f"{'sqlite (MB)':<24}{size_before / 1e6:>12.1f}{size_after / 1e6:>12.1f}")
+        print(f"{'archive (MB)':<24}{0:>12.1f}{directory_size(archive.archive_dir) / 1e6:>12.1f}")
+        for name in before:
+            print(f"{name + ' (ms)':<24}{before[name]:>12.2f}{after[name]:>12.2f}")
+
+        connections.close_all()
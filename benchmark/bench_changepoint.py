@@ -0,0 +1,113 @@
+"""
+Benchmark storage size and query latency of change-point mode against storing every reading
+
+Readings of an existing sensor table are replayed through the deadband filter into temporary databases. Without a
+database, Open-Meteo-like synthetic readings are used (values update every 15 min, polled every 2 min). Run from the
+repo root:
+    python -m benchmark.bench_changepoint [database sensor_id] [temperature deadband] [humidity deadband]
+"""
+
+from datetime import datetime, timedelta
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmark.synthetic import generate_history
+from sensor_reading.changepoint import filter_changes
+from sensor_reading.connection import connections
+from sensor_reading.storage import SensorStorage
+
+SENSOR_ID = "outside"
+SYNTHETIC_DAYS = 365
+UPDATE_INTERVAL = 900  # in seconds, how often Open-Meteo's current values change
+N_REPEATS = 10
+
+
+def synthetic_rows(days=SYNTHETIC_DAYS):
+    """Readings polled every 2 min from a source updating every 15 min, rounded like Open-Meteo"""
+    rows, _ = generate_history(datetime.now(), days)
+
+    current = None
+    for timestamp, temperature, humidity in rows:
+        if (current is None) or (timestamp - current[0]).total_seconds() >= UPDATE_INTERVAL:
+            current = (timestamp, round(temperature, 1), float(round(humidity)))
+
+        yield timestamp, current[1], current[2]
+
+
+def existing_rows(database_filepath, sensor_id):
+    storage = SensorStorage(database_filepath)
+    rows = storage.get_range([sensor_id], "0001-01-01", "9999-12-31")[sensor_id]
+
+    return [(datetime.fromisoformat(timestamp), temperature, humidity) for timestamp, temperature, humidity in rows]
+
+
+def store(directory, name, rows):
+    storage = SensorStorage(os.path.join(directory, f"{name}.db"))
+    storage.create_table(SENSOR_ID)
+    storage.insert(SENSOR_ID, rows)
+    with connections.writer(storage.database_filepath) as conn:
+        conn.execute("VACUUM")
+
+    return storage
+
+
+def time_query(storage, start_time, end_time):
+    """Best of N_REPEATS full range raw queries, in milliseconds"""
+    times = []
+    for _ in range(N_REPEATS):
+        start = time.perf_counter()
+        storage.get_range_arrays([SENSOR_ID], start_time, end_time)
+        times.append(time.perf_counter() - start)
+
+    return min(times) * 1e3
+
+
+def step_error(rows, stored_rows):
+    """Max difference between every reading and the step value reconstructed from the stored readings"""
+    timestamps = np.array([row[0] for row in rows], dtype="datetime64[ms]")
+    stored_timestamps = np.array([row[0] for row in stored_rows], dtype="datetime64[ms]")
+
+    source = np.searchsorted(stored_timestamps, timestamps, side="right") - 1
+    errors = []
+    for field in [1, 2]:
+        values = np.array([row[field] for row in rows], dtype=np.float64)
+        stored_values = np.array([row[field] for row in stored_rows], dtype=np.float64)
+        errors.append(np.nanmax(np.abs(values - stored_values[source])))
+
+    return errors
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2:
+        rows = existing_rows(sys.argv[1], sys.argv[2])
+        print(f"{sys.argv[1]} {sys.argv[2]}: {len(rows)} readings")
+    else:
+        rows = list(synthetic_rows())
+        print(f"Synthetic Open-Meteo readings: {len(rows)} over {SYNTHETIC_DAYS} days")
+
+    deadband = {
+        "temperature": float(sys.argv[3]) if len(sys.argv) > 3 else 0.0,
+        "humidity": float(sys.argv[4]) if len(sys.argv) > 4 else 0.0,
+    }
+    stored_rows = list(filter_changes(rows, deadband))
+    start_time, end_time = rows[0][0] - timedelta(days=1), rows[-1][0] + timedelta(days=1)
+
+    with tempfile.TemporaryDirectory() as directory:
+        full = store(directory, "full", rows)
+        changes = store(directory, "changes", stored_rows)
+
+        print(f"{'':<16}{'readings':>12}{'size (MB)':>12}{'query (ms)':>12}")
+        for name, storage, n_rows in [("every reading", full, len(rows)), ("change points", changes, len(stored_rows))]:
+            print(
+                f"{name:<16}{n_rows:>12}{os.path.getsize(storage.database_filepath) / 1e6:>12.2f}"
+                f"{time_query(storage, start_time, end_time):>12.2f}"
+            )
+
+        temperature_error, humidity_error = step_error(rows, stored_rows)
+        print(f"Deadband {deadband}, max step reconstruction error {temperature_error} °C {humidity_error} %")
+
+        connections.close_all()
@@ -0,0 +1,76 @@
+"""
+Benchmark memory, latency and callback payload of the row-tuple and columnar NumPy figure paths on a 1M-row range
+
+Payloads are the figure JSON Dash sends, with downsampling and rollups off so every row is plotted.
+
+Run from the repo root:
+    python -m benchmark.bench_columns [n_rows]
+"""
+
+from datetime import datetime, timedelta
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from plotly.io.json import to_json_plotly
+
+from benchmark.synthetic import SAMPLE_INTERVAL, SyntheticSensorDB
+from db_plot import PlotlyLiveServer
+from sensor_reading.storage import SensorStorage
+
+SENSOR_ID = "bedroom"
+
+
+def rows_path(server, start_time, end_time):
+    """Original path, tuples from fetchall turned into lists with two comprehensions and put in the figure dict"""
+    rows = server.storage.get_range([SENSOR_ID], start_time, end_time)[SENSOR_ID]
+    trace = dict(server.trace_templates[0], x=[row[0] for row in rows], y=[row[1] for row in rows])
+    return {"data": [trace], "layout": server.layout}
+
+
+def arrays_path(server, start_time, end_time):
+    return server.get_updated_figure(start_time, end_time)
+
+
+def measure(path, server, start_time, end_time):
+    tracemalloc.start()
+    start = time.perf_counter()
+    figure = path(server, start_time, end_time)
+    query_time = time.perf_counter() - start
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    # Serialising happens outside tracemalloc, it slows allocations down a lot. Dash serialises callback outputs with
+    # to_json_plotly.
+    start = time.perf_counter()
+    payload = to_json_plotly(figure)
+    serialise_time = time.perf_counter() - start
+
+    return len(figure["data"][0]["x"]), query_time, serialise_time, peak_memory, len(payload)
+
+
+if __name__ == "__main__":
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    days = n_rows * SAMPLE_INTERVAL / (24 * 3600)
+    end_time = datetime.now()
+
+    with tempfile.TemporaryDirectory() as directory:
+        server = PlotlyLiveServer()
+        server.storage = SensorStorage(os.path.join(directory, "sensors.db"))
+        SyntheticSensorDB(server.storage.database_filepath, SENSOR_ID).fill_history(end_time, days)
+
+        # Plot every raw row of the one sensor
+        server.sensor_ids, server.step_sensor_ids = [SENSOR_ID], []
+        server.max_points, server.target_points = None, float("inf")
+
+        start_time, end_time = end_time - timedelta(days=days + 1), end_time + timedelta(days=1)
+
+        print(f"{'path':<8}{'rows':>10}{'query (s)':>12}{'to_json (s)':>14}{'peak MB':>10}{'payload MB':>12}")
+        for label, path in [("rows", rows_path), ("arrays", arrays_path)]:
+            n, query_time, serialise_time, peak_memory, payload_size = measure(path, server, start_time, end_time)
+            print(
+                f"{label:<8}{n:>10}{query_time:>12.2f}{serialise_time:>14.2f}"
+                f"{peak_memory / 1e6:>10.1f}{payload_size / 1e6:>12.1f}"
+            )
@@ -0,0 +1,59 @@
+"""
+Benchmark payload size and callback latency of PlotlyLiveServer.get_updated_figure with and without downsampling
+
+Run from the repo root:
+    python -m benchmark.bench_downsample
+"""
+
+from datetime import datetime, timedelta
+import os
+import tempfile
+import time
+
+import plotly
+
+from db_plot import PlotlyLiveServer
+from benchmark.synthetic import SyntheticSensorDB
+from sensor_reading.storage import SensorStorage
+
+RANGES = {"1 day": 1, "1 month": 30, "1 year": 365}
+REPEATS = 3
+
+
+def build_server(directory, days, end_time):
+    server = PlotlyLiveServer()
+    server.storage = SensorStorage(os.path.join(directory, "sensors.db"))
+
+    for seed, sensor_id in enumerate(server.sensor_ids):
+        SyntheticSensorDB(server.storage.database_filepath, sensor_id, seed).fill_history(end_time, days)
+
+    return server
+
+
+def time_callback(server, start_date, end_date):
+    best_time = float("inf")
+    for _ in range(REPEATS):
+        start_time = time.perf_counter()
+        fig = server.get_updated_figure(start_date, end_date)
+        payload = plotly.io.to_json(fig, validate=False)
+        best_time = min(best_time, time.perf_counter() - start_time)
+
+    return best_time, len(payload), sum(len(trace["x"]) for trace in fig["data"])
+
+
+if __name__ == "__main__":
+    end_time = datetime.now()
+
+    print(f"{'range':<10}{'mode':<14}{'points':>10}{'payload (kB)':>16}{'latency (ms)':>16}")
+    for label, days in RANGES.items():
+        with tempfile.TemporaryDirectory() as directory:
+            server = build_server(directory, days, end_time)
+            start_date = (end_time - timedelta(days=days + 1)).date()
+            end_date = (end_time + timedelta(days=1)).date()
+
+            for mode, max_points, method in [("raw", None, "lttb"), ("lttb", 2000, "lttb"), ("minmax", 2000, "minmax")]:
+                server.max_points = max_points
+                server.downsample_method = method
+                latency, payload_size, n_points = time_callback(server, start_date, end_date)
+
+                print(f"{label:<10}{mode:<14}{n_points:>10}{payload_size / 1e3:>16.1f}{latency * 1e3:>16.1f}")
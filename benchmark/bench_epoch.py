@@ -0,0 +1,165 @@
+"""
+Benchmark range queries on UTC epoch millisecond timestamps against the local time text timestamps they replaced
+
+The same synthetic history is stored both ways. Text tables are queried like before the epoch migration, with date
+bounds compared as strings and timestamps converted with julianday per row, then migrated in place to time the
+conversion. Run from the repo root:
+    python -m benchmark.bench_epoch [years]
+"""
+
+from datetime import datetime, timedelta
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmark.synthetic import SENSOR_PROFILES, fill_database
+from sensor_reading.connection import connections
+from sensor_reading.epoch import LOCAL_ISO_SQL, to_epoch_ms
+from sensor_reading.rollup import FIELDS, RESOLUTIONS, rollup_table
+from sensor_reading.schema import migrate
+from sensor_reading.storage import SensorStorage
+
+SENSOR_IDS = list(SENSOR_PROFILES)
+RANGES = {"1 day": 1, "1 week": 7, "1 month": 30, "1 year": 365}
+N_REPEATS = 7
+
+# Query of get_range_arrays on text timestamps
+TEXT_TIMESTAMP_SQL = "CAST(round((julianday(timestamp) - 2440587.5) * 86400000) AS INTEGER)"
+TEXT_RANGE_SQL = f"SELECT {TEXT_TIMESTAMP_SQL}, temperature, humidity FROM {{table}} WHERE timestamp BETWEEN ? AND ?"
+
+# Same filter and timestamp conversion aggregated in sqlite, the query cost without building Python rows
+TEXT_SCAN_SQL = f"SELECT count(*), sum({TEXT_TIMESTAMP_SQL}) FROM {{table}} WHERE timestamp BETWEEN ? AND ?"
+EPOCH_SCAN_SQL = "SELECT count(*), sum(timestamp) FROM {table} WHERE timestamp BETWEEN ? AND ?"
+
+
+def create_text_db(epoch_filepath, text_filepath):
+    """Copy an epoch database into tables with local time text timestamps and rollup buckets, schema version 2"""
+    conn = sqlite3.connect(text_filepath)
+    conn.execute("ATTACH DATABASE ? AS epoch", (epoch_filepath,))
+    rollup_names = [f"{field}_{name}" for field in FIELDS for name in ["min", "max", "sum"]] + ["count"]
+    rollup_columns = ", ".join(f"{name} {'integer' if name == 'count' else 'real'}" for name in rollup_names)
+
+    for sensor_id in SENSOR_IDS:
+        conn.execute(
+            f"CREATE TABLE {sensor_id} (timestamp datetime PRIMARY KEY, temperature real, humidity real) WITHOUT ROWID"
+        )
+        conn.execute(
+            f"INSERT INTO {sensor_id} SELECT strftime('%Y-%m-%d %H:%M:%S', timestamp / 1000, 'unixepoch', "
+            f"'localtime'), temperature, humidity FROM epoch.{sensor_id}"
+        )
+
+        for resolution in RESOLUTIONS:
+            table = rollup_table(resolution, sensor_id)
+            conn.execute(f"CREATE TABLE {table} (bucket datetime PRIMARY KEY, {rollup_columns}) WITHOUT ROWID")
+            # Text buckets had no milliseconds
+            conn.execute(
+                f"INSERT INTO {table} SELECT substr({LOCAL_ISO_SQL.format(column='bucket')}, 1, 19), "
+                f"{', '.join(rollup_names)} FROM epoch.{table}"
+            )
+
+    conn.execute("CREATE TABLE schema_versions (table_name text PRIMARY KEY, version integer)")
+    conn.executemany("INSERT INTO schema_versions VALUES (?, 2)", [(sensor_id,) for sensor_id in SENSOR_IDS])
+    conn.commit()
+    conn.execute("DETACH DATABASE epoch")
+    conn.execute("VACUUM")
+    conn.close()
+
+
+def text_range_arrays(conn, start_date, end_date):
+    results = {}
+    for sensor_id in SENSOR_IDS:
+        rows = conn.execute(TEXT_RANGE_SQL.format(table=sensor_id), (start_date, end_date)).fetchall()
+        data = np.array(rows, dtype=[("timestamp", "i8"), ("temperature", "f8"), ("humidity", "f8")])
+        results[sensor_id] = data["timestamp"].astype("datetime64[ms]")
+
+    return results
+
+
+def scan(conn, statement, start, end):
+    return [conn.execute(statement.format(table=sensor_id), (start, end)).fetchone() for sensor_id in SENSOR_IDS]
+
+
+def median_ms(function):
+    times = []
+    for _ in range(N_REPEATS):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+
+    return sorted(times)[len(times) // 2] * 1e3, result
+
+
+if __name__ == "__main__":
+    years = float(sys.argv[1]) if len(sys.argv) > 1 else 3
+    # Whole seconds so text timestamps hold the same times
+    end_time = datetime.now().replace(microsecond=0)
+
+    with tempfile.TemporaryDirectory() as directory:
+        epoch_filepath = os.path.join(directory, "epoch.db")
+        text_filepath = os.path.join(directory, "text.db")
+
+        n_rows = sum(fill_database(epoch_filepath, end_time, years * 365).values())
+        with connections.writer(epoch_filepath) as conn:
+            conn.execute("VACUUM")
+        create_text_db(epoch_filepath, text_filepath)
+        print(f"{len(SENSOR_IDS)} sensors, {n_rows} readings over {years} years")
+
+        storage = SensorStorage(epoch_filepath)
+        epoch_conn = connections.reader(epoch_filepath)
+        text_conn = sqlite3.connect(text_filepath)
+
+        print(f"{'':<20}{'sqlite scan (ms)':^30}{'get_range_arrays (ms)':^30}")
+        print(f"{'range':<10}{'rows':>10}" + f"{'text':>10}{'epoch':>10}{'speedup':>10}" * 2)
+        for label, days in RANGES.items():
+            start_date = (end_time - timedelta(days=days)).date()
+            end_date = (end_time + timedelta(days=1)).date()
+            start_ms, end_ms = to_epoch_ms(start_date), to_epoch_ms(end_date)
+
+            text_scan, _ = median_ms(lambda: scan(text_conn, TEXT_SCAN_SQL, start_date, end_date))
+            epoch_scan, _ = median_ms(lambda: scan(epoch_conn, EPOCH_SCAN_SQL, start_ms, end_ms))
+            text_time, text_result = median_ms(lambda: text_range_arrays(text_conn, start_date, end_date))
+            epoch_time, epoch_result = median_ms(lambda: storage.get_range_arrays(SENSOR_IDS, start_date, end_date))
+
+            for sensor_id in SENSOR_IDS:
+                # Text timestamps were local times converted as if they were UTC
+                assert np.array_equal(text_result[sensor_id], epoch_result[sensor_id]["timestamp"]), sensor_id
+
+            n = sum(len(timestamps) for timestamps in text_result.values())
+            print(
+                f"{label:<10}{n:>10}{text_scan:>10.2f}{epoch_scan:>10.2f}{text_scan / epoch_scan:>9.1f}x"
+                f"{text_time:>10.2f}{epoch_time:>10.2f}{text_time / epoch_time:>9.1f}x"
+            )
+
+        text_conn.close()
+        size_before = os.path.getsize(text_filepath)
+
+        # In place conversion of the text database
+        conn = sqlite3.connect(text_filepath)
+        start = time.perf_counter()
+        for sensor_id in SENSOR_IDS:
+            migrate(conn, sensor_id)
+        migrate_time = time.perf_counter() - start
+        conn.execute("VACUUM")
+        conn.close()
+
+        print(
+            f"Migration of {n_rows} readings took {migrate_time:.2f} s, "
+            f"{size_before / 1e6:.1f} MB -> {os.path.getsize(text_filepath) / 1e6:.1f} MB"
+        )
+
+        migrated = SensorStorage(text_filepath)
+        start_date, end_date = (end_time - timedelta(days=30)).date(), (end_time + timedelta(days=1)).date()
+        assert all(
+            np.array_equal(migrated_columns["timestamp"], columns["timestamp"])
+            for migrated_columns, columns in zip(
+                migrated.get_range_arrays(SENSOR_IDS, start_date, end_date).values(),
+                storage.get_range_arrays(SENSOR_IDS, start_date, end_date).values(),
+            )
+        )
+        print("Migrated readings match")
+
+        connections.close_all()
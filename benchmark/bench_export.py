@@ -0,0 +1,100 @@
+"""
+Benchmark peak RSS and throughput of the streaming export against building the whole export in memory
+
+Linux only, RSS is sampled from /proc/self/statm. Database pages read through sqlite's mmap count towards RSS up to
+connection.PRAGMAS mmap_size, so the first export includes them. Run from the repo root:
+    python -m benchmark.bench_export [n_rows per sensor]
+"""
+
+from datetime import datetime, timedelta
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from benchmark.synthetic import SAMPLE_INTERVAL, SyntheticSensorDB
+from export import export_chunks
+from sensor_reading.connection import connections
+from sensor_reading.storage import SensorStorage
+
+SENSOR_IDS = ["bedroom", "livingroom", "outside"]
+RSS_SAMPLE_INTERVAL = 0.005  # in seconds
+
+
+def rss_bytes():
+    with open("/proc/self/statm") as fileread:
+        return int(fileread.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+class PeakRSS:
+    """Sample RSS on a background thread while the block runs"""
+
+    def __enter__(self):
+        self.baseline = rss_bytes()
+        self.peak = self.baseline
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def _sample(self):
+        while not self._stop.wait(RSS_SAMPLE_INTERVAL):
+            self.peak = max(self.peak, rss_bytes())
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, rss_bytes())
+
+
+def streaming_export(storage, start_time, end_time, gzip):
+    n_bytes = 0
+    for chunk in export_chunks(storage, SENSOR_IDS, start_time, end_time, "csv", gzip=gzip):
+        n_bytes += len(chunk)
+
+    return n_bytes
+
+
+def in_memory_export(storage, start_time, end_time):
+    """Everything fetched at once and joined into one body, what a non-streaming route would do"""
+    results = storage.get_range(SENSOR_IDS, start_time, end_time)
+    body = "sensor_id,timestamp,temperature,humidity\n" + "".join(
+        f"{sensor_id},{timestamp},{temperature},{humidity}\n"
+        for sensor_id, rows in results.items()
+        for timestamp, temperature, humidity in rows
+    )
+
+    return len(body.encode())
+
+
+if __name__ == "__main__":
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    days = n_rows * SAMPLE_INTERVAL / (24 * 3600)
+    end_time = datetime.now()
+    start_time = end_time - timedelta(days=days + 1)
+
+    with tempfile.TemporaryDirectory() as directory:
+        storage = SensorStorage(os.path.join(directory, "sensors.db"))
+        for seed, sensor_id in enumerate(SENSOR_IDS):
+            SyntheticSensorDB(storage.database_filepath, sensor_id, seed).fill_history(end_time, days)
+        print(f"Exporting {len(SENSOR_IDS)} sensors x {n_rows} rows")
+
+        print(f"{'':<16}{'time (s)':>10}{'rows/s':>12}{'size (MB)':>12}{'peak RSS (MB)':>16}")
+        # Streaming runs first, freed memory isn't always returned to the OS so later runs would look smaller
+        for name, export in [
+            ("stream csv", lambda: streaming_export(storage, start_time, end_time, False)),
+            ("stream csv.gz", lambda: streaming_export(storage, start_time, end_time, True)),
+            ("in memory csv", lambda: in_memory_export(storage, start_time, end_time)),
+        ]:
+            with PeakRSS() as rss:
+                start = time.perf_counter()
+                n_bytes = export()
+                elapsed = time.perf_counter() - start
+
+            print(
+                f"{name:<16}{elapsed:>10.2f}{len(SENSOR_IDS) * n_rows / elapsed:>12.0f}{n_bytes / 1e6:>12.1f}"
+                f"{(rss.peak - rss.baseline) / 1e6:>16.1f}"
+            )
+
+        connections.close_all()
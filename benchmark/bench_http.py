@@ -0,0 +1,57 @@
+"""
+Benchmark per-poll HTTP latency with a new connection per request versus the shared keep-alive HTTPClient
+
+Uses the local stub server, connect_latency stands in for the TCP + TLS handshake to the real APIs.
+Run from the repo root:
+    python -m benchmark.bench_http [n_requests]
+"""
+
+import statistics
+import sys
+import time
+
+import requests
+
+from benchmark.stub_server import FORECAST_PATH, start_stub_server
+from sensor_reading.http_client import HTTPClient
+
+CONNECT_LATENCY = 0.05  # in seconds, typical TLS handshake to a public API
+LATENCY = 0.005  # in seconds, server processing time
+
+
+def time_requests(get_json, url, n_requests):
+    latencies = []
+    for _ in range(n_requests):
+        start_time = time.perf_counter()
+        get_json(url)
+        latencies.append(time.perf_counter() - start_time)
+
+    return latencies
+
+
+def get_json_new_connection(url):
+    # Original behaviour: new connection per call and the body parsed twice
+    response = requests.get(url)
+    response.json()
+    return response.json()
+
+
+if __name__ == "__main__":
+    n_requests = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    server, base_url = start_stub_server(latency=LATENCY, connect_latency=CONNECT_LATENCY)
+    url = base_url + FORECAST_PATH
+
+    client = HTTPClient()
+    results = {}
+    for label, get_json in [("requests.get", get_json_new_connection), ("HTTPClient", client.get_json)]:
+        n_connections = server.n_connections
+        latencies = time_requests(get_json, url, n_requests)
+        results[label] = (latencies, server.n_connections - n_connections)
+
+    server.shutdown()
+    client.close()
+
+    print(f"{'client':<16}{'connections':>12}{'mean (ms)':>12}{'p95 (ms)':>12}")
+    for label, (latencies, n_connections) in results.items():
+        p95 = statistics.quantiles(latencies, n=20)[-1]
+        print(f"{label:<16}{n_connections:>12}{statistics.mean(latencies) * 1e3:>12.1f}{p95 * 1e3:>12.1f}")
@@ -0,0 +1,64 @@
+"""
+Measure cold-start import time of each entry point with python -X importtime
+
+Each entry point is imported in a fresh interpreter. Self times of every imported module are summed per top-level
+package, the total is the sum over all packages. Run
+from the repo root:
+    python -m benchmark.bench_importtime [n_runs]
+"""
+
+import statistics
+import subprocess
+import sys
+
+ENTRY_POINTS = {
+    "logger": "import save_data",
+    "dashboard": "import db_plot",
+    "storage cli": "import sensor_reading.storage",
+    "schema cli": "import sensor_reading.schema",
+    "archive cli": "import sensor_reading.archive",
+}
+N_TOP_PACKAGES = 5
+
+
+def import_times(statement, startup_modules=()):
+    """
+    Get top-level package -> import time in microseconds of a statement run in a fresh interpreter
+
+    Modules in startup_modules are left out, every entry point pays for those when the interpreter starts
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement], capture_output=True, text=True, check=True
+    )
+
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+
+        self_time, _, name = line[len("import time:") :].split("|")
+        name = name.strip()
+        if name not in startup_modules:
+            package = name.split(".")[0]
+            times[package] = times.get(package, 0) + int(self_time)
+
+    return times
+
+
+if __name__ == "__main__":
+    n_runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "pass"], capture_output=True, text=True)
+    startup_modules = {line.split("|")[2].strip() for line in result.stderr.splitlines()[1:]}
+
+    print(f"{'entry point':<14}{'import (ms)':>12}   slowest packages (ms)")
+    for name, statement in ENTRY_POINTS.items():
+        runs = [import_times(statement, startup_modules) for _ in range(n_runs)]
+        totals = [sum(times.values()) / 1e3 for times in runs]
+
+        # Median run by total
+        times = runs[totals.index(statistics.median_low(totals))]
+        slowest = sorted(times.items(), key=lambda item: item[1], reverse=True)[:N_TOP_PACKAGES]
+        print(
+            f"{name:<14}{statistics.median_low(totals):>12.1f}   "
+            + ", ".join(f"{package} {time / 1e3:.0f}" for package, time in slowest)
+        )
@@ -0,0 +1,95 @@
+"""
+Benchmark poll latency while the sensor database is slow, writing readings from the poller versus publishing them to
+the ingest queue for a storage worker process
+
+A background thread holds the database's write lock for LOCK_HOLD seconds every LOCK_PERIOD seconds, standing in for
+a slow SD card, a WAL checkpoint or an archive run. Run from the repo root:
+    python -m benchmark.bench_ingest [n_readings]
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+from benchmark.synthetic import SyntheticSensorDB
+from sensor_reading.connection import connections
+from sensor_reading.ingest import IngestQueue, StorageWorkerProcess
+
+POLL_INTERVAL = 0.005  # in seconds
+LOCK_HOLD = 0.5  # in seconds
+LOCK_PERIOD = 1.0  # in seconds
+BATCH_SIZE = 30
+
+
+def hold_write_lock(database_filepath, stop_event):
+    conn = sqlite3.connect(database_filepath, isolation_level=None)
+    while not stop_event.wait(LOCK_PERIOD - LOCK_HOLD):
+        conn.execute("BEGIN IMMEDIATE")
+        time.sleep(LOCK_HOLD)
+        conn.execute("COMMIT")
+
+    conn.close()
+
+
+def poll_latencies(sensor_db, n_readings):
+    stop_event = threading.Event()
+    locker = threading.Thread(target=hold_write_lock, args=(sensor_db.database_filepath, stop_event))
+    locker.start()
+
+    latencies = []
+    for _ in range(n_readings):
+        start_time = time.perf_counter()
+        sensor_db.get_new_reading()
+        latencies.append(time.perf_counter() - start_time)
+        time.sleep(POLL_INTERVAL)
+
+    stop_event.set()
+    locker.join()
+    sensor_db.close()
+
+    return sorted(latencies)
+
+
+def print_latencies(name, latencies, n_stored):
+    p50, p99 = latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+    print(f"{name:<12}{p50 * 1e3:>10.2f}{p99 * 1e3:>10.2f}{latencies[-1] * 1e3:>10.2f}{n_stored:>10}")
+
+
+def count_stored(database_filepath, sensor_id):
+    with sqlite3.connect(database_filepath) as conn:
+        return conn.execute(f"SELECT count(*) FROM {sensor_id}").fetchone()[0]
+
+
+if __name__ == "__main__":
+    n_readings = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"{n_readings} polls, write lock held {LOCK_HOLD} s every {LOCK_PERIOD} s")
+        print(f"{'':<12}{'p50 (ms)':>10}{'p99 (ms)':>10}{'max (ms)':>10}{'stored':>10}")
+
+        for name, batch_size in [("direct", 1), ("buffered", BATCH_SIZE)]:
+            database_filepath = os.path.join(directory, f"{name}.db")
+            sensor_db = SyntheticSensorDB(database_filepath)
+            sensor_db.configure_write_buffer(batch_size, flush_interval=60)
+
+            latencies = poll_latencies(sensor_db, n_readings)
+            print_latencies(name, latencies, count_stored(database_filepath, sensor_db.sensor_id))
+
+        database_filepath = os.path.join(directory, "queued.db")
+        queue_filepath = os.path.join(directory, "ingest_queue.db")
+        storage_worker = StorageWorkerProcess(
+            queue_filepath, database_filepath, BATCH_SIZE, metrics_filepath=os.path.join(directory, "metrics.prom")
+        )
+        storage_worker.start()
+
+        sensor_db = SyntheticSensorDB(database_filepath)
+        sensor_db.configure_ingest_queue(IngestQueue(queue_filepath))
+        latencies = poll_latencies(sensor_db, n_readings)
+
+        storage_worker.stop()
+        print_latencies("queued", latencies, count_stored(database_filepath, sensor_db.sensor_id))
+
+        connections.close_all()
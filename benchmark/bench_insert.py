@@ -0,0 +1,45 @@
+"""
+Benchmark inserts per second with a commit per reading versus batched commits from the write buffer
+
+Run from the repo root:
+    python -m benchmark.bench_insert [n_readings]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from benchmark.synthetic import SyntheticSensorDB
+from sensor_reading.connection import PRAGMAS, connections
+
+BATCH_SIZES = [1, 10, 100, 1000]
+
+
+def inserts_per_second(database_filepath, batch_size, n_readings):
+    sensor_db = SyntheticSensorDB(database_filepath)
+    sensor_db.configure_write_buffer(batch_size, flush_interval=60)
+
+    start_time = time.perf_counter()
+    for _ in range(n_readings):
+        sensor_db.get_new_reading()
+    sensor_db.close()
+
+    return n_readings / (time.perf_counter() - start_time)
+
+
+if __name__ == "__main__":
+    n_readings = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    print(f"{'synchronous':<14}{'batch size':>12}{'inserts/s':>14}")
+    for synchronous in ["NORMAL", "FULL"]:
+        # FULL fsyncs every commit, closest to the SD card worst case
+        connections.pragmas = {**PRAGMAS, "synchronous": synchronous}
+
+        with tempfile.TemporaryDirectory() as directory:
+            for batch_size in BATCH_SIZES:
+                database_filepath = os.path.join(directory, f"batch_{batch_size}.db")
+                rate = inserts_per_second(database_filepath, batch_size, n_readings)
+                print(f"{synchronous:<14}{batch_size:>12}{rate:>14.0f}")
+
+            connections.close_all()
@@ -0,0 +1,79 @@
+"""
+Benchmark range-query and latest-row latency before and after the schema migration
+
+Run from the repo root:
+    python -m benchmark.bench_schema [days]
+"""
+
+from datetime import datetime, timedelta
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+from benchmark.synthetic import generate_history
+from sensor_reading.epoch import to_epoch_ms
+from sensor_reading.schema import migrate
+
+REPEATS = 5
+
+
+def create_legacy_db(database_filepath, days, end_time):
+    """Create a db with the original unindexed table and fill it with synthetic readings"""
+    rows, n_rows = generate_history(end_time, days)
+
+    conn = sqlite3.connect(database_filepath)
+    conn.execute("CREATE TABLE data (timestamp datetime, temperature real, humidity real)")
+    conn.executemany("INSERT INTO data (timestamp, temperature, humidity) VALUES (?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+
+    return n_rows
+
+
+def best_of(conn, query, params=()):
+    best_time = float("inf")
+    for _ in range(REPEATS):
+        start_time = time.perf_counter()
+        conn.execute(query, params).fetchall()
+        best_time = min(best_time, time.perf_counter() - start_time)
+
+    return best_time
+
+
+def run_queries(database_filepath, range_params):
+    conn = sqlite3.connect(database_filepath)
+
+    results = {
+        "range (2 days)": best_of(conn, "SELECT * FROM data WHERE timestamp BETWEEN ? AND ?", range_params),
+        "latest row": best_of(conn, "SELECT * FROM data ORDER BY timestamp DESC LIMIT 1"),
+    }
+    conn.close()
+
+    return results
+
+
+if __name__ == "__main__":
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 3650
+    end_time = datetime.now()
+
+    with tempfile.TemporaryDirectory() as directory:
+        database_filepath = os.path.join(directory, "legacy.db")
+        n_rows = create_legacy_db(database_filepath, days, end_time)
+        range_params = ((end_time - timedelta(days=1)).date(), (end_time + timedelta(days=1)).date())
+        before = run_queries(database_filepath, range_params)
+
+        conn = sqlite3.connect(database_filepath)
+        start_time = time.perf_counter()
+        migrate(conn)
+        migrate_time = time.perf_counter() - start_time
+        conn.close()
+
+        # Migrated tables are keyed on epoch milliseconds
+        after = run_queries(database_filepath, tuple(to_epoch_ms(value) for value in range_params))
+
+    print(f"{n_rows} rows, migration took {migrate_time:.2f} s")
+    print(f"{'query':<18}{'before (ms)':>14}{'after (ms)':>14}")
+    for query in before:
+        print(f"{query:<18}{before[query] * 1e3:>14.2f}{after[query] * 1e3:>14.2f}")
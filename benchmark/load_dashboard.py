@@ -0,0 +1,84 @@
+"""
+Load test the dashboard callbacks over HTTP, reports requests per second and p95 latency per callback
+
+Start the dashboard first, e.g. gunicorn -c gunicorn.conf.py wsgi:server, then from the repo root:
+    python -m benchmark.load_dashboard http://192.168.1.43:8050 [n_threads] [n_requests]
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+import statistics
+import sys
+import threading
+import time
+
+import requests
+
+# Request bodies Dash's renderer sends to /_dash-update-component for each callback
+CALLBACKS = {
+    "update_graph_live": {
+        "output": "current-temperature.children",
+        "outputs": {"id": "current-temperature", "property": "children"},
+        "inputs": [{"id": "interval-component", "property": "n_intervals", "value": 1}],
+        "changedPropIds": ["interval-component.n_intervals"],
+        "state": [],
+    },
+    "update_output": {
+        "output": "..live-update-graph.figure...live-tail-timestamps.data..",
+        "outputs": [
+            {"id": "live-update-graph", "property": "figure"},
+            {"id": "live-tail-timestamps", "property": "data"},
+        ],
+        "inputs": [
+            {"id": "my-date-picker-range", "property": "start_date", "value": None},
+            {"id": "my-date-picker-range", "property": "end_date", "value": None},
+        ],
+        "changedPropIds": ["my-date-picker-range.start_date"],
+        "state": [],
+    },
+}
+
+_local = threading.local()
+
+
+def post_callback(url, body):
+    if not hasattr(_local, "session"):
+        _local.session = requests.Session()
+
+    start_time = time.perf_counter()
+    response = _local.session.post(url, json=body, headers={"Accept-Encoding": "gzip"})
+    latency = time.perf_counter() - start_time
+
+    return latency, response.status_code, len(response.content)
+
+
+def run(base_url, name, body, n_threads, n_requests):
+    url = base_url.rstrip("/") + "/_dash-update-component"
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=n_threads) as executor:
+        results = list(executor.map(lambda _: post_callback(url, body), range(n_requests)))
+    elapsed = time.perf_counter() - start_time
+
+    latencies = [latency for latency, _, _ in results]
+    n_errors = sum(status != 200 for _, status, _ in results)
+    p95 = statistics.quantiles(latencies, n=20)[-1]
+    print(
+        f"{name:<20}{n_requests / elapsed:>10.1f}{statistics.mean(latencies) * 1e3:>12.1f}{p95 * 1e3:>12.1f}"
+        f"{results[0][2] / 1e3:>14.1f}{n_errors:>8}"
+    )
+
+
+if __name__ == "__main__":
+    base_url = sys.argv[1] if len(sys.argv) > 1 else "http://192.168.1.43:8050"
+    n_threads = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    n_requests = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+
+    # Same default range as the date picker
+    date_range = CALLBACKS["update_output"]["inputs"]
+    date_range[0]["value"] = str(date.today() - timedelta(days=1))
+    date_range[1]["value"] = str(date.today() + timedelta(days=1))
+
+    print(f"{'callback':<20}{'req/s':>10}{'mean (ms)':>12}{'p95 (ms)':>12}{'body (kB)':>14}{'errors':>8}")
+    for name, body in CALLBACKS.items():
+        run(base_url, name, body, n_threads, n_requests)
@@ -0,0 +1,56 @@
+"""
+Load test concurrent date-range figure requests against one PlotlyLiveServer
+
+Every request's figure is checked against the figure built for the same range on its own, so mixed up trace data
+from shared state shows up as a failure. Run from the repo root:
+    python -m benchmark.load_figures [n_threads] [n_requests]
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmark.bench_downsample import build_server
+
+HISTORY_DAYS = 240
+
+
+def figure_signature(figure):
+    """Trace lengths, timestamp checksums and encoded temperatures, enough to tell figures for different ranges apart"""
+    return [
+        (len(trace["x"]), np.asarray(trace["x"]).astype("datetime64[ms]").astype(np.int64).sum(), trace["y"]["bdata"])
+        for trace in figure["data"]
+    ]
+
+
+if __name__ == "__main__":
+    n_threads = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    n_requests = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    end_time = datetime.now()
+
+    with tempfile.TemporaryDirectory() as directory:
+        server = build_server(directory, HISTORY_DAYS, end_time)
+
+        # Spans of 1 to 15 days are served from the 1 minute rollup and 60 to 118 days from the 1 hour rollup, so
+        # concurrent requests mix resolutions. Date ranges are whole days so never need raw data, 1 day needs years.
+        ranges = [
+            ((end_time - timedelta(days=days)).date(), (end_time - timedelta(days=days // 2)).date())
+            for days in list(range(2, 32)) + list(range(120, 240, 4))
+        ]
+        expected = {date_range: figure_signature(server.get_updated_figure(*date_range)) for date_range in ranges}
+
+        def request(i):
+            date_range = ranges[i % len(ranges)]
+            return figure_signature(server.get_updated_figure(*date_range)) == expected[date_range]
+
+        start_time = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=n_threads) as executor:
+            results = list(executor.map(request, range(n_requests)))
+        elapsed = time.perf_counter() - start_time
+
+    print(f"{n_requests} requests on {n_threads} threads: {n_requests / elapsed:.1f} requests/s")
+    print(f"{results.count(False)} incorrect figures")
@@ -0,0 +1,120 @@
+"""
+Local stub of the Open-Meteo, Nest device and Google OAuth endpoints for offline benchmarks and tests
+
+Run standalone from the repo root:
+    python -m benchmark.stub_server [port]
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import sys
+import threading
+import time
+
+FORECAST_PATH = "/v1/forecast"
+DEVICES_PATH = "/v1/enterprises/stub/devices"
+TOKEN_PATH = "/oauth2/v4/token"
+
+TOKEN_EXPIRES_IN = 3599  # in seconds, same as Google OAuth access tokens
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Keep-alive JSON handler, connect_latency is added once per new connection to stand in for the TLS handshake
+    """
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        self.server.n_connections += 1
+        time.sleep(self.server.connect_latency)
+
+    def _send_json(self, body, status=200):
+        payload = json.dumps(body).encode()
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        self.server.n_requests += 1
+        time.sleep(self.server.latency)
+        path = self.path.split("?")[0]
+
+        if path == FORECAST_PATH:
+            self._send_json({"current_weather": {"temperature": 8.3, "windspeed": 12.0}})
+        elif path == DEVICES_PATH:
+            # Every issued token stays valid until it expires, like Google OAuth access tokens
+            token = self.headers.get("Authorization", "").removeprefix("Bearer ")
+            if time.monotonic() >= self.server.tokens.get(token, 0.0):
+                self.server.n_unauthorized += 1
+                self._send_json({"error": {"code": 401, "status": "UNAUTHENTICATED"}}, status=401)
+                return
+
+            traits = {
+                "sdm.devices.traits.Temperature": {"ambientTemperatureCelsius": 19.5},
+                "sdm.devices.traits.Humidity": {"ambientHumidityPercent": 48},
+            }
+            self._send_json({"devices": [{"traits": traits}]})
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def do_POST(self):
+        self.server.n_requests += 1
+        time.sleep(self.server.latency)
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+        if self.path.split("?")[0] == TOKEN_PATH:
+            self.server.n_token_requests += 1
+            self.server.access_token = f"stub-token-{self.server.n_token_requests}"
+            self.server.tokens[self.server.access_token] = time.monotonic() + self.server.token_expires_in
+            self._send_json(
+                {"access_token": self.server.access_token, "expires_in": self.server.token_expires_in},
+            )
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(port=0, latency=0.0, connect_latency=0.0, token_expires_in=TOKEN_EXPIRES_IN):
+    """
+    Start stub server on a background thread
+
+    Returns:
+        tuple: Server (call shutdown() to stop) and base url
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubHandler)
+    server.daemon_threads = True
+
+    server.latency = latency
+    server.connect_latency = connect_latency
+    server.token_expires_in = token_expires_in
+    server.access_token = None
+    server.tokens = {}  # access token -> expiry time
+    server.n_connections = 0
+    server.n_requests = 0
+    server.n_token_requests = 0
+    server.n_unauthorized = 0
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8099
+    server, base_url = start_stub_server(port)
+    print(f"Stub server at {base_url}{FORECAST_PATH}, {base_url}{DEVICES_PATH}, {base_url}{TOKEN_PATH}")
+
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,178 @@
+"""
+Benchmark suite run on a synthetic multi-year history, results are written to a JSON file to compare across commits
+
+Measures ingest rate, PlotlyLiveServer._get_db_data range and latest reading latency, figure build time and JSON
+payload size. Run from the repo root:
+    python -m benchmark.suite [years] [output file]
+Compare two result files, metrics that changed by more than the threshold (in %) are flagged:
+    python -m benchmark.suite compare old.json new.json [threshold]
+"""
+
+from datetime import datetime, timedelta
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import plotly
+
+from benchmark.synthetic import SyntheticSensorDB, fill_database
+from db_plot import PlotlyLiveServer
+from sensor_reading.connection import connections
+from sensor_reading.ingest import IngestQueue
+from sensor_reading.latest import LatestReadingCache
+from sensor_reading.storage import SensorStorage
+
+RESULTS_DIR = "benchmark/results"
+HISTORY_YEARS = 3
+RANGES = {"1 day": 1, "1 week": 7, "1 month": 30, "1 year": 365}
+N_REPEATS = 7
+N_INGEST_READINGS = 2000
+INGEST_BATCH_SIZE = 30  # matches save_data.WRITE_BATCH_SIZE
+REGRESSION_THRESHOLD = 10  # in %
+
+# Metrics where a larger value is better, every other metric is a time or size
+HIGHER_IS_BETTER = ("_per_s",)
+# Metrics describing the workload, changes are shown but not flagged
+NOT_FLAGGED = ("_points",)
+
+
+def median_time(function, n_repeats=N_REPEATS):
+    """Median time of n_repeats calls in milliseconds, and the last result"""
+    times = []
+    for _ in range(n_repeats):
+        start_time = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start_time)
+
+    return statistics.median(times) * 1e3, result
+
+
+def git_commit() -> str:
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+        return result.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def measure_ingest(directory):
+    """
+    Readings per second inserted one at a time and through the write buffer, and published to the ingest queue like
+    save_data (the poller side only, without the storage worker)
+    """
+    results = {}
+    for name, batch_size in [("unbuffered", 1), ("buffered", INGEST_BATCH_SIZE), ("queued", None)]:
+        sensor_db = SyntheticSensorDB(os.path.join(directory, f"ingest_{name}.db"))
+        if batch_size is None:
+            sensor_db.configure_ingest_queue(IngestQueue(os.path.join(directory, "ingest_queue.db")))
+        else:
+            sensor_db.configure_write_buffer(batch_size, flush_interval=60)
+
+        start_time = time.perf_counter()
+        for _ in range(N_INGEST_READINGS):
+            sensor_db.get_new_reading()
+        sensor_db.close()
+
+        results[f"ingest_{name}_per_s"] = N_INGEST_READINGS / (time.perf_counter() - start_time)
+
+    return results
+
+
+def measure_queries(server, end_time):
+    """Latency of range and latest reading queries, figure build time and payload size of each range"""
+    results = {}
+
+    results["latest_ms"], _ = median_time(lambda: server._get_db_data())
+    results["latest_cached_ms"], _ = median_time(server.get_latest_reading)
+
+    for label, days in RANGES.items():
+        key = label.replace(" ", "_")
+        start_date = (end_time - timedelta(days=days)).date()
+        end_date = (end_time + timedelta(days=1)).date()
+
+        results[f"range_{key}_ms"], data = median_time(lambda: server._get_db_data(start_date, end_date))
+        results[f"range_{key}_points"] = sum(len(columns["timestamp"]) for columns in data.values())
+
+        results[f"figure_{key}_ms"], figure = median_time(lambda: server.get_updated_figure(start_date, end_date))
+        results[f"to_json_{key}_ms"], payload = median_time(lambda: plotly.io.to_json(figure, validate=False))
+        results[f"payload_{key}_kb"] = len(payload) / 1e3
+
+    return results
+
+
+def run(years=HISTORY_YEARS):
+    end_time = datetime.now()
+
+    with tempfile.TemporaryDirectory() as directory:
+        database_filepath = os.path.join(directory, "sensors.db")
+
+        start_time = time.perf_counter()
+        n_rows = sum(fill_database(database_filepath, end_time, years * 365).values())
+        results = {"generate_per_s": n_rows / (time.perf_counter() - start_time)}
+
+        results.update(measure_ingest(directory))
+
+        server = PlotlyLiveServer()
+        server.storage = SensorStorage(database_filepath)
+        server.latest_cache = LatestReadingCache(server.storage, server.sensor_ids)
+        results.update(measure_queries(server, end_time))
+
+        results["database_mb"] = os.path.getsize(database_filepath) / 1e6
+        connections.close_all()
+
+    return {
+        "commit": git_commit(),
+        "timestamp": end_time.isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "history_years": years,
+        "history_readings": n_rows,
+        "results": results,
+    }
+
+
+def compare(old, new, threshold=REGRESSION_THRESHOLD):
+    """Print every metric of two runs, flagging changes larger than threshold %"""
+    print(f"{'metric':<28}{old['commit']:>14}{new['commit']:>14}{'change':>10}")
+    for metric, new_value in new["results"].items():
+        old_value = old["results"].get(metric)
+        if not old_value:
+            print(f"{metric:<28}{'':>14}{new_value:>14.2f}")
+            continue
+
+        change = 100 * (new_value - old_value) / old_value
+        worse = -change if metric.endswith(HIGHER_IS_BETTER) else change
+        if metric.endswith(NOT_FLAGGED):
+            flag = ""
+        else:
+            flag = "  regression" if worse > threshold else ("  improvement" if worse < -threshold else "")
+        print(f"{metric:<28}{old_value:>14.2f}{new_value:>14.2f}{change:>9.1f}%{flag}")
+
+
+if __name__ == "__main__":
+    if (len(sys.argv) > 1) and (sys.argv[1] == "compare"):
+        with open(sys.argv[2]) as fileread:
+            old = json.load(fileread)
+        with open(sys.argv[3]) as fileread:
+            new = json.load(fileread)
+
+        compare(old, new, float(sys.argv[4]) if len(sys.argv) > 4 else REGRESSION_THRESHOLD)
+        sys.exit()
+
+    years = float(sys.argv[1]) if len(sys.argv) > 1 else HISTORY_YEARS
+    report = run(years)
+
+    output_filepath = sys.argv[2] if len(sys.argv) > 2 else os.path.join(RESULTS_DIR, f"{report['commit']}.json")
+    if os.path.dirname(output_filepath):
+        os.makedirs(os.path.dirname(output_filepath), exist_ok=True)
+    with open(output_filepath, "w") as filewrite:
+        json.dump(report, filewrite, indent=2)
+
+    for metric, value in report["results"].items():
+        print(f"{metric:<28}{value:>14.2f}")
+    print(f"{report['history_readings']} readings over {years} years, results written to {output_filepath}")
@@ -0,0 +1,140 @@
+"""
+Synthetic sensor histories for benchmarks without hardware or API access
+
+Write a multi-year history of every dashboard sensor to a database, from the repo root:
+    python -m benchmark.synthetic [database] [years]
+"""
+
+from datetime import datetime, timedelta
+import os
+import sys
+
+import numpy as np
+
+from sensor_reading.connection import connections
+from sensor_reading.epoch import to_epoch_ms
+from sensor_reading.rollup import backfill_rollups
+from sensor_reading.sensor_db import BaseSensorDB
+
+SAMPLE_INTERVAL = 120  # in seconds, matches save_data.SAVE_INTERVAL
+OUTAGES_PER_YEAR = 12  # logger or network outages, readings are missing for their length
+MAX_OUTAGE_LENGTH = 24 * 3600  # in seconds
+
+# Mean temperature, yearly and daily swing (in °C) and mean humidity of each dashboard sensor
+SENSOR_PROFILES = {
+    "bedroom": {"mean": 19.0, "yearly": 2.0, "daily": 1.5, "humidity": 50.0},
+    "livingroom": {"mean": 20.5, "yearly": 1.5, "daily": 1.0, "humidity": 45.0},
+    "outside": {"mean": 11.0, "yearly": 7.0, "daily": 4.0, "humidity": 75.0},
+}
+DEFAULT_PROFILE = {"mean": 15.0, "yearly": 5.0, "daily": 3.0, "humidity": 55.0}
+
+
+def generate_history(end_time, days, interval=SAMPLE_INTERVAL, rng=None, profile=None, outages_per_year=0):
+    """
+    Generate (timestamp, temperature, humidity) rows ending at end_time
+
+    Temperature follows a daily and yearly cycle with noise, humidity moves opposite to temperature
+
+    Args:
+        profile (dict): Mean, yearly and daily swing of temperature and mean humidity, DEFAULT_PROFILE if not given
+        outages_per_year (float): Average number of outages of up to MAX_OUTAGE_LENGTH with no readings
+
+    Returns:
+        tuple: Row generator and number of rows
+    """
+    rng = np.random.default_rng(0) if rng is None else rng
+    profile = DEFAULT_PROFILE if profile is None else profile
+
+    n_samples = int(days * 24 * 3600 / interval)
+    offsets = np.arange(n_samples) * interval
+    start_time = end_time - timedelta(seconds=int(offsets[-1]) if n_samples else 0)
+
+    day_phase = 2 * np.pi * offsets / (24 * 3600)
+    year_phase = 2 * np.pi * offsets / (365 * 24 * 3600)
+    temperature = (
+        profile["mean"]
+        + profile["yearly"] * np.sin(year_phase)
+        + profile["daily"] * np.sin(day_phase)
+        + rng.normal(0, 0.3, n_samples)
+    )
+    humidity = profile["humidity"] - 2 * (temperature - profile["mean"]) + rng.normal(0, 2, n_samples)
+
+    keep = np.ones(n_samples, dtype=bool)
+    for _ in range(rng.poisson(outages_per_year * days / 365)):
+        outage_start = rng.integers(0, max(n_samples, 1))
+        keep[outage_start : outage_start + int(rng.uniform(0, MAX_OUTAGE_LENGTH) / interval)] = False
+
+    rows = (
+        (start_time + timedelta(seconds=int(offset)), float(t), float(h))
+        for offset, t, h in zip(offsets[keep], np.round(temperature[keep], 1), np.round(humidity[keep], 1))
+    )
+
+    return rows, int(keep.sum())
+
+
+class SyntheticSensorDB(BaseSensorDB):
+    """
+    Sensor db filled with generated readings, used for benchmarks without hardware or API access
+    """
+
+    def __init__(self, database_filepath, sensor_id="synthetic", seed=0):
+        self.database_filepath = database_filepath
+        self.sensor_id = sensor_id
+        self._create_db_table()
+
+        self.rng = np.random.default_rng(seed)
+        self._last_timestamp = None
+
+    def get_new_reading(self) -> bool:
+        timestamp = datetime.now()
+        # Timestamps are stored in milliseconds, readings generated back to back mustn't share one
+        if (self._last_timestamp is not None) and (timestamp - self._last_timestamp < timedelta(milliseconds=1)):
+            timestamp = self._last_timestamp + timedelta(milliseconds=1)
+        self._last_timestamp = timestamp
+        temperature_reading = 18 + self.rng.normal(0, 1)
+        humidity_reading = 50 + self.rng.normal(0, 5)
+
+        self._insert_reading(timestamp, temperature_reading, humidity_reading)
+
+        return True
+
+    def fill_history(self, end_time, days, interval=SAMPLE_INTERVAL, profile=None, outages_per_year=0):
+        """Bulk insert a history of readings ending at end_time"""
+        rows, n_samples = generate_history(end_time, days, interval, self.rng, profile, outages_per_year)
+        rows = ((to_epoch_ms(timestamp), temperature, humidity) for timestamp, temperature, humidity in rows)
+
+        with connections.writer(self.database_filepath) as conn:
+            conn.executemany(f"INSERT INTO {self.sensor_id} (timestamp, temperature, humidity) VALUES (?, ?, ?)", rows)
+            backfill_rollups(conn, self.sensor_id)
+
+        return n_samples
+
+
+def fill_database(
+    database_filepath, end_time, days, sensor_ids=tuple(SENSOR_PROFILES), outages_per_year=OUTAGES_PER_YEAR
+):
+    """
+    Fill a database with histories of the dashboard sensors, each with its own profile and outages
+
+    Returns:
+        dict: Sensor id -> number of readings
+    """
+    return {
+        sensor_id: SyntheticSensorDB(database_filepath, sensor_id, seed).fill_history(
+            end_time, days, profile=SENSOR_PROFILES.get(sensor_id), outages_per_year=outages_per_year
+        )
+        for seed, sensor_id in enumerate(sensor_ids)
+    }
+
+
+if __name__ == "__main__":
+    database_filepath = sys.argv[1] if len(sys.argv) > 1 else "data/synthetic.db"
+    years = float(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    if os.path.dirname(database_filepath):
+        os.makedirs(os.path.dirname(database_filepath), exist_ok=True)
+
+    for sensor_id, n_rows in fill_database(database_filepath, datetime.now(), years * 365).items():
+        print(f"{database_filepath} {sensor_id}: {n_rows} readings over {years} years")
+
+    connections.close_all()
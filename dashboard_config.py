@@ -0,0 +1,24 @@
+import json
+import os
+
+CONFIG_FILE = "dashboard_config.json"
+
+DEFAULT_CONFIG = {
+    "host": "192.168.1.43",
+    "port": 8050,
+    "debug": False,  # Dev server only, enables the debugger and reloader
+    "workers": 2,  # gunicorn worker processes
+    "threads": 4,  # threads per worker
+    "static_max_age": 365 * 24 * 3600,  # in seconds, browser cache lifetime of static assets
+}
+
+
+def load_config(config_file=CONFIG_FILE) -> dict:
+    """Load dashboard config, values in the json config file override the defaults"""
+    config = dict(DEFAULT_CONFIG)
+
+    if os.path.exists(config_file):
+        with open(config_file) as fileread:
+            config.update(json.load(fileread))
+
+    return config
@@ -1,35 +1,89 @@
 from datetime import datetime, date, timedelta
-import sqlite3
+import base64
+import copy
+import time
 import numpy as np
 
-import time
 import dash
+import flask
 
 from dash import dcc, html
 import plotly
-from dash.dependencies import Input, Output
+from dash.dependencies import Input, Output, State
+
+from dashboard_config import load_config
+from export import EXPORT_FORMATS, export_chunks
+from figure_cache import FigureCache
+from sensor_reading.archive import ARCHIVE_DIR, SensorArchive
+from sensor_reading.changepoint import HEARTBEAT_INTERVAL, hold_last
+from sensor_reading.downsample import downsample_indices
+from sensor_reading.latest import LatestReadingCache
+from sensor_reading.metrics import SIZE_BUCKETS, metrics
+from sensor_reading.rollup import RESOLUTIONS, choose_resolution
+from sensor_reading.storage import DEFAULT_DATABASE, SensorStorage
+
+# Maximum number of points sent to the browser per trace, None disables downsampling
+MAX_POINTS_PER_TRACE = 2000
+
+# Graph width and points per pixel used to choose between raw data and rollup tables
+GRAPH_WIDTH_PX = 1200
+POINTS_PER_PIXEL = 1
+
+# Max points kept per trace in the browser when live rows are appended with extendData
+LIVE_TAIL_MAX_POINTS = 5000
+
+figure_build_seconds = metrics.histogram("figure_build_seconds", "Time to query and build a figure by resolution")
+callback_seconds = metrics.histogram("dash_callback_seconds", "Time to serve a Dash callback request by output")
+callback_bytes = metrics.histogram(
+    "dash_callback_response_bytes", "Uncompressed Dash callback response size by output", SIZE_BUCKETS
+)
+
+
+def typed_array(values):
+    """plotly.js typed array spec of a float array, base64 encoded float64 as plotly.io sends NumPy arrays"""
+    return {"dtype": "f8", "bdata": base64.b64encode(np.ascontiguousarray(values, dtype=np.float64)).decode("ascii")}
 
 
 class PlotlyLiveServer:
     def __init__(self):
         """Initialise sensor and graph figure data"""
 
-        self.bedroom_db = "data/dht.db"
-        self.livingroom_db = "data/nest.db"
-        self.external_db = "data/external.db"
+        # Raw readings of closed months are read from the archive once they're moved out of sqlite
+        self.storage = SensorStorage(DEFAULT_DATABASE, SensorArchive(ARCHIVE_DIR))
+
+        # Sensor tables in trace order: bedroom, living room, outside
+        self.sensor_ids = ["bedroom", "livingroom", "outside"]
+        # Sensors logged in change-point mode (deadband in sensor_reading.registry.DEFAULT_SENSORS), plotted as steps
+        self.step_sensor_ids = ["outside"]
+        self.latest_cache = LatestReadingCache(self.storage, self.sensor_ids)
+        self.figure_cache = FigureCache(
+            self.storage.database_filepath,
+            lambda start_date, end_date: self.storage.count_readings(self.sensor_ids, start_date, end_date),
+        )
+
+        self.max_points = MAX_POINTS_PER_TRACE
+        # Min/max keeps peaks and is vectorised, LTTB is still slower than sending the raw points
+        self.downsample_method = "minmax"
+        self.target_points = GRAPH_WIDTH_PX * POINTS_PER_PIXEL
 
         self._set_up_figure()
 
     def _set_up_figure(self):
-        self.fig = plotly.tools.make_subplots(rows=1, cols=1)
-        self.fig.update_layout(
+        """
+        Build the figure once and keep its layout and trace settings as plain dicts
+
+        Requests never modify these, every figure is built from a copy with its own trace data, so callbacks can run
+        concurrently in a multi-threaded or multi-process server
+        """
+        fig = plotly.tools.make_subplots(rows=1, cols=1)
+        fig.update_layout(
             title_text="Temperature over time",
             xaxis_title="Time",
             yaxis_title="Temperature (°C)",
             yaxis_range=[-5, 25],
         )
 
-        self.fig.append_trace(
+        fig.append_trace(
             {
                 "x": [],
                 "y": [],
@@ -45,7 +99,7 @@ class PlotlyLiveServer:
             1,
         )
 
-        self.fig.append_trace(
+        fig.append_trace(
             {
                 "x": [],
                 "y": [],
@@ -62,13 +116,14 @@ class PlotlyLiveServer:
             1,
         )
 
-        self.fig.append_trace(
+        fig.append_trace(
             {
                 "x": [],
                 "y": [],
                 "name": "Outside",
                 "type": "scatter",
                 "mode": "lines+markers",
+                "line": {"shape": "hv"},
                 "marker": {
                     "size": 3,
                     "symbol": "circle",
@@ -78,60 +133,167 @@ class PlotlyLiveServer:
             1,
         )
 
-        self.fig.update_layout(legend_title_text="Location", showlegend=True, template="ggplot2")
+        fig.update_layout(legend_title_text="Location", showlegend=True, template="ggplot2")
 
-    def _get_db_data(self, db, start_date=None, end_date=None):
-        # Connect to the database
-        conn = sqlite3.connect(db)
-        cursor = conn.cursor()
+        figure_template = fig.to_dict()
+        self.layout = figure_template["layout"]
+        self.trace_templates = [
+            {key: value for key, value in trace.items() if key not in ["x", "y"]} for trace in figure_template["data"]
+        ]
 
+    def _get_db_data(self, start_date=None, end_date=None):
+        """
+        Get columns of all sensors in one query, the readings in the date range or the latest reading of each sensor
+
+        Returns:
+            dict: Sensor id -> dict of "timestamp" (datetime64), "temperature" and "humidity" NumPy arrays
+        """
         if (start_date is not None) and (end_date is not None):
             print("Time")
-            cursor.execute(f"SELECT * FROM data WHERE timestamp BETWEEN ? AND ?", (start_date, end_date))
+            # Serve bucket means from the coarsest rollup that still fills the graph width, raw rows for short ranges
+            resolution = choose_resolution(start_date, end_date, self.target_points)
+            results = self.storage.get_range_arrays(self.sensor_ids, start_date, end_date, resolution)
+
+            if self.step_sensor_ids:
+                # Change points only, hold the last value to the end of a closed range, or to the newest stored reading
+                # of any sensor so rows appended later by the live tail come after it, so the final step is drawn
+                hold_end = datetime.combine(end_date, datetime.min.time())
+                if hold_end > datetime.now():
+                    latest = [rows[0][0] for rows in self.storage.get_latest(self.sensor_ids).values() if rows]
+                    if latest:
+                        hold_end = max(datetime.fromisoformat(timestamp) for timestamp in latest)
+
+                # Rollup buckets are timestamped at their start, the last reading can be up to a bucket later
+                hold_interval = HEARTBEAT_INTERVAL + (0 if resolution is None else RESOLUTIONS[resolution][0])
+                for sensor_id in self.step_sensor_ids:
+                    results[sensor_id] = hold_last(results[sensor_id], hold_end, hold_interval)
         else:
-            cursor.execute("SELECT * FROM data ORDER BY timestamp DESC LIMIT 1")
-
-        # Fetch the results of the query
-        results = cursor.fetchall()
+            results = {
+                sensor_id: {
+                    "timestamp": np.array([row[0] for row in rows], dtype="datetime64[ms]"),
+                    "temperature": np.array([row[1] for row in rows], dtype=np.float64),
+                    "humidity": np.array([row[2] for row in rows], dtype=np.float64),
+                }
+                for sensor_id, rows in self.storage.get_latest(self.sensor_ids).items()
+            }
 
         # print(results)
 
-        conn.commit()
-        conn.close()
-
         return results
 
+    def _get_trace_data(self, data):
+        """Get trace x and y from sensor columns, downsampling to max_points if set"""
+        x = data["timestamp"]
+        y = data["temperature"]
+
+        if (self.max_points is not None) and (len(x) > self.max_points):
+            indices = downsample_indices(x, y, self.max_points, self.downsample_method)
+            x = x[indices]
+            y = y[indices]
+
+        # Dash serialises plain dicts without plotly's typed array encoding, so y is encoded here. Timestamps stay
+        # datetime64 and are sent as date strings, which extendData appends to.
+        return {"x": x, "y": typed_array(y)}
+
     def get_updated_figure(self, start_date=None, end_date=None):
-        bedroom_data = self._get_db_data(self.bedroom_db, start_date, end_date)
-        self.fig["data"][0]["x"] = [row[0] for row in bedroom_data]
-        self.fig["data"][0]["y"] = [row[1] for row in bedroom_data]
+        """
+        Build a new figure dict for the date range, or with the latest reading of each sensor if no range is given
+
+        Shared state is only read, so this is safe to call from concurrent requests
+        """
+        if (start_date is not None) and (end_date is not None):
+            resolution = choose_resolution(start_date, end_date, self.target_points) or "raw"
+        else:
+            resolution = "latest"
+
+        with figure_build_seconds.time(resolution=resolution):
+            data = self._get_db_data(start_date, end_date)
+
+            traces = [
+                dict(copy.deepcopy(self.trace_templates[trace_index]), **self._get_trace_data(data[sensor_id]))
+                for trace_index, sensor_id in enumerate(self.sensor_ids)
+            ]
+
+        return {"data": traces, "layout": copy.deepcopy(self.layout)}
+
+    def get_cached_figure(self, start_date=None, end_date=None):
+        """
+        Get figure for the date range as a dict, served from the figure cache when it's still valid
+        """
+        if (start_date is None) or (end_date is None):
+            return self.get_updated_figure()
+
+        resolution = choose_resolution(start_date, end_date, self.target_points)
+        figure, validator = self.figure_cache.get(start_date, end_date, resolution)
 
-        livingroom_data = self._get_db_data(self.livingroom_db, start_date, end_date)
-        self.fig["data"][1]["x"] = [row[0] for row in livingroom_data]
-        self.fig["data"][1]["y"] = [row[1] for row in livingroom_data]
+        if figure is None:
+            figure = self.get_updated_figure(start_date, end_date)
+            self.figure_cache.put(start_date, end_date, resolution, figure, validator)
 
-        external_data = self._get_db_data(self.external_db, start_date, end_date)
-        self.fig["data"][2]["x"] = [row[0] for row in external_data]
-        self.fig["data"][2]["y"] = [row[1] for row in external_data]
+        return figure
 
-        return self.fig
+    def get_latest_timestamps(self):
+        """Get the latest raw timestamp of each sensor, which the live tail continues from"""
+        # Read from the database rather than the latest reading cache, which can hold readings not yet written
+        latest = self.storage.get_latest(self.sensor_ids)
+
+        return [latest[sensor_id][0][0] if latest[sensor_id] else None for sensor_id in self.sensor_ids]
+
+    def get_figure_extension(self, last_timestamps):
+        """
+        Get rows newer than the client's last timestamps for Dash's extendData
+
+        Args:
+            last_timestamps (list): Last timestamp the client has for each trace, None if the trace is empty
+
+        Returns:
+            tuple: extendData update (or None if there are no new rows) and updated last timestamps
+        """
+        x, y, trace_indices = [], [], []
+        new_last_timestamps = list(last_timestamps)
+
+        new_rows = self.storage.get_since(dict(zip(self.sensor_ids, last_timestamps)))
+        for trace_index, sensor_id in enumerate(self.sensor_ids):
+            rows = new_rows[sensor_id]
+            if not rows:
+                continue
+
+            x.append([row[0] for row in rows])
+            y.append([row[1] for row in rows])
+            trace_indices.append(trace_index)
+            new_last_timestamps[trace_index] = rows[-1][0]
+
+        if not trace_indices:
+            return None, new_last_timestamps
+
+        return (dict(x=x, y=y), trace_indices, LIVE_TAIL_MAX_POINTS), new_last_timestamps
 
     def get_latest_reading(self):
-        readings = []
-        readings.append(self._get_db_data(self.bedroom_db))
-        readings.append(self._get_db_data(self.livingroom_db))
-        readings.append(self._get_db_data(self.external_db))
+        # Served from memory unless the database changed since the last read
+        latest = self.latest_cache.get()
 
-        return readings
+        return [latest[sensor_id] for sensor_id in self.sensor_ids]
 
 
-if __name__ == "__main__":
+def create_app(config=None):
+    """
+    Create the dashboard Dash app
+
+    Args:
+        config (dict): Dashboard config, see dashboard_config.DEFAULT_CONFIG
+
+    Returns:
+        dash.Dash: App, serve app.server with a WSGI server
+    """
+    config = load_config() if config is None else config
+
     server = PlotlyLiveServer()
-    time.sleep(0.2)
 
     external_stylesheets = ["https://codepen.io/chriddyp/pen/bWLwgP.css"]
 
-    app = dash.Dash(__name__, external_stylesheets=external_stylesheets)
+    # Responses are gzip compressed with flask-compress
+    app = dash.Dash(__name__, external_stylesheets=external_stylesheets, compress=True)
+    app.server.config["SEND_FILE_MAX_AGE_DEFAULT"] = config["static_max_age"]
 
     def serve_layout():
         """
@@ -153,6 +315,7 @@ if __name__ == "__main__":
                         end_date=(datetime.today() + timedelta(days=1)).date(),
                     ),
                     dcc.Interval(id="interval-component", interval=60 * 1000, n_intervals=0),  # in milliseconds
+                    dcc.Store(id="live-tail-timestamps"),
                     dcc.Graph(id="live-update-graph"),
                 ],
             )
@@ -167,8 +330,34 @@ if __name__ == "__main__":
         readings_list = server.get_latest_reading()
         return f"Current temperatures: Bedroom {readings_list[0][0][1]:.1f} | Living room {readings_list[1][0][1]:.1f} | Outside {readings_list[2][0][1]:.1f}"
 
+    @app.callback(
+        Output("live-update-graph", "extendData"),
+        Output("live-tail-timestamps", "data", allow_duplicate=True),
+        Input("interval-component", "n_intervals"),
+        State("live-tail-timestamps", "data"),
+        State("my-date-picker-range", "end_date"),
+        prevent_initial_call=True,
+    )
+    def extend_graph_live(n, last_timestamps, end_date):
+        """
+        Append rows newer than the client's last timestamps to the graph instead of rebuilding the figure
+
+        Only runs while the selected range is still open, i.e. the end date is after today
+        """
+        if (last_timestamps is None) or (
+            (end_date is not None) and (datetime.strptime(end_date, "%Y-%m-%d").date() <= date.today())
+        ):
+            raise dash.exceptions.PreventUpdate
+
+        extend_data, new_last_timestamps = server.get_figure_extension(last_timestamps)
+        if extend_data is None:
+            raise dash.exceptions.PreventUpdate
+
+        return extend_data, new_last_timestamps
+
     @app.callback(
         Output("live-update-graph", "figure"),
+        Output("live-tail-timestamps", "data"),
         [
             Input("my-date-picker-range", "start_date"),
             Input("my-date-picker-range", "end_date"),
@@ -184,6 +373,7 @@ if __name__ == "__main__":
 
         Returns:
             fig: Updated figure as expected for dash graph component
+            list: Latest timestamp per trace for the live tail
         """
         try:
             string_prefix = "You have selected: "
@@ -193,14 +383,94 @@ if __name__ == "__main__":
             if end_date is not None:
                 end_date_object = datetime.strptime(end_date, "%Y-%m-%d").date()
 
+            # Get latest timestamps first so rows written while the figure is built end up in the live tail
+            last_timestamps = server.get_latest_timestamps()
+
             if (start_date is not None) and (end_date is not None):
-                return server.get_updated_figure(start_date_object, end_date_object)
+                return server.get_cached_figure(start_date_object, end_date_object), last_timestamps
             else:
-                return server.get_updated_figure()
+                return server.get_cached_figure(), last_timestamps
         except Exception as e:
             print(e)
             raise e
 
+    @app.server.before_request
+    def start_timer():
+        flask.g.start_time = time.perf_counter()
+
+    @app.server.after_request
+    def record_callback_metrics(response):
+        """Time and payload size of Dash callbacks, runs before flask-compress so sizes are uncompressed"""
+        if flask.request.path.endswith("/_dash-update-component"):
+            # The output comes from the client, only label registered callbacks so label sets stay bounded
+            output = (flask.request.get_json(silent=True) or {}).get("output")
+            if not (isinstance(output, str) and output in app.callback_map):
+                output = "other"
+
+            callback_seconds.observe(time.perf_counter() - flask.g.start_time, output=output)
+            if response.content_length is not None:
+                callback_bytes.observe(response.content_length, output=output)
+
+        return response
+
+    @app.server.route("/metrics")
+    def metrics_text():
+        """Counters and histograms of this worker process in the Prometheus text format"""
+        return flask.Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+    @app.server.route("/stats/figure-cache")
+    def figure_cache_stats():
+        """Hit rate and memory use of the figure cache"""
+        return flask.jsonify(server.figure_cache.stats())
+
+    @app.server.route("/export")
+    def export():
+        """
+        Stream readings as CSV or NDJSON, e.g. /export?start=2023-01-01&end=2023-02-01&sensors=bedroom,outside
+
+        Query args: start and end (dates or ISO datetimes), sensors (default all), format (csv or ndjson), resolution
+        (1m, 1h or 1d rollup means instead of raw readings) and gzip (1 to compress)
+        """
+        args = flask.request.args
+
+        try:
+            start_time = datetime.fromisoformat(args["start"])
+            end_time = datetime.fromisoformat(args["end"])
+        except (KeyError, ValueError):
+            flask.abort(400, "start and end must be ISO dates or datetimes")
+
+        sensor_ids = args["sensors"].split(",") if args.get("sensors") else server.sensor_ids
+        export_format = args.get("format", "csv")
+        resolution = args.get("resolution") or None
+        gzip = args.get("gzip") == "1"
+
+        # Sensor ids and resolution end up in table names, only known values are allowed
+        if any(sensor_id not in server.sensor_ids for sensor_id in sensor_ids):
+            flask.abort(400, f"sensors must be in {', '.join(server.sensor_ids)}")
+        if export_format not in EXPORT_FORMATS:
+            flask.abort(400, f"format must be one of {', '.join(EXPORT_FORMATS)}")
+        if (resolution is not None) and (resolution not in RESOLUTIONS):
+            flask.abort(400, f"resolution must be one of {', '.join(RESOLUTIONS)}")
+
+        mimetype, extension = EXPORT_FORMATS[export_format]
+        filename = f"sensors_{start_time:%Y%m%d}_{end_time:%Y%m%d}.{extension}"
+        if gzip:
+            mimetype, filename = "application/gzip", filename + ".gz"
+
+        chunks = export_chunks(server.storage, sensor_ids, start_time, end_time, export_format, resolution, gzip)
+        response = flask.Response(flask.stream_with_context(chunks), mimetype=mimetype)
+        response.headers["Content-Disposition"] = f"attachment; filename={filename}"
+
+        return response
+
     app.layout = serve_layout
 
-    app.run_server(debug=True, host="192.168.1.43")
+    return app
+
+
+if __name__ == "__main__":
+    # Flask dev server, use gunicorn with wsgi.py for serving
+    config = load_config()
+
+    app = create_app(config)
+    app.run(debug=config["debug"], host=config["host"], port=config["port"])
@@ -0,0 +1,66 @@
+import math
+import zlib
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+}
+
+CSV_HEADER = "sensor_id,timestamp,temperature,humidity\n"
+
+
+def _csv_value(value):
+    return "" if value is None else repr(value)
+
+
+def _json_value(value):
+    return "null" if (value is None) or math.isnan(value) else repr(value)
+
+
+def format_chunks(chunks, export_format="csv"):
+    """
+    Turn chunks of (sensor_id, timestamp, temperature, humidity) rows into encoded CSV or NDJSON text
+
+    Yields:
+        bytes: Text of one chunk of rows, the CSV header first
+    """
+    if export_format == "csv":
+        yield CSV_HEADER.encode()
+        for rows in chunks:
+            yield "".join(
+                f"{sensor_id},{timestamp},{_csv_value(temperature)},{_csv_value(humidity)}\n"
+                for sensor_id, timestamp, temperature, humidity in rows
+            ).encode()
+    elif export_format == "ndjson":
+        for rows in chunks:
+            yield "".join(
+                f'{{"sensor_id": "{sensor_id}", "timestamp": "{timestamp}", '
+                f'"temperature": {_json_value(temperature)}, "humidity": {_json_value(humidity)}}}\n'
+                for sensor_id, timestamp, temperature, humidity in rows
+            ).encode()
+    else:
+        raise ValueError(f"Unknown export format {export_format}")
+
+
+def gzip_chunks(chunks, level=6):
+    """Compress a stream of byte chunks into one gzip stream without holding it in memory"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+
+    yield compressor.flush()
+
+
+def export_chunks(storage, sensor_ids, start_time, end_time, export_format="csv", resolution=None, gzip=False):
+    """
+    Stream readings between start_time and end_time as CSV or NDJSON
+
+    Returns:
+        generator: bytes chunks of the export, gzip compressed if gzip is set
+    """
+    chunks = format_chunks(storage.iter_range(sensor_ids, start_time, end_time, resolution), export_format)
+
+    return gzip_chunks(chunks) if gzip else chunks
@@ -0,0 +1,153 @@
+from collections import OrderedDict
+from datetime import datetime, time
+import threading
+
+import numpy as np
+
+from sensor_reading.latest import DataVersion
+
+FIGURE_CACHE_MAX_ENTRIES = 64
+FIGURE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+
+def estimate_figure_bytes(figure) -> int:
+    """Rough memory use of a figure dict, trace arrays plus a fixed allowance for layout and trace settings"""
+    n_bytes = 4096
+    for trace in figure.get("data", []):
+        for key in ["x", "y"]:
+            values = trace.get(key)
+            if isinstance(values, dict):
+                # plotly typed array spec
+                n_bytes += len(values["bdata"]) + 1024
+            elif values is not None:
+                n_bytes += np.asarray(values).nbytes + 1024
+
+    return n_bytes
+
+
+class FigureCache:
+    """
+    Bounded LRU cache of figure dicts keyed by (start_date, end_date, resolution)
+
+    Figures are served while the database hasn't changed since they were built, using its data_version change counter.
+    Ranges that have ended rarely get new readings, only late ones such as readings written after a storage worker
+    outage, so after a change they're recounted with count_readings and only rebuilt if their count changed.
+
+    Args:
+        count_readings (callable): (start_date, end_date) -> number of stored readings in the range
+    """
+
+    def __init__(
+        self,
+        database_filepath,
+        count_readings,
+        max_entries=FIGURE_CACHE_MAX_ENTRIES,
+        max_bytes=FIGURE_CACHE_MAX_BYTES,
+    ):
+        self.count_readings = count_readings
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self._version = DataVersion(database_filepath)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (figure, (data version, reading count or None if open), size in bytes)
+        self._n_bytes = 0
+
+        self.n_hits = 0
+        self.n_misses = 0
+        self.n_invalidations = 0
+
+    @staticmethod
+    def is_closed(end_date) -> bool:
+        """Ranges are end exclusive at midnight, so only late readings can be added once it has passed"""
+        if end_date is None:
+            return False
+
+        end_time = end_date if isinstance(end_date, datetime) else datetime.combine(end_date, time())
+        return datetime.now() >= end_time
+
+    def _remove(self, key):
+        _, _, n_bytes = self._entries.pop(key)
+        self._n_bytes -= n_bytes
+
+    def get(self, start_date, end_date, resolution):
+        """
+        Get cached figure, None on a miss
+
+        Returns:
+            tuple: Figure dict or None, and the validator to pass to put on a miss
+        """
+        key = (start_date, end_date, resolution)
+        data_version = self._version.get()
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+        if (entry is not None) and (entry[1][0] != data_version):
+            stale_entry, n_readings = entry, entry[1][1]
+
+            # Counted without the lock, a concurrent put or eviction of the same entry wins
+            if (n_readings is not None) and (self.count_readings(start_date, end_date) == n_readings):
+                # Rows written since this closed range was built were all outside it
+                entry = (entry[0], (data_version, n_readings), entry[2])
+                with self._lock:
+                    if self._entries.get(key) is stale_entry:
+                        self._entries[key] = entry
+            else:
+                # New rows were written since this range was built
+                entry = None
+                with self._lock:
+                    if self._entries.get(key) is stale_entry:
+                        self._remove(key)
+                        self.n_invalidations += 1
+
+        if entry is None:
+            # Counted before the figure is queried, so readings written meanwhile make the count differ later
+            n_readings = self.count_readings(start_date, end_date) if self.is_closed(end_date) else None
+            with self._lock:
+                self.n_misses += 1
+            return None, (data_version, n_readings)
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            self.n_hits += 1
+        return entry[0], entry[1]
+
+    def put(self, start_date, end_date, resolution, figure, validator):
+        """
+        Cache figure built for the range, validator must be got from get before querying so concurrent writes
+        invalidate it
+        """
+        key = (start_date, end_date, resolution)
+        n_bytes = estimate_figure_bytes(figure)
+        if n_bytes > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (figure, validator, n_bytes)
+            self._n_bytes += n_bytes
+
+            # Evict least recently used entries
+            while (len(self._entries) > self.max_entries) or (self._n_bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._n_bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            n_requests = self.n_hits + self.n_misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._n_bytes,
+                "hits": self.n_hits,
+                "misses": self.n_misses,
+                "invalidations": self.n_invalidations,
+                "hit_rate": self.n_hits / n_requests if n_requests else None,
+            }
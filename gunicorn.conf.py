@@ -0,0 +1,15 @@
+"""
+gunicorn settings for the dashboard, bind address and worker counts come from dashboard_config
+    gunicorn -c gunicorn.conf.py wsgi:server
+"""
+
+from dashboard_config import load_config
+
+# Underscore prefix, gunicorn treats every public name in this file as a setting
+_config = load_config()
+
+bind = f"{_config['host']}:{_config['port']}"
+workers = _config["workers"]
+threads = _config["threads"]
+worker_class = "gthread"
+timeout = 60  # in seconds, figure callbacks over long date ranges can be slow
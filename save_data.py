@@ -2,39 +2,71 @@ from datetime import datetime
 import threading
 import time
 import json
+import signal
+import sys
 
-from sensor_reading.sensor import DHTDB
-from sensor_reading.nest import NestAPIDB
-from sensor_reading.external import ExternalTemperatureDB
+from sensor_reading.changepoint import HEARTBEAT_INTERVAL
+from sensor_reading.connection import connections
+from sensor_reading.ingest import INGEST_QUEUE_FILE, IngestQueue, StorageWorkerProcess
+from sensor_reading.metrics import METRICS_FILE, MetricsFileWriter, metrics
+from sensor_reading.registry import create_sensor, load_sensor_config
+from sensor_reading.scheduler import PollingScheduler
+from sensor_reading.sensor_db import flush_all
+from sensor_reading.storage import DEFAULT_DATABASE
 
+# Defaults for sensors.json entries without an interval or timeout, see sensor_reading.registry
 SAVE_INTERVAL = 120  # in seconds, time between getting new data
+POLL_TIMEOUT = 60  # in seconds, max time to wait for a single reading
+
+WRITE_BATCH_SIZE = 30  # readings per db transaction
+WRITE_FLUSH_INTERVAL = 300  # in seconds, max time a reading waits in the ingest queue before being written
 
 
 def main():
-    pi_sensor = DHTDB()
-    nest_sensor = NestAPIDB()
-    external_sensor = ExternalTemperatureDB()
-
-    while True:
-        try:
-            pi_start_time = time.perf_counter()
-            pi_sensor.get_new_reading()
-            print(f"Pi sensor time: {time.perf_counter() - pi_start_time}")
-
-            nest_start_time = time.perf_counter()
-            nest_sensor.get_new_reading()
-            print(f"Nest sensor time: {time.perf_counter() - nest_start_time}")
-
-            ext_start_time = time.perf_counter()
-            external_sensor.get_new_reading()
-            print(f"External sensor time: {time.perf_counter() - ext_start_time}")
-
-            print(f"Sleep for {SAVE_INTERVAL - (ext_start_time - pi_start_time)}")
-            print("")
-            time.sleep(SAVE_INTERVAL - (ext_start_time - pi_start_time))
-
-        except Exception as e:
-            print(e)
+    # Exit through the finally block on SIGTERM (e.g. systemctl stop) so buffered readings are written
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    # Pollers publish readings to a persisted queue, a storage worker process writes them to the database
+    storage_worker = StorageWorkerProcess(INGEST_QUEUE_FILE, DEFAULT_DATABASE, WRITE_BATCH_SIZE, WRITE_FLUSH_INTERVAL)
+    storage_worker.start()
+    ingest_queue = IngestQueue(INGEST_QUEUE_FILE)
+
+    scheduler = PollingScheduler()
+
+    # Only the modules of configured sensor types are imported
+    for config in load_sensor_config():
+        sensor = create_sensor(config["type"], **config.get("options", {}))
+        if config.get("deadband") is not None:
+            sensor.configure_deadband(config["deadband"], config.get("heartbeat_interval", HEARTBEAT_INTERVAL))
+
+        sensor.configure_ingest_queue(ingest_queue)
+        scheduler.add_source(
+            config["name"], sensor, config.get("interval", SAVE_INTERVAL), config.get("timeout", POLL_TIMEOUT)
+        )
+
+    # Poll, insert and commit timings for monitoring, see sensor_reading.metrics
+    metrics_writer = MetricsFileWriter(metrics, METRICS_FILE)
+    metrics_writer.start()
+
+    try:
+        scheduler.run()
+
+    except KeyboardInterrupt:
+        scheduler.print_stats()
+
+    finally:
+        # Stop sensor threads and let the storage worker write the queued readings, then close shared db connections
+        # so the WAL is checkpointed on shutdown. Readings still queued are written on the next start.
+        for source in scheduler.sources.values():
+            try:
+                source.sensor.close()
+            except Exception as e:
+                print(e)
+
+        flush_all()
+        storage_worker.stop()
+        connections.close_all()
+        metrics_writer.stop()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,147 @@
+"""
+Align several sensors' readings on a common time grid
+
+Sources are polled at slightly different times, so comparing rooms or computing indoor - outdoor deltas needs every
+series resampled to the same timestamps first. Resampling is vectorised with binary searches over the sorted
+timestamp arrays. Grid points too far from any reading are NaN and flagged in a gap mask instead of being filled.
+"""
+
+import numpy as np
+
+from .changepoint import HEARTBEAT_INTERVAL, HOLD_FACTOR
+
+ALIGN_INTERVAL = 300  # in seconds, default grid spacing
+MAX_GAP = 600  # in seconds, readings further apart than this aren't interpolated across
+
+FIELDS = ["temperature", "humidity"]
+
+
+def make_grid(start_time, end_time, interval=ALIGN_INTERVAL) -> np.ndarray:
+    """Regular datetime64[ms] grid from start_time to end_time, on multiples of interval since the epoch"""
+    step = int(interval * 1000)
+    start_ms = -(-np.datetime64(start_time, "ms").astype(np.int64) // step) * step
+    end_ms = np.datetime64(end_time, "ms").astype(np.int64)
+
+    return np.arange(start_ms, end_ms + 1, step).astype("datetime64[ms]")
+
+
+def resample(timestamps, fields, grid, method="linear", max_gap=MAX_GAP):
+    """
+    Resample one sensor's fields onto grid
+
+    Args:
+        timestamps: Sorted datetime64 reading timestamps
+        fields (dict): Field -> reading values, NaN for missing readings
+        grid: Sorted datetime64 grid timestamps
+        method (str): "previous" takes the last reading at or before each grid point (as-of join), "nearest" the
+            closest reading and "linear" interpolates between the readings either side
+        max_gap (float): in seconds, max distance to the reading used for "previous" and "nearest" and max spacing of
+            the two readings for "linear", further grid points are gaps
+
+    Returns:
+        tuple: Field -> resampled values and boolean gap mask, set where there's no reading close enough. Values are
+            NaN in gaps and where the readings used are missing.
+    """
+    times = np.asarray(timestamps).astype("datetime64[ms]").astype(np.int64)
+    grid_times = np.asarray(grid).astype("datetime64[ms]").astype(np.int64)
+    fields = {field: np.asarray(values, dtype=np.float64) for field, values in fields.items()}
+    max_gap_ms = max_gap * 1000
+
+    n = len(times)
+    if n == 0:
+        return {field: np.full(len(grid_times), np.nan) for field in fields}, np.ones(len(grid_times), dtype=bool)
+
+    # Last reading at or before and first reading at or after each grid point, equal when the grid point is a reading
+    before = np.searchsorted(times, grid_times, side="right") - 1
+    after = np.searchsorted(times, grid_times, side="left")
+    has_before, has_after = before >= 0, after < n
+    before, after = np.clip(before, 0, n - 1), np.clip(after, 0, n - 1)
+
+    before_distance = np.where(has_before, grid_times - times[before], np.inf)
+    after_distance = np.where(has_after, times[after] - grid_times, np.inf)
+
+    if method == "previous":
+        valid = before_distance <= max_gap_ms
+        resampled = {field: values[before] for field, values in fields.items()}
+
+    elif method == "nearest":
+        source = np.where(after_distance < before_distance, after, before)
+        valid = np.minimum(before_distance, after_distance) <= max_gap_ms
+        resampled = {field: values[source] for field, values in fields.items()}
+
+    elif method == "linear":
+        span = before_distance + after_distance
+        valid = has_before & has_after & (span <= max_gap_ms)
+        weight = np.divide(before_distance, span, out=np.zeros(len(grid_times)), where=valid & (span > 0))
+        resampled = {
+            field: values[before] + weight * (values[after] - values[before]) for field, values in fields.items()
+        }
+
+    else:
+        raise ValueError(f"Unknown resampling method {method}")
+
+    return {field: np.where(valid, values, np.nan) for field, values in resampled.items()}, ~valid
+
+
+def align_columns(columns, grid, method="linear", max_gap=MAX_GAP) -> dict:
+    """
+    Resample several sensors' columns onto one grid
+
+    Args:
+        columns (dict): Sensor id -> dict of "timestamp" and field arrays, as returned by get_range_arrays
+        method (str or dict): Resampling method, or sensor id -> method
+        max_gap (float or dict): in seconds, or sensor id -> max gap
+
+    Returns:
+        dict: "timestamp" grid and sensor id -> dict of resampled field arrays and the "gap" mask
+    """
+    aligned = {"timestamp": grid}
+
+    for sensor_id, sensor_columns in columns.items():
+        sensor_method = method[sensor_id] if isinstance(method, dict) else method
+        sensor_max_gap = max_gap[sensor_id] if isinstance(max_gap, dict) else max_gap
+
+        fields = {field: sensor_columns[field] for field in FIELDS}
+        resampled, gap = resample(sensor_columns["timestamp"], fields, grid, sensor_method, sensor_max_gap)
+        aligned[sensor_id] = {**resampled, "gap": gap}
+
+    return aligned
+
+
+def align_sensors(
+    storage,
+    sensor_ids,
+    start_time,
+    end_time,
+    interval=ALIGN_INTERVAL,
+    method="linear",
+    max_gap=MAX_GAP,
+    step_sensor_ids=(),
+) -> dict:
+    """
+    Read raw readings of several sensors and align them on a regular grid
+
+    Sensors in step_sensor_ids are stored in change-point mode, their values are carried forward ("previous") for up
+    to a heartbeat instead of being interpolated.
+
+    Returns:
+        dict: See align_columns
+    """
+    step_max_gap = HEARTBEAT_INTERVAL * HOLD_FACTOR
+
+    # Readings just outside the range let the first and last grid points interpolate or carry forward
+    margin = np.timedelta64(int(max(max_gap, step_max_gap if step_sensor_ids else 0) * 1000), "ms")
+    query_start = (np.datetime64(start_time, "ms") - margin).astype(object)
+    query_end = (np.datetime64(end_time, "ms") + margin).astype(object)
+
+    columns = storage.get_range_arrays(sensor_ids, query_start, query_end)
+
+    methods = {sensor_id: "previous" if sensor_id in step_sensor_ids else method for sensor_id in sensor_ids}
+    max_gaps = {sensor_id: step_max_gap if sensor_id in step_sensor_ids else max_gap for sensor_id in sensor_ids}
+
+    return align_columns(columns, make_grid(start_time, end_time, interval), methods, max_gaps)
+
+
+def difference(aligned, sensor_a, sensor_b, field="temperature") -> np.ndarray:
+    """Field of sensor_a minus sensor_b on the aligned grid, e.g. indoor - outdoor temperature, NaN in either's gaps"""
+    return aligned[sensor_a][field] - aligned[sensor_b][field]
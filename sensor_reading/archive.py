@@ -0,0 +1,274 @@
+"""
+Long-term archive of raw readings in compressed columnar files
+
+Closed months are moved out of each sensor table into data/archive/<sensor_id>/<YYYY-MM>.npz (the local time month),
+holding UTC epoch millisecond timestamps like sqlite, temperatures and humidities as separate compressed arrays.
+Timestamps are converted to local time when read, so readings in the hour repeated when clocks go back are kept. Hourly and daily rollups stay in sqlite, so long-range plots
+never touch the archive. Readings before the end of a sensor's newest partition are read from the archive and later
+ones from sqlite. Archive all but the current and last KEEP_MONTHS months with:
+    python -m sensor_reading.archive [database] [months to keep] [--vacuum]
+"""
+
+from datetime import date, datetime
+import functools
+import os
+import sys
+
+import numpy as np
+
+from .connection import connections
+from .epoch import from_epoch_ms, to_epoch_ms, to_local_datetime64
+from .rollup import rollup_table
+from .schema import list_sensor_tables
+from .storage import DEFAULT_DATABASE, SensorStorage
+
+ARCHIVE_DIR = "data/archive"
+
+# Full months kept in sqlite before the current one
+KEEP_MONTHS = 2
+
+# Decompressed partitions kept in memory, about 0.5 MB per sensor month at a 2 minute interval
+ARCHIVE_CACHE_PARTITIONS = 64
+
+COLUMNS = ["timestamp", "temperature", "humidity"]
+
+# Marks partitions with UTC epoch timestamps, older ones hold local wall-clock time counted as if it were UTC
+EPOCH_MARKER = "utc_epoch"
+
+
+def month_start(value, months=0) -> datetime:
+    """First moment of the month of value, shifted by a number of months"""
+    month_index = value.year * 12 + value.month - 1 + months
+    return datetime(month_index // 12, month_index % 12 + 1, 1)
+
+
+def _local_ms_to_epoch_ms(local_ms):
+    """
+    Convert wall-clock milliseconds of partitions from before epoch timestamps, readings of the hour repeated when
+    clocks go back were already merged and can come out an hour off
+    """
+    offsets = to_local_datetime64(local_ms).astype(np.int64) - local_ms
+    return local_ms - offsets
+
+
+@functools.lru_cache(maxsize=ARCHIVE_CACHE_PARTITIONS)
+def _load_partition(filepath, mtime_ns):
+    """Load a partition's columns, mtime_ns is part of the cache key so rewritten partitions are reloaded"""
+    with np.load(filepath) as partition:
+        columns = {column: partition[column] for column in COLUMNS}
+        if EPOCH_MARKER not in partition:
+            columns["timestamp"] = _local_ms_to_epoch_ms(columns["timestamp"])
+
+    return columns
+
+
+class SensorArchive:
+    """
+    Monthly compressed NumPy partitions of raw readings per sensor
+    """
+
+    # Resolutions served from archived raw readings, 1 minute buckets are no coarser than the sample interval so their
+    # rollups are dropped with the raw rows
+    resolutions = [None, "1m"]
+
+    def __init__(self, archive_dir=ARCHIVE_DIR):
+        self.archive_dir = archive_dir
+
+        # Sensor id -> (directory mtime, partitions)
+        self._partitions = {}
+
+    def _partition_filepath(self, sensor_id, month):
+        return os.path.join(self.archive_dir, sensor_id, f"{month:%Y-%m}.npz")
+
+    def partitions(self, sensor_id) -> list:
+        """Get (month start, filepath) of the sensor's partitions, oldest first"""
+        sensor_dir = os.path.join(self.archive_dir, sensor_id)
+        try:
+            mtime_ns = os.stat(sensor_dir).st_mtime_ns
+        except FileNotFoundError:
+            return []
+
+        # Listing only changes when a partition is created or replaced, which updates the directory mtime
+        cached = self._partitions.get(sensor_id)
+        if (cached is not None) and (cached[0] == mtime_ns):
+            return cached[1]
+
+        partitions = []
+        for filename in os.listdir(sensor_dir):
+            name, extension = os.path.splitext(filename)
+            try:
+                month = datetime.strptime(name, "%Y-%m")
+            except ValueError:
+                # Temporary files of interrupted writes
+                continue
+
+            if extension == ".npz":
+                partitions.append((month, os.path.join(sensor_dir, filename)))
+
+        partitions.sort()
+        self._partitions[sensor_id] = (mtime_ns, partitions)
+
+        return partitions
+
+    def cutoff(self, sensor_id):
+        """Get the end of the sensor's newest partition, None if nothing is archived"""
+        partitions = self.partitions(sensor_id)
+        return month_start(partitions[-1][0], 1) if partitions else None
+
+    def read_partition(self, filepath) -> dict:
+        return _load_partition(filepath, os.stat(filepath).st_mtime_ns)
+
+    def write_partition(self, sensor_id, month, columns):
+        """
+        Merge columns into the sensor's partition for a month
+
+        The partition is written to a temporary file and swapped in, so readers never see a partial file
+
+        Args:
+            columns (dict): "timestamp" (UTC epoch milliseconds), "temperature" and "humidity" arrays
+        """
+        filepath = self._partition_filepath(sensor_id, month)
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+
+        if os.path.exists(filepath):
+            existing = self.read_partition(filepath)
+            columns = {column: np.concatenate([existing[column], columns[column]]) for column in COLUMNS}
+
+        # Sort by timestamp and drop readings archived twice
+        _, unique = np.unique(columns["timestamp"], return_index=True)
+        columns = {column: np.ascontiguousarray(values[unique]) for column, values in columns.items()}
+
+        tmp_filepath = filepath + ".tmp"
+        with open(tmp_filepath, "wb") as filewrite:
+            np.savez_compressed(filewrite, **columns, **{EPOCH_MARKER: np.array(True)})
+            filewrite.flush()
+            os.fsync(filewrite.fileno())
+
+        os.replace(tmp_filepath, filepath)
+
+    def iter_range(self, sensor_id, start_time, end_time):
+        """
+        Yield the sensor's archived columns between start_time and end_time one partition at a time, oldest first
+
+        Only partitions overlapping the range are read
+
+        Yields:
+            dict: "timestamp" (UTC epoch milliseconds), "temperature" and "humidity" arrays
+        """
+        start_ms, end_ms = to_epoch_ms(start_time), to_epoch_ms(end_time)
+        start_time, end_time = from_epoch_ms(start_ms), from_epoch_ms(end_ms)
+
+        for month, filepath in self.partitions(sensor_id):
+            # Partition pruning on the month in the file name
+            if (month > end_time) or (month_start(month, 1) <= start_time):
+                continue
+
+            partition = self.read_partition(filepath)
+            first = np.searchsorted(partition["timestamp"], start_ms, side="left")
+            last = np.searchsorted(partition["timestamp"], end_ms, side="right")
+
+            yield {column: partition[column][first:last] for column in COLUMNS}
+
+    def get_range_arrays(self, sensor_ids, start_time, end_time) -> dict:
+        """
+        Get archived readings between start_time and end_time
+
+        Returns:
+            dict: Sensor id -> dict of "timestamp" (datetime64[ms]), "temperature" and "humidity" arrays
+        """
+        results = {}
+        for sensor_id in sensor_ids:
+            chunks = list(self.iter_range(sensor_id, start_time, end_time))
+
+            results[sensor_id] = {
+                column: (
+                    np.concatenate([chunk[column] for chunk in chunks])
+                    if chunks
+                    else np.empty(0, dtype="i8" if column == "timestamp" else "f8")
+                )
+                for column in COLUMNS
+            }
+            results[sensor_id]["timestamp"] = to_local_datetime64(results[sensor_id]["timestamp"])
+
+        return results
+
+
+def archive_sensor(storage, archive, sensor_id, cutoff) -> int:
+    """
+    Move the sensor's readings older than cutoff from sqlite into monthly archive partitions
+
+    Partitions are written before the rows are deleted, so a failure leaves readings in both places and archiving
+    again merges them.
+
+    Args:
+        cutoff (datetime): Start of a month, readings before it are archived
+
+    Returns:
+        int: Number of readings archived
+    """
+    cutoff_ms = to_epoch_ms(cutoff)
+
+    # Holding the writer keeps new readings from landing between the read and the delete
+    with connections.writer(storage.database_filepath) as conn:
+        rows = conn.execute(
+            f"SELECT timestamp, temperature, humidity FROM {sensor_id} WHERE timestamp < ? ORDER BY timestamp",
+            (cutoff_ms,),
+        ).fetchall()
+        if not rows:
+            return 0
+
+        data = np.array(rows, dtype=[(column, "i8" if column == "timestamp" else "f8") for column in COLUMNS])
+        # Partitioned by local time month, timestamps stay UTC epochs
+        months = to_local_datetime64(data["timestamp"]).astype("datetime64[M]")
+
+        for month in np.unique(months):
+            month_data = data[months == month]
+            archive.write_partition(
+                sensor_id, month.astype(datetime), {column: month_data[column] for column in COLUMNS}
+            )
+
+        conn.execute(f"DELETE FROM {sensor_id} WHERE timestamp < ?", (cutoff_ms,))
+        for resolution in archive.resolutions:
+            if resolution is not None:
+                conn.execute(f"DELETE FROM {rollup_table(resolution, sensor_id)} WHERE bucket < ?", (cutoff_ms,))
+
+    return len(rows)
+
+
+def archive_storage(storage, archive, keep_months=KEEP_MONTHS, today=None) -> dict:
+    """
+    Archive every sensor's closed months except the last keep_months
+
+    Returns:
+        dict: Sensor id -> number of readings archived
+    """
+    cutoff = month_start(today or date.today(), -keep_months)
+
+    return {
+        sensor_id: archive_sensor(storage, archive, sensor_id, cutoff)
+        for sensor_id in list_sensor_tables(connections.reader(storage.database_filepath))
+    }
+
+
+def vacuum(storage):
+    """Shrink the database file after archiving, deleted pages are otherwise only reused"""
+    with connections.writer(storage.database_filepath) as conn:
+        conn.execute("VACUUM")
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if arg != "--vacuum"]
+    database_filepath = args[0] if len(args) > 0 else DEFAULT_DATABASE
+    keep_months = int(args[1]) if len(args) > 1 else KEEP_MONTHS
+
+    storage = SensorStorage(database_filepath)
+    archive = SensorArchive(os.path.join(os.path.dirname(database_filepath), "archive"))
+
+    for sensor_id, n_archived in archive_storage(storage, archive, keep_months).items():
+        print(f"{database_filepath} {sensor_id}: {n_archived} readings archived to {archive.archive_dir}")
+
+    if "--vacuum" in sys.argv:
+        vacuum(storage)
+        print(f"{database_filepath}: {os.path.getsize(database_filepath) / 1e6:.1f} MB after vacuum")
+
+    connections.close_all()
@@ -0,0 +1,119 @@
+"""
+Change-point compression of readings
+
+Sources like Open-Meteo repeat the same value for many polls. In change-point mode a reading is only stored when a
+field moved more than its deadband since the last stored reading, or when heartbeat_interval has passed so gaps in
+logging stay visible. The series is a step function: each stored value holds until the next stored reading.
+
+The ingest side is plain Python, NumPy is only imported by the query side reconstruction functions.
+"""
+
+HEARTBEAT_INTERVAL = 3600  # in seconds, max time between stored readings in change-point mode
+
+# Heartbeats land on the first poll past the interval, so values are held a bit longer than heartbeat_interval
+HOLD_FACTOR = 1.5
+
+FIELDS = ["temperature", "humidity"]
+
+
+def is_change(previous, row, deadband, heartbeat_interval=HEARTBEAT_INTERVAL) -> bool:
+    """
+    Check whether a reading has to be stored
+
+    Args:
+        previous (tuple): Last stored (timestamp, temperature, humidity) row, None if nothing is stored
+        row (tuple): New (timestamp, temperature, humidity) row
+        deadband (dict): Field -> largest change that isn't stored, fields not listed are stored on any change
+        heartbeat_interval (float): in seconds, readings this long after the last stored one are always stored
+    """
+    if previous is None:
+        return True
+
+    if (row[0] - previous[0]).total_seconds() >= heartbeat_interval:
+        return True
+
+    for field, previous_value, value in zip(FIELDS, previous[1:], row[1:]):
+        if (previous_value is None) or (value is None):
+            if previous_value is not value:
+                return True
+        elif abs(value - previous_value) > deadband.get(field, 0.0):
+            return True
+
+    return False
+
+
+def filter_changes(rows, deadband, heartbeat_interval=HEARTBEAT_INTERVAL, previous=None):
+    """Yield the rows change-point mode would store, rows must be sorted by timestamp"""
+    for row in rows:
+        if is_change(previous, row, deadband, heartbeat_interval):
+            previous = row
+            yield row
+
+
+def hold_last(columns, end_time, heartbeat_interval=HEARTBEAT_INTERVAL) -> dict:
+    """
+    Extend a step series with its last values up to end_time so the final step is drawn
+
+    The hold stops a heartbeat after the last reading, past that the logger has stopped and there's no data.
+
+    Args:
+        columns (dict): "timestamp" (datetime64) and field arrays of stored change points
+        end_time (datetime): End of the plotted range
+
+    Returns:
+        dict: Columns with one extra point, unchanged if there's nothing to hold
+    """
+    import numpy as np
+
+    timestamps = columns["timestamp"]
+    if len(timestamps) == 0:
+        return columns
+
+    hold_time = min(
+        np.datetime64(end_time, "ms"),
+        timestamps[-1] + np.timedelta64(int(heartbeat_interval * HOLD_FACTOR * 1000), "ms"),
+    )
+    if hold_time <= timestamps[-1]:
+        return columns
+
+    return {
+        column: np.append(values, hold_time if column == "timestamp" else values[-1])
+        for column, values in columns.items()
+    }
+
+
+def resample_steps(columns, start_time, end_time, interval, heartbeat_interval=HEARTBEAT_INTERVAL) -> dict:
+    """
+    Reconstruct a regular series from change points, each sample takes the last stored value at or before it
+
+    Samples before the first change point or more than a heartbeat after the last stored reading are NaN
+
+    Args:
+        interval (float): in seconds, spacing of the reconstructed samples
+
+    Returns:
+        dict: "timestamp" (datetime64[ms]) and field arrays on the regular grid
+    """
+    import numpy as np
+
+    grid = np.arange(
+        np.datetime64(start_time, "ms"), np.datetime64(end_time, "ms") + 1, np.timedelta64(int(interval * 1000), "ms")
+    )
+    timestamps = columns["timestamp"].astype("datetime64[ms]")
+
+    resampled = {"timestamp": grid}
+    fields = [column for column in columns if column != "timestamp"]
+    if len(timestamps) == 0:
+        resampled.update({field: np.full(len(grid), np.nan) for field in fields})
+        return resampled
+
+    # Index of the last change point at or before each sample
+    source = np.searchsorted(timestamps, grid, side="right") - 1
+    valid = source >= 0
+    source = np.maximum(source, 0)
+    valid &= grid - timestamps[source] <= np.timedelta64(int(heartbeat_interval * HOLD_FACTOR * 1000), "ms")
+
+    for field in fields:
+        resampled[field] = np.where(valid, np.asarray(columns[field], dtype=np.float64)[source], np.nan)
+
+    return resampled
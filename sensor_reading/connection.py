@@ -0,0 +1,110 @@
+"""
+Shared sqlite connection manager for the sensor databases
+
+Keeps one long-lived read connection per thread and one writer connection per database file instead of opening and
+closing a connection for every reading or query. Databases run in WAL mode so dashboard reads don't block on the
+logger's writes and the other way round.
+"""
+
+import contextlib
+import os
+import sqlite3
+import threading
+
+from .metrics import metrics
+
+# Applied to every connection when it's opened
+PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",  # Safe with WAL, only the last transactions can be lost on power failure
+    "temp_store": "MEMORY",
+    "cache_size": -8000,  # in KiB
+    "mmap_size": 64 * 1024 * 1024,
+    "busy_timeout": 5000,  # in milliseconds
+}
+
+commit_seconds = metrics.histogram("db_commit_seconds", "Time to commit a write transaction")
+
+
+class ConnectionManager:
+    """
+    Per-thread read connections and a single lock-protected writer connection per database
+    """
+
+    def __init__(self, pragmas=None):
+        self.pragmas = PRAGMAS if pragmas is None else pragmas
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writers = {}
+        self._writer_locks = {}
+        self._readers = []
+
+    def _connect(self, database_filepath, **kwargs):
+        conn = sqlite3.connect(database_filepath, **kwargs)
+        for pragma, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {pragma} = {value}")
+
+        return conn
+
+    def reader(self, database_filepath) -> sqlite3.Connection:
+        """Get the calling thread's read connection for a database, opened on first use"""
+        if not hasattr(self._local, "readers"):
+            self._local.readers = {}
+
+        conn = self._local.readers.get(database_filepath)
+        if conn is None:
+            conn = self._connect(database_filepath)
+            conn.execute("PRAGMA query_only = ON")
+            self._local.readers[database_filepath] = conn
+
+            with self._lock:
+                self._readers.append(conn)
+
+        return conn
+
+    @contextlib.contextmanager
+    def writer(self, database_filepath):
+        """
+        Context manager holding the database's writer connection
+
+        Writes inside the block are committed on exit or rolled back if an exception is raised. Only one thread can
+        hold the writer for a database at a time.
+        """
+        with self._lock:
+            if database_filepath not in self._writers:
+                self._writers[database_filepath] = self._connect(database_filepath, check_same_thread=False)
+                self._writer_locks[database_filepath] = threading.Lock()
+
+            conn = self._writers[database_filepath]
+            writer_lock = self._writer_locks[database_filepath]
+
+        with writer_lock:
+            try:
+                yield conn
+                with commit_seconds.time(database=os.path.basename(database_filepath)):
+                    conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def close_all(self):
+        """Close every open connection, writers are checkpointed on close"""
+        with self._lock:
+            for conn in self._readers:
+                with contextlib.suppress(sqlite3.ProgrammingError):
+                    conn.close()
+
+            for database_filepath, conn in self._writers.items():
+                with self._writer_locks[database_filepath]:
+                    conn.close()
+
+            self._readers = []
+            self._writers = {}
+            self._writer_locks = {}
+
+        self._local = threading.local()
+
+
+# Shared by all sensor dbs and the dashboard in a process
+connections = ConnectionManager()
@@ -0,0 +1,210 @@
+"""
+DHT22 reader running on its own thread
+
+The sensor is read in bursts of n_samples readings spaced by the DHT22's minimum read interval. Failed reads (the
+DHT22 often fails its checksum) are retried a bounded number of times with exponential backoff, and the median of a
+burst is published to a queue so single bad readings are filtered out. The device handle is opened once and kept
+for the lifetime of the reader. FakeDHTBackend stands in for the hardware so the reader runs without GPIO.
+"""
+
+from datetime import datetime
+import queue
+import random
+import statistics
+import threading
+import time
+
+MIN_READ_INTERVAL = 2.0  # in seconds, the DHT22 can't be read more often
+READ_INTERVAL = 120  # in seconds, time between bursts
+N_SAMPLES = 5  # readings per burst, the median is published
+MAX_RETRIES = 5  # failed reads per burst before giving up
+MAX_BACKOFF = 16.0  # in seconds
+QUEUE_SIZE = 100  # readings kept when nothing consumes them, oldest are dropped first
+
+
+class AdafruitDHTBackend:
+    """
+    DHT22 on a GPIO pin through the adafruit_dht library
+    """
+
+    def __init__(self, pin="D4"):
+        # Imported here so the reader and fake backend work on machines without GPIO
+        import adafruit_dht
+        import board
+
+        self.device = adafruit_dht.DHT22(getattr(board, pin))
+
+    def read(self):
+        """Get (temperature, humidity), raises RuntimeError when a read fails"""
+        temperature = self.device.temperature
+        humidity = self.device.humidity
+
+        if (temperature is None) or (humidity is None):
+            raise RuntimeError("DHT22 returned no data")
+
+        return temperature, humidity
+
+    def close(self):
+        self.device.exit()
+
+
+class FakeDHTBackend:
+    """
+    Simulated DHT22 with noise, failed reads and occasional spikes, for testing without the sensor
+    """
+
+    def __init__(self, temperature=20.0, humidity=50.0, noise=0.1, failure_rate=0.2, spike_rate=0.05, seed=0):
+        self.temperature = temperature
+        self.humidity = humidity
+        self.noise = noise
+        self.failure_rate = failure_rate
+        self.spike_rate = spike_rate
+
+        self.rng = random.Random(seed)
+        self.n_reads = 0
+        self.closed = False
+
+    def read(self):
+        if self.closed:
+            raise RuntimeError("Device closed")
+
+        self.n_reads += 1
+        if self.rng.random() < self.failure_rate:
+            raise RuntimeError("Checksum did not validate. Try again.")
+
+        temperature = self.temperature + self.rng.gauss(0, self.noise)
+        humidity = self.humidity + self.rng.gauss(0, self.noise)
+        if self.rng.random() < self.spike_rate:
+            # Corrupted reading that passed the checksum
+            temperature += 50
+
+        return round(temperature, 1), round(humidity, 1)
+
+    def close(self):
+        self.closed = True
+
+
+class DHTReader:
+    """
+    Read a DHT backend in bursts on a background thread and publish median (timestamp, temperature, humidity)
+    readings to a queue
+    """
+
+    def __init__(
+        self,
+        backend,
+        read_interval=READ_INTERVAL,
+        n_samples=N_SAMPLES,
+        max_retries=MAX_RETRIES,
+        min_read_interval=MIN_READ_INTERVAL,
+        max_backoff=MAX_BACKOFF,
+    ):
+        self.backend = backend
+        self.read_interval = read_interval
+        self.n_samples = n_samples
+        self.max_retries = max_retries
+        self.min_read_interval = min_read_interval
+        self.max_backoff = max_backoff
+
+        self.readings = queue.Queue(maxsize=QUEUE_SIZE)
+        self.stop_event = threading.Event()
+        self._thread = None
+
+        self.n_reads = 0
+        self.n_failed_reads = 0
+        self.n_failed_bursts = 0
+        self.n_dropped = 0
+
+    def read_burst(self):
+        """
+        Take up to n_samples readings, retrying failed reads at most max_retries times
+
+        Returns:
+            tuple: (timestamp, median temperature, median humidity), None if every read failed
+        """
+        samples = []
+        n_failures = 0
+        backoff = self.min_read_interval
+
+        while (len(samples) < self.n_samples) and (n_failures <= self.max_retries) and not self.stop_event.is_set():
+            try:
+                samples.append(self.backend.read())
+                self.n_reads += 1
+                backoff = self.min_read_interval
+            except RuntimeError as e:
+                # Checksum and timing errors are expected now and then, back off before the next read
+                print(e)
+                n_failures += 1
+                self.n_failed_reads += 1
+                backoff = min(backoff * 2, self.max_backoff)
+
+            if (len(samples) < self.n_samples) and (n_failures <= self.max_retries):
+                self.stop_event.wait(backoff)
+
+        if not samples:
+            return None
+
+        return (
+            datetime.now(),
+            statistics.median(sample[0] for sample in samples),
+            statistics.median(sample[1] for sample in samples),
+        )
+
+    def _publish(self, reading):
+        try:
+            self.readings.put_nowait(reading)
+        except queue.Full:
+            # Nothing is consuming readings, keep the newest ones
+            self.readings.get_nowait()
+            self.readings.put_nowait(reading)
+            self.n_dropped += 1
+
+    def _run(self):
+        next_deadline = time.monotonic()
+
+        while not self.stop_event.is_set():
+            try:
+                reading = self.read_burst()
+            except Exception as e:
+                # Anything other than a failed read, keep the thread alive and try again next interval
+                print(e)
+                reading = None
+
+            if reading is None:
+                self.n_failed_bursts += 1
+            else:
+                self._publish(reading)
+
+            next_deadline += self.read_interval
+            self.stop_event.wait(max(0.0, next_deadline - time.monotonic()))
+
+    def get_readings(self) -> list:
+        """Get every reading published since the last call without blocking"""
+        readings = []
+        while True:
+            try:
+                readings.append(self.readings.get_nowait())
+            except queue.Empty:
+                return readings
+
+    def start(self):
+        self.stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="dht-reader", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the thread and release the device"""
+        self.stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+        self.backend.close()
+
+    def stats(self) -> dict:
+        return {
+            "reads": self.n_reads,
+            "failed_reads": self.n_failed_reads,
+            "failed_bursts": self.n_failed_bursts,
+            "dropped": self.n_dropped,
+        }
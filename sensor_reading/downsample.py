@@ -0,0 +1,150 @@
+import numpy as np
+
+
+def _to_numeric(x) -> np.ndarray:
+    """Convert timestamps (ISO strings, datetimes or numbers) to float64 for area/bucket calculations"""
+    x = np.asarray(x)
+
+    if x.dtype.kind in "iuf":
+        return x.astype(np.float64)
+
+    return x.astype("datetime64[us]").astype(np.int64).astype(np.float64)
+
+
+def lttb_indices(x, y, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling
+
+    Keeps the first and last point and picks one point per bucket which forms the largest triangle with the
+    previously selected point and the mean of the next bucket. Preserves the visual shape of the series.
+
+    Args:
+        x: Sorted x values (timestamps or numbers)
+        y: y values
+        n_out (int): Target number of points
+
+    Returns:
+        np.ndarray: Sorted indices into the original series
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = _to_numeric(x)
+    y = np.asarray(y, dtype=np.float64)
+
+    # Bucket edges for the n - 2 inner points, first and last point are always kept
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    starts, sizes = edges[:-1], np.diff(edges)
+
+    # Average point of each bucket, computed for all buckets at once. The next bucket's average is the third point of
+    # the triangle, the last bucket uses the final point
+    valid = ~np.isnan(y[: n - 1])
+    mean_x = np.add.reduceat(x[: n - 1], starts) / sizes
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_y = np.add.reduceat(np.where(valid, y[: n - 1], 0.0), starts) / np.add.reduceat(valid, starts)
+    next_x = np.append(mean_x[1:], x[n - 1])
+    next_y = np.append(mean_y[1:], y[n - 1])
+
+    # Buckets as rows of a padded matrix, so each step is a few operations on one row instead of slicing
+    width = sizes.max()
+    offsets = np.arange(width)
+    padding = offsets >= sizes[:, None]
+    bucket_index = np.minimum(starts[:, None] + offsets, n - 2)
+    bucket_x = x[bucket_index]
+    bucket_y = np.where(padding, np.nan, y[bucket_index])
+    has_nan = np.isnan(bucket_y).any(axis=1)
+
+    indices = np.empty(n_out, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+
+    # Python floats keep the per-bucket scalar arithmetic cheap
+    next_x, next_y, has_nan, bucket_starts = next_x.tolist(), next_y.tolist(), has_nan.tolist(), starts.tolist()
+    area = np.empty(width)
+    selected_x, selected_y = float(x[0]), float(y[0])
+    for i in range(n_out - 2):
+        avg_x, avg_y = next_x[i], next_y[i]
+        if avg_y != avg_y:
+            # Next bucket has no readings
+            avg_y = selected_y
+
+        # Triangle area for every candidate in the bucket (constant factor of 0.5 dropped), written as a linear function
+        # of the candidate's x and y
+        a, b = selected_x - avg_x, avg_y - selected_y
+        np.multiply(bucket_y[i], a, out=area)
+        area += bucket_x[i] * b
+        area -= a * selected_y + b * selected_x
+        np.abs(area, out=area)
+        if has_nan[i]:
+            np.nan_to_num(area, copy=False, nan=-1.0)
+
+        j = int(area.argmax())
+        selected = bucket_starts[i] + j
+        indices[i + 1] = selected
+        selected_x, selected_y = float(x[selected]), float(y[selected])
+
+    return indices
+
+
+def minmax_indices(y, n_out: int) -> np.ndarray:
+    """
+    Min/max bucketing downsampling
+
+    Splits the series into n_out / 2 equal sized buckets and keeps the minimum and maximum of each bucket,
+    so peaks are never lost. Fully vectorised.
+
+    Args:
+        y: y values
+        n_out (int): Target number of points
+
+    Returns:
+        np.ndarray: Sorted indices into the original series
+    """
+    n = len(y)
+    if n_out >= n or n_out < 2:
+        return np.arange(n)
+
+    y = np.asarray(y, dtype=np.float64)
+    n_buckets = n_out // 2
+    starts = np.linspace(0, n, n_buckets + 1).astype(np.int64)[:-1]
+
+    # NaN values are pushed to the opposite extreme so they are never selected
+    min_pos = np.minimum.reduceat(np.where(np.isnan(y), np.inf, y), starts)
+    max_pos = np.maximum.reduceat(np.where(np.isnan(y), -np.inf, y), starts)
+
+    # Map bucket extremes back to indices, first match within each bucket
+    bucket_ids = np.repeat(np.arange(n_buckets), np.diff(np.append(starts, n)))
+    idx = np.arange(n)
+    is_min = y == min_pos[bucket_ids]
+    is_max = y == max_pos[bucket_ids]
+
+    min_idx = np.full(n_buckets, -1, dtype=np.int64)
+    max_idx = np.full(n_buckets, -1, dtype=np.int64)
+    # Reverse assignment so the first occurrence within each bucket wins
+    min_idx[bucket_ids[is_min][::-1]] = idx[is_min][::-1]
+    max_idx[bucket_ids[is_max][::-1]] = idx[is_max][::-1]
+
+    indices = np.concatenate([min_idx, max_idx])
+    return np.unique(indices[indices >= 0])
+
+
+def downsample_indices(x, y, n_out: int, method: str = "lttb") -> np.ndarray:
+    """
+    Get indices of points to keep so the series has at most roughly n_out points
+
+    Args:
+        x: Sorted x values
+        y: y values
+        n_out (int): Target number of points
+        method (str): "lttb" or "minmax"
+
+    Returns:
+        np.ndarray: Sorted indices into the original series
+    """
+    if method == "lttb":
+        return lttb_indices(x, y, n_out)
+    elif method == "minmax":
+        return minmax_indices(y, n_out)
+    else:
+        raise ValueError(f"Unknown downsampling method {method}")
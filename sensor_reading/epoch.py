@@ -0,0 +1,100 @@
+"""
+Conversion between local times and the UTC epoch millisecond timestamps stored in sqlite
+
+Readings and rollup buckets are stored as integer milliseconds since the Unix epoch in UTC, so range filters are
+integer comparisons on the primary key and DST changes can't make timestamps repeat or go backwards. Everything above
+storage keeps working in local wall-clock time: naive datetimes and dates passed in are local times in the system
+timezone (the TZ environment variable) and readings come back as local times. sqlite's 'localtime' and 'utc' modifiers
+use the same timezone, so the SQL expressions below agree with the Python conversions.
+"""
+
+from datetime import date, datetime, time, timezone
+
+DAY_MS = 86400000
+
+# Epoch milliseconds -> local ISO 8601 text with milliseconds
+LOCAL_ISO_SQL = "strftime('%Y-%m-%d %H:%M:%f', {column} / 1000.0, 'unixepoch', 'localtime')"
+
+# Local time text -> epoch milliseconds, converts timestamps of databases from before epoch storage
+LOCAL_TEXT_TO_EPOCH_MS_SQL = "CAST(round((julianday({column}, 'utc') - 2440587.5) * 86400000) AS INTEGER)"
+
+# Epoch milliseconds -> epoch milliseconds of the start of the local strftime bucket containing it
+BUCKET_SQL = (
+    "CAST(strftime('%s', strftime('{bucket_format}', {column} / 1000, 'unixepoch', 'localtime'), 'utc') AS INTEGER)"
+    " * 1000"
+)
+
+
+def to_epoch_ms(value):
+    """
+    Convert a time to UTC epoch milliseconds
+
+    Args:
+        value: Aware datetime, naive datetime or date in local time, ISO string of either, or epoch milliseconds
+
+    Returns:
+        int: Epoch milliseconds, None if value is None
+    """
+    if (value is None) or isinstance(value, int):
+        return value
+
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    elif not isinstance(value, datetime):
+        if not isinstance(value, date):
+            # Other numbers, e.g. NumPy integers
+            return int(value)
+        value = datetime.combine(value, time())
+
+    try:
+        # Naive datetimes are taken as local time by timestamp()
+        return round(value.timestamp() * 1000)
+    except (ValueError, OverflowError, OSError):
+        # Open-ended bounds like 0001-01-01 are out of the platform's local time range, the offset doesn't matter there
+        return round(value.replace(tzinfo=value.tzinfo or timezone.utc).timestamp() * 1000)
+
+
+def from_epoch_ms(epoch_ms) -> datetime:
+    """Convert epoch milliseconds to a naive local datetime"""
+    return datetime.fromtimestamp(epoch_ms / 1000)
+
+
+def _utc_offset_ms(epoch_ms) -> int:
+    local_time = datetime.fromtimestamp(epoch_ms / 1000, timezone.utc).astimezone()
+    return round(local_time.utcoffset().total_seconds() * 1000)
+
+
+def to_local_datetime64(epoch_ms):
+    """
+    Convert an array of epoch milliseconds to local wall-clock datetime64[ms]
+
+    The local UTC offset is sampled once a day over the array's range and offset changes are found by bisection, so
+    the cost doesn't grow with the number of timestamps
+    """
+    import numpy as np
+
+    epoch_ms = np.asarray(epoch_ms, dtype=np.int64)
+    if len(epoch_ms) == 0:
+        return epoch_ms.astype("datetime64[ms]")
+
+    start, end = int(epoch_ms.min()), int(epoch_ms.max())
+    transitions, offsets = [], [_utc_offset_ms(start)]
+
+    sample = start
+    while sample < end:
+        next_sample = min(sample + DAY_MS, end)
+        if _utc_offset_ms(next_sample) != offsets[-1]:
+            # First millisecond with the new offset
+            low, high = sample, next_sample
+            while high - low > 1:
+                middle = (low + high) // 2
+                low, high = (middle, high) if _utc_offset_ms(middle) == offsets[-1] else (low, middle)
+
+            transitions.append(high)
+            offsets.append(_utc_offset_ms(high))
+
+        sample = next_sample
+
+    local_offsets = np.array(offsets, dtype=np.int64)[np.searchsorted(transitions, epoch_ms, side="right")]
+
+    return (epoch_ms + local_offsets).astype("datetime64[ms]")
@@ -1,9 +1,10 @@
 from datetime import datetime
 import json
-import sqlite3
 import requests
 
+from .http_client import http_client
 from .sensor_db import BaseSensorDB
+from .storage import DEFAULT_DATABASE
 
 
 class ExternalTemperatureData:
@@ -36,7 +37,7 @@ class ExternalTemperatureData:
             return False
 
 
-class ExternalTemperatureDB(BaseSensorDB):
+class ExternalTemperatureDB(BaseSensorDB, sensor_type="external"):
     """
     Get external temperature data from public API and save to DB
     """
@@ -44,33 +45,26 @@ class ExternalTemperatureDB(BaseSensorDB):
     latitude = 55.9453
     longitude = -3.182
 
+    url = "https://api.open-meteo.com/v1/forecast"
+
     def __init__(self):
-        self.database_filepath = "data/external.db"
+        self.database_filepath = DEFAULT_DATABASE
+        self.sensor_id = "outside"
         self._create_db_table()
 
     def get_new_reading(self):
-        # Connect to the database
-        self.conn = sqlite3.connect(self.database_filepath)
-        self.conn_cursor = self.conn.cursor()
-
         try:
-            url = "https://api.open-meteo.com/v1/forecast"
-
             data = {"latitude": self.latitude, "longitude": self.longitude, "current_weather": True}
 
             timestamp = datetime.now()
 
-            response = requests.get(url, data)
+            response_json = http_client.get_json(self.url, data)
 
-            temperature = response.json()["current_weather"]["temperature"]
+            temperature = response_json["current_weather"]["temperature"]
             humidity = 0
 
-            # Insert data into the table
-            self.conn_cursor.execute(
-                "INSERT INTO data (timestamp, temperature, humidity) VALUES (?, ?, ?)",
-                (timestamp, temperature, humidity),
-            )
-            self.conn.commit()
+            # Insert data into the table and update rollups
+            self._insert_reading(timestamp, temperature, humidity)
 
             success = True
 
@@ -78,8 +72,6 @@ class ExternalTemperatureDB(BaseSensorDB):
             print(e)
             success = False
 
-        self.conn.close()
-
         return success
 
 
@@ -0,0 +1,64 @@
+"""
+Shared HTTP client for API based sensor dbs
+
+Requests go through one requests.Session so connections are kept alive and reused between polls instead of paying
+for a new TCP and TLS handshake each time. Idempotent requests are retried with exponential backoff on connection
+errors and 429 / 5xx responses, and every request has a connect and read timeout.
+"""
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_TIMEOUT = (3.05, 10)  # in seconds, (connect, read)
+RETRIES = 3
+BACKOFF_FACTOR = 0.5  # sleeps 0.5, 1, 2 s between retries
+
+
+class HTTPClient:
+    """
+    Pooled keep-alive session with timeouts and retries which parses JSON responses once
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, retries=RETRIES, backoff_factor=BACKOFF_FACTOR, pool_maxsize=4):
+        self.timeout = timeout
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(429, 500, 502, 503, 504),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(max_retries=retry, pool_connections=4, pool_maxsize=pool_maxsize)
+
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def request_json(self, method, url, **kwargs) -> dict:
+        """
+        Send request and return the parsed JSON body
+
+        Raises:
+            requests.HTTPError: Response has an error status after retries
+            requests.RequestException: Connection failed or timed out after retries
+        """
+        kwargs.setdefault("timeout", self.timeout)
+
+        response = self.session.request(method, url, **kwargs)
+        response.raise_for_status()
+
+        return response.json()
+
+    def get_json(self, url, params=None, **kwargs) -> dict:
+        return self.request_json("GET", url, params=params, **kwargs)
+
+    def post_json(self, url, data=None, **kwargs) -> dict:
+        return self.request_json("POST", url, data=data, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+# Shared by all API sensor dbs in a process
+http_client = HTTPClient()
@@ -0,0 +1,297 @@
+"""
+Persisted ingest queue between sensor pollers and a storage worker process
+
+Pollers publish readings to a small sqlite spool file instead of writing the sensor database, so a slow sensor database
+(rollup updates, checkpoints, archive runs, a slow SD card) never stalls a poll and slow sensors never hold the writer.
+A single storage worker process takes readings off the spool in batches, inserts them with SensorStorage and only then
+removes them, so readings published while the worker is down or restarting stay on disk and are written when it's
+back. Readings replayed after a crash between insert and removal are skipped by the insert, not stored twice.
+
+The spool holds about max_pending readings. Publishers wait up to publish_timeout when it's full and then drop the
+reading, so disk and memory use stay bounded if the worker can't keep up. Run a worker on its own with:
+    python -m sensor_reading.ingest [queue file] [database]
+"""
+
+import multiprocessing
+import signal
+import sys
+import threading
+import time
+
+from .connection import connections
+from .epoch import to_epoch_ms
+from .metrics import METRICS_FILE, MetricsFileWriter, metrics
+from .storage import DEFAULT_DATABASE, SensorStorage
+
+INGEST_QUEUE_FILE = "data/ingest_queue.db"
+MAX_PENDING = 100000  # readings, over a month of the default sensors with the worker down
+PUBLISH_TIMEOUT = 5  # in seconds, max time a poll waits for space in a full queue
+FULL_CHECK_INTERVAL = 0.1  # in seconds, time between checks of a full queue
+
+WORKER_BATCH_SIZE = 30  # readings per db transaction
+WORKER_FLUSH_INTERVAL = 300  # in seconds, max time a reading waits in the queue when the batch isn't full
+WORKER_CHECK_INTERVAL = 1  # in seconds, time between checks of the queue
+WORKER_RETRY_INTERVAL = 10  # in seconds, time before retrying a failed write
+WORKER_RESTART_INTERVAL = 5  # in seconds, time between checks that the worker process is alive
+WORKER_STOP_TIMEOUT = 30  # in seconds, time the worker gets to drain the queue on stop
+
+# The worker's metrics, node_exporter's textfile collector reads every .prom file in the directory
+WORKER_METRICS_FILE = METRICS_FILE.replace(".prom", "_storage.prom")
+
+published = metrics.counter("ingest_published_total", "Readings published to the ingest queue")
+dropped = metrics.counter("ingest_dropped_total", "Readings dropped because the ingest queue was full")
+written = metrics.counter("ingest_written_total", "Readings written from the ingest queue by the storage worker")
+worker_restarts = metrics.counter("ingest_worker_restarts_total", "Storage worker processes restarted after exiting")
+
+
+class IngestQueue:
+    """
+    Bounded first-in first-out queue of (sensor_id, timestamp, temperature, humidity) readings in a sqlite file, shared
+    by every process opening the same file
+    """
+
+    def __init__(self, queue_filepath=INGEST_QUEUE_FILE, max_pending=MAX_PENDING, publish_timeout=PUBLISH_TIMEOUT):
+        self.queue_filepath = queue_filepath
+        self.max_pending = max_pending
+        self.publish_timeout = publish_timeout
+
+        with connections.writer(queue_filepath) as conn:
+            # AUTOINCREMENT so ids only go up, even after the queue was emptied
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS queue (id integer PRIMARY KEY AUTOINCREMENT, sensor_id text, "
+                "timestamp integer, temperature real, humidity real, queued_at real)"
+            )
+
+    def pending(self) -> int:
+        """Number of readings in the queue"""
+        # Only the oldest readings are removed, so ids are contiguous apart from rolled back inserts
+        conn = connections.reader(self.queue_filepath)
+        return conn.execute("SELECT coalesce(max(id) - min(id) + 1, 0) FROM queue").fetchone()[0]
+
+    def put(self, sensor_id, row) -> bool:
+        """
+        Add a reading, waiting up to publish_timeout while the queue is full
+
+        Args:
+            row (tuple): (timestamp, temperature, humidity), naive datetimes are local times
+
+        Returns:
+            bool: False if the queue stayed full and the reading was dropped
+        """
+        deadline = time.monotonic() + self.publish_timeout
+        while self.pending() >= self.max_pending:
+            if time.monotonic() >= deadline:
+                print(f"Ingest queue full, dropping {sensor_id} reading")
+                dropped.inc(sensor=sensor_id)
+                return False
+
+            time.sleep(FULL_CHECK_INTERVAL)
+
+        timestamp, temperature, humidity = row
+        with connections.writer(self.queue_filepath) as conn:
+            conn.execute(
+                "INSERT INTO queue (sensor_id, timestamp, temperature, humidity, queued_at) VALUES (?, ?, ?, ?, ?)",
+                (sensor_id, to_epoch_ms(timestamp), temperature, humidity, time.time()),
+            )
+
+        published.inc(sensor=sensor_id)
+        return True
+
+    def peek(self, max_rows) -> list:
+        """Get up to max_rows of the oldest readings without removing them, as (id, sensor_id, row, queued_at)"""
+        rows = connections.reader(self.queue_filepath).execute(
+            "SELECT id, sensor_id, timestamp, temperature, humidity, queued_at FROM queue ORDER BY id LIMIT ?",
+            (max_rows,),
+        )
+
+        return [(id, sensor_id, (timestamp, t, h), queued_at) for id, sensor_id, timestamp, t, h, queued_at in rows]
+
+    def remove(self, last_id):
+        """Remove readings up to and including last_id once they're stored"""
+        with connections.writer(self.queue_filepath) as conn:
+            conn.execute("DELETE FROM queue WHERE id <= ?", (last_id,))
+
+
+class StorageWorker:
+    """
+    Write readings from an ingest queue to the sensor database in batches
+
+    A batch is written once batch_size readings are queued or the oldest one has waited flush_interval seconds, and
+    everything left is written on stop. Failed writes keep the readings queued and are retried.
+    """
+
+    def __init__(
+        self,
+        ingest_queue,
+        storage,
+        batch_size=WORKER_BATCH_SIZE,
+        flush_interval=WORKER_FLUSH_INTERVAL,
+        check_interval=WORKER_CHECK_INTERVAL,
+    ):
+        self.ingest_queue = ingest_queue
+        self.storage = storage
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.check_interval = check_interval
+
+        self.stop_event = threading.Event()
+        self._tables = set()
+
+    def write_batch(self, force=False) -> int:
+        """
+        Write the oldest batch_size readings if the batch is due
+
+        Args:
+            force (bool): Write a partial batch even if its oldest reading hasn't waited flush_interval
+
+        Returns:
+            int: Number of readings taken off the queue
+        """
+        batch = self.ingest_queue.peek(self.batch_size)
+        if not batch:
+            return 0
+
+        if (not force) and (len(batch) < self.batch_size) and (time.time() - batch[0][3] < self.flush_interval):
+            return 0
+
+        rows_per_sensor = {}
+        for _, sensor_id, row, _ in batch:
+            rows_per_sensor.setdefault(sensor_id, []).append(row)
+
+        for sensor_id, rows in rows_per_sensor.items():
+            if sensor_id not in self._tables:
+                self.storage.create_table(sensor_id)
+                self._tables.add(sensor_id)
+
+            # Readings already stored before a crash are skipped when the batch is replayed
+            self.storage.insert(sensor_id, rows, skip_existing=True)
+            written.inc(len(rows), sensor=sensor_id)
+
+        self.ingest_queue.remove(batch[-1][0])
+        return len(batch)
+
+    def run(self):
+        """Write batches until stopped, then write everything left in the queue"""
+        while not self.stop_event.is_set():
+            try:
+                # Catch up on a backlog without waiting between full batches
+                while self.write_batch() == self.batch_size:
+                    pass
+            except Exception as e:
+                print(e)
+                self.stop_event.wait(WORKER_RETRY_INTERVAL)
+                continue
+
+            self.stop_event.wait(self.check_interval)
+
+        try:
+            while self.write_batch(force=True):
+                pass
+        except Exception as e:
+            # Readings stay queued for the next worker
+            print(e)
+
+    def stop(self):
+        self.stop_event.set()
+
+
+def run_storage_worker(queue_filepath, database_filepath, batch_size, flush_interval, metrics_filepath):
+    """Entry point of the storage worker process, runs until the process gets SIGTERM or SIGINT"""
+    worker = StorageWorker(IngestQueue(queue_filepath), SensorStorage(database_filepath), batch_size, flush_interval)
+
+    # Sent by StorageWorkerProcess.stop, and by systemctl stop and Ctrl+C to the whole process group. Drain the queue
+    # before exiting.
+    for signum in [signal.SIGTERM, signal.SIGINT]:
+        signal.signal(signum, lambda signum, frame: worker.stop())
+
+    metrics_writer = MetricsFileWriter(metrics, metrics_filepath)
+    metrics_writer.start()
+
+    try:
+        worker.run()
+    finally:
+        connections.close_all()
+        metrics_writer.stop()
+
+
+class StorageWorkerProcess:
+    """
+    Run a StorageWorker in a child process, restarted if it exits before stop is called
+
+    The child is started with the spawn method so it doesn't inherit the parent's sqlite connections or sensor threads.
+    It's stopped with SIGTERM rather than a shared event, whose lock a killed child could leave held.
+    """
+
+    def __init__(
+        self,
+        queue_filepath=INGEST_QUEUE_FILE,
+        database_filepath=DEFAULT_DATABASE,
+        batch_size=WORKER_BATCH_SIZE,
+        flush_interval=WORKER_FLUSH_INTERVAL,
+        metrics_filepath=WORKER_METRICS_FILE,
+        restart_interval=WORKER_RESTART_INTERVAL,
+    ):
+        self.queue_filepath = queue_filepath
+        self.database_filepath = database_filepath
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.metrics_filepath = metrics_filepath
+        self.restart_interval = restart_interval
+
+        self._context = multiprocessing.get_context("spawn")
+        self._stopping = threading.Event()
+        self._monitor_thread = None
+
+        self.process = None
+        self.n_restarts = 0
+
+    def _start_process(self):
+        self.process = self._context.Process(
+            target=run_storage_worker,
+            args=(
+                self.queue_filepath,
+                self.database_filepath,
+                self.batch_size,
+                self.flush_interval,
+                self.metrics_filepath,
+            ),
+            name="storage-worker",
+        )
+        self.process.start()
+
+    def _monitor(self):
+        while not self._stopping.wait(self.restart_interval):
+            if not self.process.is_alive():
+                print(f"Storage worker exited with code {self.process.exitcode}, restarting")
+                self.n_restarts += 1
+                worker_restarts.inc()
+                self._start_process()
+
+    def start(self):
+        self._stopping.clear()
+        self._start_process()
+
+        self._monitor_thread = threading.Thread(target=self._monitor, name="storage-worker-monitor", daemon=True)
+        self._monitor_thread.start()
+
+    def stop(self, timeout=WORKER_STOP_TIMEOUT):
+        """Let the worker write the queued readings and exit, readings it doesn't get to stay queued"""
+        self._stopping.set()
+        if self._monitor_thread is not None:
+            self._monitor_thread.join()
+            self._monitor_thread = None
+
+        self.process.terminate()
+        self.process.join(timeout)
+        if self.process.is_alive():
+            print(f"Storage worker didn't stop within {timeout} s, killing it")
+            self.process.kill()
+            self.process.join()
+
+
+if __name__ == "__main__":
+    # Run a storage worker in the foreground until Ctrl+C, e.g. to write readings left queued while no logger runs
+    queue_filepath = sys.argv[1] if len(sys.argv) > 1 else INGEST_QUEUE_FILE
+    database_filepath = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_DATABASE
+
+    run_storage_worker(queue_filepath, database_filepath, WORKER_BATCH_SIZE, WORKER_FLUSH_INTERVAL, WORKER_METRICS_FILE)
@@ -0,0 +1,106 @@
+"""
+In-process cache of each sensor's latest reading
+
+Readers are served from memory. The cache is invalidated through sqlite's data_version pragma, which changes whenever
+another connection (in this or another process, e.g. the logger) commits to the database file, and after a TTL as a
+safety net. Sensor dbs in the same process also publish readings straight into the cache, so they show up before a
+buffered write is flushed.
+"""
+
+import sqlite3
+import threading
+import time
+import weakref
+
+LATEST_TTL = 60  # in seconds, max age of cached readings when the database hasn't changed
+
+# Database filepath -> caches reading from it, for publish_reading
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+class DataVersion:
+    """
+    Change counter of a database file which changes whenever another connection or process commits to it
+    """
+
+    def __init__(self, database_filepath):
+        self.database_filepath = database_filepath
+
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def get(self) -> int:
+        with self._lock:
+            if self._conn is None:
+                # Dedicated connection, data_version only counts commits made by other connections
+                self._conn = sqlite3.connect(self.database_filepath, check_same_thread=False)
+
+            return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+
+class LatestReadingCache:
+    """
+    Latest (timestamp, temperature, humidity) reading per sensor with change counter and TTL invalidation
+    """
+
+    def __init__(self, storage, sensor_ids, ttl=LATEST_TTL):
+        self.storage = storage
+        self.sensor_ids = list(sensor_ids)
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        self._version = DataVersion(storage.database_filepath)
+        self._data_version = None
+        self._fetch_time = None
+        self._latest = {sensor_id: None for sensor_id in self.sensor_ids}
+
+        self.n_hits = 0
+        self.n_misses = 0
+
+        with _caches_lock:
+            _caches.setdefault(storage.database_filepath, weakref.WeakSet()).add(self)
+
+    def _merge(self, sensor_id, row):
+        current = self._latest.get(sensor_id)
+        if (current is None) or (str(row[0]) >= str(current[0])):
+            self._latest[sensor_id] = row
+
+    def update(self, sensor_id, row):
+        """Set a sensor's latest reading if it's newer than the cached one"""
+        with self._lock:
+            if sensor_id in self._latest:
+                self._merge(sensor_id, row)
+
+    def get(self) -> dict:
+        """
+        Get latest reading of each sensor
+
+        Returns:
+            dict: Sensor id -> list with the latest row, empty if the sensor has no readings
+        """
+        with self._lock:
+            data_version = self._version.get()
+            expired = (self._fetch_time is None) or (time.monotonic() - self._fetch_time > self.ttl)
+
+            if expired or (data_version != self._data_version):
+                self.n_misses += 1
+                for sensor_id, rows in self.storage.get_latest(self.sensor_ids).items():
+                    if rows:
+                        self._merge(sensor_id, rows[0])
+
+                self._data_version = data_version
+                self._fetch_time = time.monotonic()
+            else:
+                self.n_hits += 1
+
+            return {sensor_id: [row] if row is not None else [] for sensor_id, row in self._latest.items()}
+
+
+def publish_reading(database_filepath, sensor_id, row):
+    """Update every cache in this process reading from the database with a new reading"""
+    with _caches_lock:
+        caches = list(_caches.get(database_filepath, []))
+
+    for cache in caches:
+        cache.update(sensor_id, row)
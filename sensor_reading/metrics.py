@@ -0,0 +1,208 @@
+"""
+Counters and histograms for hot path timings, rendered in the Prometheus text format
+
+Metrics are kept in memory per process. The dashboard serves them from its /metrics route and the logger writes them
+to a text file (e.g. for node_exporter's textfile collector), so slow polls and queries show up without reading
+stdout. Under gunicorn each worker process has its own metrics.
+"""
+
+import bisect
+import contextlib
+import os
+import threading
+import time
+
+# Upper bounds of histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)  # in s
+SIZE_BUCKETS = (1e3, 1e4, 3e4, 1e5, 3e5, 1e6, 3e6, 1e7)  # in bytes
+
+METRICS_FILE = "data/metrics.prom"
+METRICS_WRITE_INTERVAL = 60  # in seconds
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+
+    escaped = [
+        (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for name, value in labels
+    ]
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    Total that only goes up, e.g. number of polls per source
+    """
+
+    kind = "counter"
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels):
+        return self._values.get(tuple(sorted(labels.items())), 0)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in sorted(self._values.items())]
+
+
+class Histogram:
+    """
+    Counts of observations in cumulative buckets with their sum, e.g. latencies or payload sizes
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+
+        self._lock = threading.Lock()
+        self._values = {}  # labels -> [bucket counts (last one is +Inf), sum]
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        index = bisect.bisect_left(self.buckets, value)
+
+        with self._lock:
+            values = self._values.get(key)
+            if values is None:
+                values = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+
+            values[0][index] += 1
+            values[1] += value
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        """Observe the time in seconds spent in the block, also when it raises"""
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start_time, **labels)
+
+    def get(self, **labels) -> dict:
+        """Count and sum of the observations with these labels"""
+        counts, total = self._values.get(tuple(sorted(labels.items())), [[0], 0.0])
+        return {"count": sum(counts), "sum": total}
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else _format_value(float(bound))
+                    samples.append((f"{self.name}_bucket", key + (("le", le),), cumulative))
+
+                samples.append((f"{self.name}_sum", key, total))
+                samples.append((f"{self.name}_count", key, cumulative))
+
+        return samples
+
+
+class MetricsRegistry:
+    """
+    Named counters and histograms of a process
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _get_or_create(self, metric_class, name, *args):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = metric_class(name, *args)
+            elif not isinstance(metric, metric_class):
+                raise ValueError(f"Metric {name} is already registered as a {metric.kind}")
+
+        return metric
+
+    def counter(self, name, documentation) -> Counter:
+        """Get the counter with this name, created on first use"""
+        return self._get_or_create(Counter, name, documentation)
+
+    def histogram(self, name, documentation, buckets=LATENCY_BUCKETS) -> Histogram:
+        """Get the histogram with this name, created on first use"""
+        return self._get_or_create(Histogram, name, documentation, buckets)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, filepath=METRICS_FILE):
+        """Write all metrics to a file, replaced atomically so readers never see a partial file"""
+        if os.path.dirname(filepath):
+            os.makedirs(os.path.dirname(filepath), exist_ok=True)
+
+        tmp_filepath = f"{filepath}.tmp"
+        with open(tmp_filepath, "w") as filewrite:
+            filewrite.write(self.render())
+        os.replace(tmp_filepath, filepath)
+
+
+class MetricsFileWriter:
+    """
+    Write a metrics registry to a text file every interval on a background thread, and once more on stop
+    """
+
+    def __init__(self, registry, filepath=METRICS_FILE, interval=METRICS_WRITE_INTERVAL):
+        self.registry = registry
+        self.filepath = filepath
+        self.interval = interval
+
+        self.stop_event = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.registry.write_textfile(self.filepath)
+            except OSError as e:
+                print(e)
+
+    def start(self):
+        self.stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="metrics-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+        self.registry.write_textfile(self.filepath)
+
+
+# Shared by the logger, storage and dashboard in a process
+metrics = MetricsRegistry()
@@ -1,9 +1,11 @@
 from datetime import datetime
 import json
 import requests
-import sqlite3
 
+from .http_client import http_client
+from .oauth import REFRESH_MARGIN, TOKEN_CACHE_FILE, TokenManager
 from .sensor_db import BaseSensorDB
+from .storage import DEFAULT_DATABASE
 
 
 class NestAPIData:
@@ -67,81 +69,79 @@ class NestAPIData:
             return False
 
 
-class NestAPIDB(BaseSensorDB):
+class NestAPIDB(BaseSensorDB, sensor_type="nest"):
     """
     Class for getting Nest API data and adding to db
     """
 
     api_config_file = "api_token.json"
 
-    def __init__(self):
+    token_url = "https://www.googleapis.com/oauth2/v4/token"
+    devices_url = (
+        "https://smartdevicemanagement.googleapis.com/v1/enterprises/3f7b67ed-ad48-43d0-b6cf-9b05132cee6b/devices"
+    )
+    token_refresh_margin = REFRESH_MARGIN
+
+    def __init__(self, token_cache_file=TOKEN_CACHE_FILE):
         with open(self.api_config_file) as fileread:
             self.api_info = json.load(fileread)
 
-        self.database_filepath = "data/nest.db"
+        self.database_filepath = DEFAULT_DATABASE
+        self.sensor_id = "livingroom"
         self._create_db_table()
 
-        self.get_access_token()
-
-    def get_access_token(self):
-        print("Getting new access token")
-
-        data = {
-            "client_id": self.api_info["client_id"],
-            "client_secret": self.api_info["client_secret"],
-            "refresh_token": self.api_info["refresh_token"],
-            "grant_type": "refresh_token",
-        }
-        url = "https://www.googleapis.com/oauth2/v4/token?"
-
-        response = requests.post(url, data)
-        print(response.json())
-
-        self.access_token = response.json()["access_token"]
+        # Cached token is reused across restarts and refreshed in the background before it expires
+        self.token_manager = TokenManager(
+            self.token_url,
+            self.api_info["client_id"],
+            self.api_info["client_secret"],
+            self.api_info["refresh_token"],
+            cache_file=token_cache_file,
+            refresh_margin=self.token_refresh_margin,
+        )
+        self.token_manager.start()
 
     def get_new_reading(self) -> bool:
-        # Connect to the database
-        self.conn = sqlite3.connect(self.database_filepath)
-        self.conn_cursor = self.conn.cursor()
-
+        access_token = None
         try:
-            headers = {"Content-Type": "application/json", "Authorization": f"Bearer {self.access_token}"}
-
-            url = "https://smartdevicemanagement.googleapis.com/v1/enterprises/3f7b67ed-ad48-43d0-b6cf-9b05132cee6b/devices"
+            access_token = self.token_manager.get_token()
+            headers = {"Content-Type": "application/json", "Authorization": f"Bearer {access_token}"}
 
             timestamp = datetime.now()
 
-            response = requests.get(url, headers=headers)
-            # print(json.dumps(response.json(), indent=2))
+            # Parse the response once and reuse the device traits
+            response_json = http_client.get_json(self.devices_url, headers=headers)
+            # print(json.dumps(response_json, indent=2))
 
-            temperature = response.json()["devices"][0]["traits"]["sdm.devices.traits.Temperature"][
-                "ambientTemperatureCelsius"
-            ]
-
-            humidity = response.json()["devices"][0]["traits"]["sdm.devices.traits.Humidity"]["ambientHumidityPercent"]
+            traits = response_json["devices"][0]["traits"]
+            temperature = traits["sdm.devices.traits.Temperature"]["ambientTemperatureCelsius"]
+            humidity = traits["sdm.devices.traits.Humidity"]["ambientHumidityPercent"]
 
             print(f"Nest: timestamp {timestamp} temp {temperature}, humidity {humidity}")
 
-            # Insert data into the table
-            self.conn_cursor.execute(
-                "INSERT INTO data (timestamp, temperature, humidity) VALUES (?, ?, ?)",
-                (timestamp, temperature, humidity),
-            )
-            self.conn.commit()
+            # Insert data into the table and update rollups
+            self._insert_reading(timestamp, temperature, humidity)
 
             success = True
 
-        except KeyError as e:
+        except requests.HTTPError as e:
             print(e)
-            self.get_access_token()
+            if e.response is not None and e.response.status_code == 401:
+                # Token was revoked before it expired, drop it so a new one is fetched
+                self.token_manager.invalidate(access_token)
 
             success = False
 
-        # Close connection to db
-        self.conn.close()
+        except KeyError as e:
+            print(e)
+            success = False
 
         return success
 
+    def close(self):
+        self.token_manager.stop()
+        super().close()
+
 
 if __name__ == "__main__":
     # Test sensor data
@@ -0,0 +1,194 @@
+"""
+OAuth access token manager shared by every process using the same credentials
+
+Access tokens are cached in a local file with their expiry time, so restarting the logger or running another process
+reuses the cached token instead of requesting a new one. A background thread refreshes the token refresh_margin
+before it expires, so get_token() returns straight from memory on the polling hot path. Refreshes hold an exclusive
+lock on the cache file and re-read it first, so when several processes are due at once only one requests a token.
+"""
+
+import fcntl
+import json
+import os
+import threading
+import time
+
+from .http_client import http_client
+
+TOKEN_CACHE_FILE = "data/oauth_token.json"
+REFRESH_MARGIN = 300  # in seconds, refresh this long before the token expires
+RETRY_INTERVAL = 30  # in seconds, time between attempts after a failed refresh
+MIN_REFRESH_INTERVAL = 1  # in seconds, stops short-lived tokens from refreshing in a busy loop
+
+
+class TokenManager:
+    """
+    Get an OAuth access token from a refresh token and keep it fresh on a background thread
+    """
+
+    def __init__(
+        self,
+        token_url,
+        client_id,
+        client_secret,
+        refresh_token,
+        cache_file=TOKEN_CACHE_FILE,
+        refresh_margin=REFRESH_MARGIN,
+        retry_interval=RETRY_INTERVAL,
+    ):
+        self.token_url = token_url
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.refresh_token = refresh_token
+        self.cache_file = cache_file
+        self.refresh_margin = refresh_margin
+        self.retry_interval = retry_interval
+
+        self.access_token = None
+        self.expires_at = 0.0  # wall clock time, shared with other processes through the cache file
+        self._rejected_token = None
+
+        self._lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self._refresh_event = threading.Event()
+        self._thread = None
+
+        self.n_refreshes = 0
+        self.n_cache_loads = 0
+        self.n_failed_refreshes = 0
+
+    def _valid(self, margin=0.0) -> bool:
+        return (self.access_token is not None) and (time.time() < self.expires_at - margin)
+
+    def _read_cache(self) -> bool:
+        """Use the cached token if it's for the same client and newer than the one in memory"""
+        try:
+            with open(self.cache_file) as fileread:
+                token = json.load(fileread)
+        except (OSError, ValueError):
+            return False
+
+        if (
+            (token.get("client_id") != self.client_id)
+            or (token.get("access_token") == self._rejected_token)
+            or (token.get("expires_at", 0.0) <= self.expires_at)
+        ):
+            return False
+
+        self.access_token = token["access_token"]
+        self.expires_at = token["expires_at"]
+        self.n_cache_loads += 1
+
+        return True
+
+    def _write_cache(self):
+        token = {"client_id": self.client_id, "access_token": self.access_token, "expires_at": self.expires_at}
+
+        # Write to a temporary file and rename so readers never see a partial file, only this user can read it
+        tmp_filepath = f"{self.cache_file}.tmp"
+        fd = os.open(tmp_filepath, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as filewrite:
+            json.dump(token, filewrite)
+        os.replace(tmp_filepath, self.cache_file)
+
+    def refresh(self, margin=None):
+        """
+        Request a new access token unless another process already cached one valid for longer than margin
+
+        Raises:
+            requests.RequestException: Token request failed
+        """
+        margin = self.refresh_margin if margin is None else margin
+        directory = os.path.dirname(self.cache_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._lock, open(f"{self.cache_file}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+            if self._read_cache() and self._valid(margin):
+                return
+
+            data = {
+                "client_id": self.client_id,
+                "client_secret": self.client_secret,
+                "refresh_token": self.refresh_token,
+                "grant_type": "refresh_token",
+            }
+            requested_at = time.time()
+            response_json = http_client.post_json(self.token_url, data)
+
+            self.access_token = response_json["access_token"]
+            # Expiry counted from when the request was sent so network latency can't make a token look valid
+            self.expires_at = requested_at + response_json.get("expires_in", 3600)
+            self._write_cache()
+            self.n_refreshes += 1
+
+            print(f"Got new access token, expires in {self.expires_at - time.time():.0f} s")
+
+    def get_token(self) -> str:
+        """
+        Get a valid access token, only waits on the token endpoint when there's no valid token at all (first start
+        without a cache, or the background refresh has been failing until the token expired)
+        """
+        if self._valid():
+            return self.access_token
+
+        if not self._read_cache() or not self._valid():
+            self.refresh(margin=0.0)
+
+        return self.access_token
+
+    def invalidate(self, token):
+        """
+        Drop a token the API rejected, the background thread gets a new one
+
+        Only the token that was rejected is dropped, a newer token already refreshed by another thread is kept
+        """
+        with self._lock:
+            if token != self.access_token:
+                return
+
+            self._rejected_token = token
+            self.access_token = None
+            self.expires_at = 0.0
+
+        self._refresh_event.set()
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            try:
+                if not self._valid(self.refresh_margin):
+                    self.refresh()
+                wait = max(MIN_REFRESH_INTERVAL, self.expires_at - self.refresh_margin - time.time())
+            except Exception as e:
+                # Keep the current token until it expires and try again
+                print(e)
+                self.n_failed_refreshes += 1
+                wait = self.retry_interval
+
+            self._refresh_event.wait(wait)
+            self._refresh_event.clear()
+
+    def start(self):
+        """Load the cached token or get a new one, then refresh in the background"""
+        self.get_token()
+
+        self.stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="oauth-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self._refresh_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self) -> dict:
+        return {
+            "refreshes": self.n_refreshes,
+            "cache_loads": self.n_cache_loads,
+            "failed_refreshes": self.n_failed_refreshes,
+            "expires_in": round(self.expires_at - time.time()),
+        }
@@ -0,0 +1,85 @@
+"""
+Registry of sensor db types by name
+
+Built-in types are registered as "module:Class" paths and only imported when a sensor of that type is created, so the
+logger loads just the sensor modules its config uses and tools that only need storage never import sensor or HTTP
+libraries. BaseSensorDB subclasses register themselves with a sensor_type class keyword when they're defined.
+
+Sensors logged by save_data come from sensors.json, e.g.
+    [{"name": "Pi", "type": "dht22"}, {"name": "External", "type": "external", "interval": 300}]
+List the registered types and configured sensors with:
+    python -m sensor_reading.registry
+"""
+
+import importlib
+import json
+import os
+
+SENSOR_CONFIG_FILE = "sensors.json"
+
+# Sensor type -> "module:Class" path, replaced by the class once it's imported
+_registry = {
+    "dht22": "sensor_reading.sensor:DHTDB",
+    "nest": "sensor_reading.nest:NestAPIDB",
+    "external": "sensor_reading.external:ExternalTemperatureDB",
+}
+
+# Used without a config file. Each entry has a name and type, optionally interval and timeout (in seconds), options
+# passed to the constructor, and deadband / heartbeat_interval for change-point mode
+DEFAULT_SENSORS = [
+    {"name": "Pi", "type": "dht22"},
+    {"name": "Nest", "type": "nest"},
+    # Open-Meteo only updates its current values every 15 min, so only changes and heartbeats are stored
+    {"name": "External", "type": "external", "deadband": {"temperature": 0.0, "humidity": 0.0}},
+]
+
+
+def register_sensor(sensor_type, target):
+    """
+    Register a sensor db type
+
+    Args:
+        target: BaseSensorDB subclass, or "module:Class" path imported on first use
+    """
+    _registry[sensor_type] = target
+
+
+def get_sensor_class(sensor_type):
+    """Get the class of a sensor type, importing its module on first use"""
+    try:
+        target = _registry[sensor_type]
+    except KeyError:
+        raise ValueError(f"Unknown sensor type {sensor_type}, registered types: {', '.join(_registry)}")
+
+    if isinstance(target, str):
+        module_name, class_name = target.split(":")
+        # Importing the module registers the class through BaseSensorDB.__init_subclass__
+        target = getattr(importlib.import_module(module_name), class_name)
+        _registry[sensor_type] = target
+
+    return target
+
+
+def create_sensor(sensor_type, **options):
+    """Create a sensor db of a registered type, options are passed to its constructor"""
+    return get_sensor_class(sensor_type)(**options)
+
+
+def sensor_types() -> list:
+    return list(_registry)
+
+
+def load_sensor_config(config_file=SENSOR_CONFIG_FILE) -> list:
+    """Load the sensors to log, DEFAULT_SENSORS if there's no config file"""
+    if not os.path.exists(config_file):
+        return [dict(sensor) for sensor in DEFAULT_SENSORS]
+
+    with open(config_file) as fileread:
+        return json.load(fileread)
+
+
+if __name__ == "__main__":
+    print(f"Sensor types: {', '.join(sensor_types())}")
+
+    for sensor in load_sensor_config():
+        print(f"{sensor['name']}: {sensor['type']} -> {_registry.get(sensor['type'], 'not registered')}")
@@ -0,0 +1,164 @@
+"""
+Pre-aggregated rollup tables for the sensor data table
+
+Each resolution has a table keyed on bucket start time holding the number of readings in the bucket and min, max, sum
+and count of the non-missing values of each field, so long date ranges can be plotted from a few hundred rows. Buckets are keyed on the UTC epoch milliseconds of their
+start, like the raw readings. Minute and hour buckets are whole multiples of their size since the epoch, so the hour
+repeated when clocks go back gets two buckets. Day buckets start at local midnight. Rollups are updated on insert by
+BaseSensorDB and can be rebuilt for existing databases with:
+    python -m sensor_reading.rollup data/sensors.db
+"""
+
+from datetime import datetime
+import sqlite3
+import sys
+
+from .epoch import BUCKET_SQL, from_epoch_ms, to_epoch_ms
+
+# Resolution name -> (bucket size in seconds, strftime format of local bucket start or None for buckets aligned to the
+# epoch), finest first
+RESOLUTIONS = {
+    "1m": (60, None),
+    "1h": (3600, None),
+    "1d": (86400, "%Y-%m-%d 00:00:00"),
+}
+
+FIELDS = ["temperature", "humidity"]
+
+# Bucket means of FIELDS, missing values count towards neither the sum nor the field's count
+MEAN_COLUMNS = ", ".join(f"{field}_sum / {field}_count" for field in FIELDS)
+
+
+def rollup_table(resolution, table_name="data"):
+    return f"{table_name}_{resolution}"
+
+
+def create_rollup_tables(conn, table_name="data"):
+    columns = ", ".join(
+        f"{field}_min real, {field}_max real, {field}_sum real, {field}_count integer" for field in FIELDS
+    )
+
+    for resolution in RESOLUTIONS:
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {rollup_table(resolution, table_name)} "
+            f"(bucket integer PRIMARY KEY, {columns}, count integer) WITHOUT ROWID"
+        )
+
+
+def _upsert_sql(resolution, table_name="data"):
+    columns = ", ".join(f"{field}_min, {field}_max, {field}_sum, {field}_count" for field in FIELDS)
+    placeholders = ", ".join("?, ?, ?, ?" for _ in FIELDS)
+
+    # Missing readings are stored as NULL, coalesce keeps them from wiping out the bucket aggregates
+    updates = []
+    for field in FIELDS:
+        for name in ["min", "max"]:
+            column = f"{field}_{name}"
+            updates.append(
+                f"{column} = {name}(coalesce({column}, excluded.{column}), coalesce(excluded.{column}, {column}))"
+            )
+
+        column = f"{field}_sum"
+        updates.append(f"{column} = coalesce({column}, 0) + coalesce(excluded.{column}, 0)")
+
+        column = f"{field}_count"
+        updates.append(f"{column} = {column} + excluded.{column}")
+
+    return (
+        f"INSERT INTO {rollup_table(resolution, table_name)} (bucket, {columns}, count) VALUES (?, {placeholders}, 1) "
+        f"ON CONFLICT(bucket) DO UPDATE SET {', '.join(updates)}, count = count + 1"
+    )
+
+
+def bucket_start(epoch_ms, resolution) -> int:
+    """Get the epoch milliseconds of the start of the resolution's bucket containing epoch_ms"""
+    bucket_seconds, bucket_format = RESOLUTIONS[resolution]
+    if bucket_format is None:
+        return epoch_ms - epoch_ms % (bucket_seconds * 1000)
+
+    local_start = from_epoch_ms(epoch_ms).strftime(bucket_format)
+    return to_epoch_ms(datetime.strptime(local_start, "%Y-%m-%d %H:%M:%S"))
+
+
+def _bucket_start_sql(resolution, column):
+    """SQL expression of bucket_start"""
+    bucket_seconds, bucket_format = RESOLUTIONS[resolution]
+    if bucket_format is None:
+        return f"({column} - {column} % {bucket_seconds * 1000})"
+
+    return BUCKET_SQL.format(bucket_format=bucket_format, column=column)
+
+
+def update_rollups(conn, rows, table_name="data"):
+    """
+    Add readings to the rollup tables, without committing
+
+    Args:
+        conn (sqlite3.Connection): Open database connection
+        rows (list): (timestamp, temperature, humidity) tuples with epoch millisecond timestamps
+    """
+    for resolution in RESOLUTIONS:
+        conn.executemany(
+            _upsert_sql(resolution, table_name),
+            [
+                (bucket_start(timestamp, resolution), *(value for v in values for value in (v, v, v, v is not None)))
+                for timestamp, *values in rows
+            ],
+        )
+
+
+def backfill_rollups(conn, table_name="data"):
+    """
+    Rebuild rollup tables from the raw data table, without committing
+
+    Buckets before the oldest raw reading are kept, they hold the rollups of readings moved to the archive
+    """
+    create_rollup_tables(conn, table_name)
+
+    aggregates = ", ".join(f"min({field}), max({field}), sum({field}), count({field})" for field in FIELDS)
+    columns = ", ".join(f"{field}_min, {field}_max, {field}_sum, {field}_count" for field in FIELDS)
+
+    for resolution in RESOLUTIONS:
+        table = rollup_table(resolution, table_name)
+        conn.execute(
+            f"DELETE FROM {table} WHERE bucket >= "
+            f"(SELECT {_bucket_start_sql(resolution, 'min(timestamp)')} FROM {table_name})"
+        )
+        conn.execute(
+            f"INSERT INTO {table} (bucket, {columns}, count) "
+            f"SELECT {_bucket_start_sql(resolution, 'timestamp')} AS bucket, {aggregates}, count(*) "
+            f"FROM {table_name} GROUP BY bucket"
+        )
+
+
+def choose_resolution(start_time, end_time, target_points):
+    """
+    Pick the coarsest rollup resolution that still gives at least target_points buckets over the range
+
+    Returns:
+        str: Resolution name, or None if the range needs raw data
+    """
+    span = (end_time - start_time).total_seconds()
+
+    for resolution, (bucket_seconds, _) in reversed(RESOLUTIONS.items()):
+        if span / bucket_seconds >= target_points:
+            return resolution
+
+    return None
+
+
+if __name__ == "__main__":
+    from .schema import list_sensor_tables, migrate
+
+    for database_filepath in sys.argv[1:]:
+        conn = sqlite3.connect(database_filepath)
+
+        for table_name in list_sensor_tables(conn) or ["data"]:
+            migrate(conn, table_name)
+
+            backfill_rollups(conn, table_name)
+            conn.commit()
+
+            print(f"{database_filepath} {table_name}: rollups rebuilt for {', '.join(RESOLUTIONS)}")
+
+        conn.close()
@@ -0,0 +1,166 @@
+"""
+Concurrent polling scheduler for sensor dbs
+
+Each source is polled on its own thread with a fixed interval. Deadlines are computed from the start time so slow
+polls don't make the cycle drift, and a poll that runs past its timeout is left to finish in the background while the
+source skips deadlines until it's free again.
+"""
+
+import concurrent.futures
+import threading
+import time
+
+from .metrics import metrics
+
+poll_seconds = metrics.histogram("sensor_poll_seconds", "Time to get a reading from a source, including timeouts")
+polls = metrics.counter("sensor_polls_total", "Polls by source and result (ok, failed or timeout)")
+missed_deadlines = metrics.counter("sensor_missed_deadlines_total", "Poll deadlines skipped because a source was busy")
+
+
+class PollingSource:
+    """
+    Sensor db with its polling interval, timeout and latency / deadline statistics
+    """
+
+    def __init__(self, name, sensor, interval, timeout=None):
+        self.name = name
+        self.sensor = sensor
+        self.interval = interval
+        self.timeout = interval if timeout is None else timeout
+
+        self.future = None
+
+        self.n_polls = 0
+        self.n_failed = 0
+        self.n_timeouts = 0
+        self.n_missed = 0
+        self.last_latency = None
+        self.max_latency = 0.0
+        self.total_latency = 0.0
+
+    def record(self, latency, success):
+        self.n_polls += 1
+        self.n_failed += 0 if success else 1
+        self.last_latency = latency
+        self.max_latency = max(self.max_latency, latency)
+        self.total_latency += latency
+
+    def stats(self) -> dict:
+        return {
+            "polls": self.n_polls,
+            "failed": self.n_failed,
+            "timeouts": self.n_timeouts,
+            "missed_deadlines": self.n_missed,
+            "last_latency": self.last_latency,
+            "mean_latency": self.total_latency / self.n_polls if self.n_polls else None,
+            "max_latency": self.max_latency,
+        }
+
+
+class PollingScheduler:
+    """
+    Poll several BaseSensorDB sources concurrently, each with its own interval, timeout and drift-free deadline
+    """
+
+    def __init__(self, report_interval=600):
+        self.report_interval = report_interval  # in seconds, time between printing source stats
+
+        self.sources = {}
+        self.stop_event = threading.Event()
+
+        self._executor = None
+        self._threads = []
+
+    def add_source(self, name, sensor, interval, timeout=None):
+        self.sources[name] = PollingSource(name, sensor, interval, timeout)
+
+    def _poll(self, source):
+        """Run one poll in the executor and wait for it up to the source timeout"""
+        if (source.future is not None) and (not source.future.done()):
+            # Previous poll timed out and is still running, don't pile up calls to the same sensor
+            print(f"{source.name} sensor still busy, skipping poll")
+            source.n_missed += 1
+            missed_deadlines.inc(source=source.name)
+            return
+
+        start_time = time.perf_counter()
+        source.future = self._executor.submit(source.sensor.get_new_reading)
+
+        result = None
+        try:
+            success = bool(source.future.result(timeout=source.timeout))
+        except concurrent.futures.TimeoutError:
+            print(f"{source.name} sensor timed out after {source.timeout} s")
+            source.n_timeouts += 1
+            success = False
+            result = "timeout"
+        except Exception as e:
+            print(e)
+            success = False
+
+        latency = time.perf_counter() - start_time
+        source.record(latency, success)
+        poll_seconds.observe(latency, source=source.name)
+        polls.inc(source=source.name, result=result or ("ok" if success else "failed"))
+        print(f"{source.name} sensor time: {latency}")
+
+    def _run_source(self, source):
+        next_deadline = time.monotonic()
+
+        while not self.stop_event.is_set():
+            self._poll(source)
+
+            # Deadlines stay on the start_time + k * interval grid, overrunning polls skip whole intervals
+            next_deadline += source.interval
+            now = time.monotonic()
+            if now > next_deadline:
+                n_missed = int((now - next_deadline) // source.interval) + 1
+                print(f"{source.name} sensor missed {n_missed} deadline(s)")
+                source.n_missed += n_missed
+                missed_deadlines.inc(n_missed, source=source.name)
+                next_deadline += n_missed * source.interval
+
+            self.stop_event.wait(next_deadline - now)
+
+    def stats(self) -> dict:
+        return {name: source.stats() for name, source in self.sources.items()}
+
+    def print_stats(self):
+        for name, stats in self.stats().items():
+            mean_latency = stats["mean_latency"] if stats["mean_latency"] is not None else float("nan")
+            print(
+                f"{name}: polls {stats['polls']} failed {stats['failed']} timeouts {stats['timeouts']} "
+                f"missed {stats['missed_deadlines']} mean {mean_latency:.3f} s max {stats['max_latency']:.3f} s"
+            )
+
+    def start(self):
+        self.stop_event.clear()
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=len(self.sources), thread_name_prefix="sensor-poll"
+        )
+
+        for source in self.sources.values():
+            thread = threading.Thread(target=self._run_source, args=(source,), name=f"{source.name}-scheduler")
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self.stop_event.set()
+        for thread in self._threads:
+            thread.join()
+
+        self._threads = []
+        if self._executor is not None:
+            # Don't wait on polls stuck past their timeout
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def run(self):
+        """Start polling and print stats every report_interval until stopped"""
+        self.start()
+
+        try:
+            while not self.stop_event.wait(self.report_interval):
+                self.print_stats()
+        finally:
+            self.stop()
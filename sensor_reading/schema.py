@@ -0,0 +1,157 @@
+"""
+Versioned schema for the sensor data tables
+
+Each sensor table's schema version is kept in the schema_versions table, so several sensor tables can share a file.
+Each migration upgrades from the previous version and runs in its own transaction so existing database files are
+upgraded in place when a sensor db is created. Files from before per-table versions kept a single version in sqlite's
+user_version pragma, which is used as the starting version of their tables.
+"""
+
+import sqlite3
+import sys
+
+from .epoch import LOCAL_TEXT_TO_EPOCH_MS_SQL
+from .rollup import FIELDS, RESOLUTIONS, backfill_rollups, create_rollup_tables, rollup_table
+
+
+def _table_exists(conn, table_name):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,)).fetchone()
+
+
+def _migrate_v1(conn, table_name):
+    """Key the data table on timestamp with a WITHOUT ROWID table so range and latest queries use the primary key"""
+    conn.execute(
+        f"CREATE TABLE {table_name}_v1 (timestamp datetime PRIMARY KEY, temperature real, humidity real) WITHOUT ROWID"
+    )
+
+    if _table_exists(conn, table_name):
+        # Duplicate timestamps can't be keyed, keep the first reading
+        conn.execute(
+            f"INSERT OR IGNORE INTO {table_name}_v1 (timestamp, temperature, humidity) "
+            f"SELECT timestamp, temperature, humidity FROM {table_name} ORDER BY timestamp"
+        )
+        conn.execute(f"DROP TABLE {table_name}")
+
+    conn.execute(f"ALTER TABLE {table_name}_v1 RENAME TO {table_name}")
+
+
+def _migrate_v2(conn, table_name):
+    """Add 1-min / 1-hour / 1-day rollup tables, they're built from existing readings once timestamps are epochs"""
+    create_rollup_tables(conn, table_name)
+
+
+def _convert_to_epoch(conn, table_name, time_column, columns):
+    """
+    Rebuild a table keyed on local time text as one keyed on integer UTC epoch milliseconds
+
+    Args:
+        columns (dict): Name -> type of the columns other than time_column
+    """
+    column_definitions = ", ".join(f"{name} {column_type}" for name, column_type in columns.items())
+    conn.execute(
+        f"CREATE TABLE {table_name}_v3 ({time_column} integer PRIMARY KEY, {column_definitions}) WITHOUT ROWID"
+    )
+
+    # Local times repeated when clocks go back map to the same instant, keep the first reading
+    column_names = ", ".join(columns)
+    conn.execute(
+        f"INSERT OR IGNORE INTO {table_name}_v3 ({time_column}, {column_names}) "
+        f"SELECT {LOCAL_TEXT_TO_EPOCH_MS_SQL.format(column=time_column)}, {column_names} FROM {table_name} "
+        f"WHERE {time_column} IS NOT NULL ORDER BY {time_column}"
+    )
+    conn.execute(f"DROP TABLE {table_name}")
+    conn.execute(f"ALTER TABLE {table_name}_v3 RENAME TO {table_name}")
+
+
+def _migrate_v3(conn, table_name):
+    """
+    Store timestamps and rollup buckets as integer UTC epoch milliseconds instead of local time text, so range
+    filters compare integers and DST changes can't repeat timestamps
+    """
+    _convert_to_epoch(conn, table_name, "timestamp", {"temperature": "real", "humidity": "real"})
+
+    rollup_columns = {f"{field}_{name}": "real" for field in FIELDS for name in ["min", "max", "sum"]}
+    for resolution in RESOLUTIONS:
+        _convert_to_epoch(conn, rollup_table(resolution, table_name), "bucket", {**rollup_columns, "count": "integer"})
+
+    # Converted minute and hour buckets are aligned to local time and merge the hour repeated when clocks go back,
+    # _migrate_v4 rebuilds them on the epoch
+
+
+def _migrate_v4(conn, table_name):
+    """Count the non-missing values of each field in rollup buckets, bucket means divided by all readings were too low"""
+    for resolution in RESOLUTIONS:
+        table = rollup_table(resolution, table_name)
+        for field in FIELDS:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {field}_count integer")
+            # Rollups of archived readings can't be recounted, keep their means as they were
+            conn.execute(f"UPDATE {table} SET {field}_count = CASE WHEN {field}_sum IS NULL THEN 0 ELSE count END")
+
+    # Rollups of readings still in the raw table are rebuilt with the field counts
+    backfill_rollups(conn, table_name)
+
+
+MIGRATIONS = [_migrate_v1, _migrate_v2, _migrate_v3, _migrate_v4]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def get_schema_version(conn, table_name="data") -> int:
+    if _table_exists(conn, "schema_versions"):
+        row = conn.execute("SELECT version FROM schema_versions WHERE table_name = ?", (table_name,)).fetchone()
+        if row is not None:
+            return row[0]
+
+    if _table_exists(conn, table_name):
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+
+    return 0
+
+
+def list_sensor_tables(conn) -> list:
+    """Get the sensor tables created by migrate"""
+    if not _table_exists(conn, "schema_versions"):
+        return []
+
+    return [row[0] for row in conn.execute("SELECT table_name FROM schema_versions ORDER BY table_name")]
+
+
+def migrate(conn, table_name="data") -> int:
+    """
+    Upgrade database to the latest schema version
+
+    Args:
+        conn (sqlite3.Connection): Open database connection
+        table_name (str): Sensor data table
+
+    Returns:
+        int: Schema version before migrating
+    """
+    if not table_name.isidentifier():
+        raise ValueError(f"Invalid sensor table name {table_name}")
+
+    start_version = get_schema_version(conn, table_name)
+
+    for version in range(start_version, SCHEMA_VERSION):
+        conn.execute("BEGIN")
+        try:
+            MIGRATIONS[version](conn, table_name)
+            conn.execute("CREATE TABLE IF NOT EXISTS schema_versions (table_name text PRIMARY KEY, version integer)")
+            conn.execute("INSERT OR REPLACE INTO schema_versions VALUES (?, ?)", (table_name, version + 1))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    return start_version
+
+
+if __name__ == "__main__":
+    # Upgrade existing database files in place, e.g. python -m sensor_reading.schema data/sensors.db
+    for database_filepath in sys.argv[1:]:
+        conn = sqlite3.connect(database_filepath)
+
+        for table_name in list_sensor_tables(conn) or ["data"]:
+            start_version = migrate(conn, table_name)
+            print(f"{database_filepath} {table_name}: schema version {start_version} -> {SCHEMA_VERSION}")
+
+        conn.close()
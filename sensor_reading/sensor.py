@@ -1,111 +1,90 @@
-from datetime import datetime
-import board
-import adafruit_dht
-import sqlite3
 import time
 
+from .dht_reader import AdafruitDHTBackend, DHTReader
 from .sensor_db import BaseSensorDB
+from .storage import DEFAULT_DATABASE
 
 
 class DHTSensorData:
     """
-    Read from GPIO data with specific library for DHT22 temperature and humidity sensor
+    DHT22 temperature and humidity readings kept in lists, from a DHTReader thread like DHTDB
     """
 
-    def __init__(self) -> None:
+    def __init__(self, reader=None) -> None:
         # Initialise data structure for storing DHT temperature sensor data
 
         self.timestamps = []
         self.temperature_datapoints = []
         self.humidity_datapoints = []
 
-        # Initial the dht device, with data pin connected to:
-        self.dhtDevice = adafruit_dht.DHT22(board.D4)
+        # Long-lived device handle on the reader thread, data pin connected to D4
+        self.reader = DHTReader(AdafruitDHTBackend("D4")) if reader is None else reader
+        self.reader.start()
 
     def get_new_reading(self) -> None:
-        """Get new reading from sensor"""
+        """Append readings published by the reader since the last call"""
 
-        while True:
-            try:
-                # Get timestamp and readings
-                timestamp = datetime.now()
-                temperature_reading = self.dhtDevice.temperature
-                humidity_reading = self.dhtDevice.humidity
+        for timestamp, temperature_reading, humidity_reading in self.reader.get_readings():
+            str_info = f"Time: {timestamp} Temp: {temperature_reading:.1f} C    Humidity: {humidity_reading}% "
+            print(str_info)
 
-                str_info = f"Time: {timestamp} Temp: {temperature_reading:.1f} C    Humidity: {humidity_reading}% "
-                print(str_info)
+            # Append to list
+            self.timestamps.append(timestamp)
+            self.temperature_datapoints.append(temperature_reading)
+            self.humidity_datapoints.append(humidity_reading)
 
-                # Append to list
-                self.timestamps.append(timestamp)
-                self.temperature_datapoints.append(temperature_reading)
-                self.humidity_datapoints.append(humidity_reading)
-
-                break
-
-            except RuntimeError as e:
-                print(e)
-                continue
+        return None
 
-            except Exception as e:
-                print(e)
+    def close(self):
+        """Stop the reader thread and release the device"""
+        self.reader.stop()
 
-        self.dhtDevice.exit()
-        return None
 
+class DHTDB(BaseSensorDB, sensor_type="dht22"):
+    """
+    DHT22 readings from a DHTReader thread, polling only stores what the reader has published so it never blocks on
+    the sensor
+    """
 
-class DHTDB(BaseSensorDB):
-    def __init__(self):
+    def __init__(self, reader=None):
         # Set db filepath
-        self.database_filepath = "data/dht.db"
+        self.database_filepath = DEFAULT_DATABASE
+        self.sensor_id = "bedroom"
         self._create_db_table()
 
-        # Initial the dht device, with data pin connected to:
-        self.dhtDevice = adafruit_dht.DHT22(board.D4)
+        # Long-lived device handle on the reader thread, data pin connected to D4
+        self.reader = DHTReader(AdafruitDHTBackend("D4")) if reader is None else reader
+        self.reader.start()
+        self._n_failed_bursts = 0  # reader's failed bursts at the last poll
 
     def get_new_reading(self) -> bool:
-        """Get new reading from sensor"""
-
-        # Connect to the database
-        self.conn = sqlite3.connect(self.database_filepath)
-        self.conn_cursor = self.conn.cursor()
+        """
+        Insert readings published by the reader since the last poll
 
-        while True:
-            try:
-                # Get timestamp and readings
-                timestamp = datetime.now()
-                temperature_reading = self.dhtDevice.temperature
-                humidity_reading = self.dhtDevice.humidity
+        Returns:
+            bool: False if the reader's bursts since the last poll failed
+        """
 
-                str_info = f"Time: {timestamp} Temp: {temperature_reading:.1f} C    Humidity: {humidity_reading}% "
-                print(str_info)
+        readings = self.reader.get_readings()
+        for timestamp, temperature_reading, humidity_reading in readings:
+            str_info = f"Time: {timestamp} Temp: {temperature_reading:.1f} C    Humidity: {humidity_reading}% "
+            print(str_info)
 
-                # Insert data into the table
-                self.conn_cursor.execute(
-                    "INSERT INTO data (timestamp, temperature, humidity) VALUES (?, ?, ?)",
-                    (timestamp, temperature_reading, humidity_reading),
-                )
-                self.conn.commit()
+            # Insert data into the table and update rollups
+            self._insert_reading(timestamp, temperature_reading, humidity_reading)
 
-                success = True
-                break
-
-            except RuntimeError as e:
-                print(e)
-                continue
-
-            except Exception as e:
-                print(e)
-                success = False
-
-        ## Cleanup
-        # Close GPIO connection
-        self.dhtDevice.exit()
-
-        # Close connection to db
-        self.conn.close()
+        # Bursts aren't aligned with polls, a poll before the next burst has nothing new but isn't a failed read
+        n_failed_bursts = self.reader.n_failed_bursts
+        success = bool(readings) or (n_failed_bursts == self._n_failed_bursts)
+        self._n_failed_bursts = n_failed_bursts
 
         return success
 
+    def close(self):
+        """Stop the reader thread, release the device and flush buffered readings"""
+        self.reader.stop()
+        super().close()
+
 
 if __name__ == "__main__":
     # Test sensor data
@@ -115,4 +94,6 @@ if __name__ == "__main__":
     for i in range(10):
         print(i)
         dht_db.get_new_reading()
-        time.sleep(0.1)
+        time.sleep(15)
+
+    dht_db.close()
@@ -1,51 +1,196 @@
 from datetime import datetime
 import abc
+import atexit
 import sqlite3
+import threading
+import weakref
+
+from .changepoint import HEARTBEAT_INTERVAL, is_change
+from .latest import publish_reading
+from .registry import register_sensor
+from .storage import DEFAULT_DATABASE, SensorStorage
+
+# Sensor dbs with a write buffer, flushed at interpreter exit
+_sensor_dbs = weakref.WeakSet()
+
+# Readings kept buffered while writes fail, e.g. a full or failing SD card, oldest are dropped first
+WRITE_BUFFER_MAX_READINGS = 10000
 
 
 class BaseSensorDB(abc.ABC):
     """
     Abstract class for creating sensor reading which writes to database
+
+    Subclasses defined with a sensor_type keyword, e.g. class DHTDB(BaseSensorDB, sensor_type="dht22"), are added to
+    the sensor registry under that name.
+
+    Readings are stored in the sensor_id table of the shared sensor database file.
+
+    Readings are written through a write-behind buffer. They're flushed with a single executemany transaction once
+    write_batch_size readings are buffered or the oldest buffered reading is write_flush_interval seconds old, which is
+    the most data that can be lost on a crash. The defaults commit every reading straight away. While the database
+    can't be written, up to write_buffer_max readings stay buffered and are retried on the next flush.
+
+    With a deadband set, only readings that changed by more than the deadband since the last stored reading are
+    written, plus a heartbeat every heartbeat_interval seconds (see changepoint).
+
+    With an ingest queue set, readings are published to the queue instead and a storage worker process writes them
+    (see ingest), so polling never waits on the database.
     """
 
+    write_batch_size = 1
+    write_flush_interval = 0.0  # in seconds, durability window
+    write_buffer_max = WRITE_BUFFER_MAX_READINGS
+
+    deadband = None  # Field -> largest change that isn't stored, None stores every reading
+    heartbeat_interval = HEARTBEAT_INTERVAL  # in seconds
+
+    ingest_queue = None  # IngestQueue readings are published to, None writes them from this process
+
+    def __init_subclass__(cls, sensor_type=None, **kwargs):
+        super().__init_subclass__(**kwargs)
+
+        if sensor_type is not None:
+            register_sensor(sensor_type, cls)
+
     def __init__(self):
-        ## Set database filepath
-        self.database_filepath = "example_sensor.db"
+        ## Set database filepath and sensor table
+        self.database_filepath = DEFAULT_DATABASE
+        self.sensor_id = "example_sensor"
+
+    def _create_db_table(self):
+        # Create or upgrade the table with timestamp, temperature, humidity fields (creates the db if it doesn't exist)
+        self.storage = SensorStorage(self.database_filepath)
+        self.storage.create_table(self.sensor_id)
+
+        # Every subclass constructor creates its table, so set up the write buffer here
+        self._write_buffer = []
+        self._write_buffer_lock = threading.Lock()
+        self._flush_timer = None
+        self._last_stored = None
+        _sensor_dbs.add(self)
+
+    def configure_write_buffer(self, batch_size, flush_interval):
+        """
+        Set how many readings to group per transaction and the max time a reading can wait before being committed
+        """
+        self.flush()
+
+        self.write_batch_size = batch_size
+        self.write_flush_interval = flush_interval
 
-    def _create_db_table(self, table_name="data"):
-        # Connect to the database (or create it if it doesn't exist)
-        self.conn = sqlite3.connect(self.database_filepath)
-        self.conn_cursor = self.conn.cursor()
+    def configure_ingest_queue(self, ingest_queue):
+        """Publish readings to an IngestQueue for a storage worker to write, None writes them through the buffer"""
+        self.flush()
 
-        # Create a table with timestamp, temperature, humidity fields
-        self.conn_cursor.execute(
-            f"CREATE TABLE IF NOT EXISTS {table_name} (timestamp datetime, temperature real, humidity real)"
-        )
-        self.conn.commit()
+        with self._write_buffer_lock:
+            self.ingest_queue = ingest_queue
 
-        self.conn.close()
+    def configure_deadband(self, deadband, heartbeat_interval=HEARTBEAT_INTERVAL):
+        """
+        Only store readings that changed by more than deadband, e.g. {"temperature": 0.1, "humidity": 0.5}, or are
+        heartbeat_interval seconds after the last stored reading. None stores every reading.
+        """
+        with self._write_buffer_lock:
+            self.deadband = deadband
+            self.heartbeat_interval = heartbeat_interval
+
+    def _insert_reading(self, timestamp, temperature, humidity):
+        """
+        Buffer reading and flush the buffer if it's full or time based flushing is disabled
+        """
+        row = (timestamp, temperature, humidity)
+
+        # Latest reading caches in this process see the reading straight away, before it's flushed
+        publish_reading(self.database_filepath, self.sensor_id, row)
+
+        with self._write_buffer_lock:
+            if self.deadband is not None:
+                if self._last_stored is None:
+                    # Carry on from the stored series after a restart
+                    latest = self.storage.get_latest([self.sensor_id])[self.sensor_id]
+                    if latest:
+                        self._last_stored = (datetime.fromisoformat(latest[0][0]), *latest[0][1:])
+
+                if not is_change(self._last_stored, row, self.deadband, self.heartbeat_interval):
+                    return
+
+            if self.ingest_queue is not None:
+                # A dropped reading isn't the last stored one, the next reading is compared against the one before
+                if self.ingest_queue.put(self.sensor_id, row):
+                    self._last_stored = row
+                return
+
+            self._last_stored = row
+            self._write_buffer.append(row)
+
+            if (len(self._write_buffer) >= self.write_batch_size) or (self.write_flush_interval <= 0):
+                self._flush_locked()
+
+            elif self._flush_timer is None:
+                # Flush whatever has been buffered once the oldest reading reaches the durability window
+                self._flush_timer = threading.Timer(self.write_flush_interval, self.flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+
+    def _flush_locked(self):
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+
+        if not self._write_buffer:
+            return
+
+        rows = self._write_buffer
+        self._write_buffer = []
+
+        # Insert buffered readings and update the rollup tables in one transaction, readings with a timestamp that's
+        # already stored are left out instead of failing every later flush
+        try:
+            self.storage.insert(self.sensor_id, rows, skip_existing=True)
+        except sqlite3.OperationalError as e:
+            # Busy, locked, full or failing database, keep readings buffered so the next flush retries them
+            self._write_buffer = rows + self._write_buffer
+            n_dropped = len(self._write_buffer) - self.write_buffer_max
+            if n_dropped > 0:
+                print(f"Write buffer full, dropping {n_dropped} oldest {self.sensor_id} readings")
+                self._write_buffer = self._write_buffer[n_dropped:]
+            raise
+        except sqlite3.Error as e:
+            # Retrying can't fix other errors, e.g. a constraint the rows break
+            print(f"Dropping {len(rows)} {self.sensor_id} readings: {e}")
+
+    def flush(self):
+        """Commit all buffered readings"""
+        with self._write_buffer_lock:
+            self._flush_locked()
+
+    def close(self):
+        """Flush buffered readings, call before shutting down"""
+        self.flush()
+        _sensor_dbs.discard(self)
 
     @abc.abstractmethod
     def get_new_reading(self) -> bool:
         """
         Interface for inserting new reading into db table
         """
-        # Connect to the database (or create it if it doesn't exist)
-        self.conn = sqlite3.connect(self.database_filepath)
-        self.conn_cursor = self.conn.cursor()
-
         ## .... get sensor data ....
         timestamp = datetime.now()
         temperature_reading = 0.00
         humidity_reading = 0.00
 
-        # Create a table with timestamp, temperature, humidity fields
-        self.conn_cursor.execute(
-            "INSERT INTO data (timestamp, temperature, humidity) VALUES (?, ?, ?)",
-            (timestamp, temperature_reading, humidity_reading),
-        )
-        self.conn.commit()
-
-        self.conn.close()
+        # Insert reading and update rollups
+        self._insert_reading(timestamp, temperature_reading, humidity_reading)
 
         return True
+
+
+@atexit.register
+def flush_all():
+    """Flush the write buffers of all open sensor dbs"""
+    for sensor_db in list(_sensor_dbs):
+        try:
+            sensor_db.flush()
+        except Exception as e:
+            print(e)
@@ -0,0 +1,389 @@
+"""
+Single-file time-series store for all sensors
+
+Each sensor gets its own table (plus rollup tables) named after its sensor id in one sqlite file, so multi-sensor range
+queries and "latest per sensor" run as a single UNION ALL statement on one connection. Timestamps are stored as UTC
+epoch milliseconds and converted from and to local time at this interface (see epoch). NumPy is only imported by the
+array queries, so the logger and CLI tools don't pay for it. Existing per-sensor database files can be imported with:
+    python -m sensor_reading.storage [sensor_id=legacy.db ...]
+"""
+
+import functools
+import os
+import sqlite3
+import sys
+
+from .connection import connections
+from .epoch import LOCAL_ISO_SQL, LOCAL_TEXT_TO_EPOCH_MS_SQL, to_epoch_ms, to_local_datetime64
+from .metrics import metrics
+from .rollup import MEAN_COLUMNS, backfill_rollups, bucket_start, rollup_table, update_rollups
+from .schema import migrate
+
+DEFAULT_DATABASE = "data/sensors.db"
+
+# Rows converted to arrays per fetchmany call by get_range_arrays
+FETCH_CHUNK_SIZE = 65536
+
+# Rows per chunk yielded by iter_range
+ITER_CHUNK_SIZE = 5000
+
+# Epoch milliseconds -> local ISO 8601 with milliseconds, the same format NumPy gives archived timestamps
+ISO_TIMESTAMP_SQL = "strftime('%Y-%m-%dT%H:%M:%f', {column} / 1000.0, 'unixepoch', 'localtime')"
+
+# Sorts before every epoch millisecond timestamp
+EARLIEST_EPOCH_MS = -(2**63)
+
+# Sensor id -> database file used before all sensors shared one file
+LEGACY_DATABASES = {
+    "bedroom": "data/dht.db",
+    "livingroom": "data/nest.db",
+    "outside": "data/external.db",
+}
+
+insert_seconds = metrics.histogram("db_insert_seconds", "Time to insert readings and update rollups, including commit")
+rows_inserted = metrics.counter("db_rows_inserted_total", "Readings inserted")
+query_seconds = metrics.histogram("db_query_seconds", "Time to run a storage query")
+
+
+def _timed_query(query):
+    """Observe the time of a SensorStorage query method in db_query_seconds, labelled by database file and query"""
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with query_seconds.time(database=os.path.basename(self.database_filepath), query=query):
+                return method(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class SensorStorage:
+    """
+    Storage for sensor readings with one table per sensor id in a single database file
+
+    Args:
+        archive (SensorArchive): Archive of readings moved out of sqlite, read by get_range_arrays
+    """
+
+    def __init__(self, database_filepath=DEFAULT_DATABASE, archive=None):
+        self.database_filepath = database_filepath
+        self.archive = archive
+
+    def create_table(self, sensor_id):
+        """Create or upgrade the sensor's data and rollup tables"""
+        with connections.writer(self.database_filepath) as conn:
+            migrate(conn, sensor_id)
+
+    def insert(self, sensor_id, rows, skip_existing=False):
+        """
+        Insert readings and update the sensor's rollup tables in one transaction
+
+        Args:
+            sensor_id (str): Sensor table
+            rows (list): (timestamp, temperature, humidity) tuples, naive datetimes are local times
+            skip_existing (bool): Leave out readings with a timestamp that's already stored instead of raising, e.g.
+                readings replayed from the ingest queue
+        """
+        rows = [(to_epoch_ms(timestamp), temperature, humidity) for timestamp, temperature, humidity in rows]
+
+        database = os.path.basename(self.database_filepath)
+        with insert_seconds.time(database=database, table=sensor_id):
+            with connections.writer(self.database_filepath) as conn:
+                if skip_existing and rows:
+                    stored = {
+                        timestamp
+                        for (timestamp,) in conn.execute(
+                            f"SELECT timestamp FROM {sensor_id} WHERE timestamp BETWEEN ? AND ?",
+                            (min(row[0] for row in rows), max(row[0] for row in rows)),
+                        )
+                    }
+                    new_rows = []
+                    for row in rows:
+                        if row[0] not in stored:
+                            stored.add(row[0])
+                            new_rows.append(row)
+                    rows = new_rows
+
+                conn.executemany(f"INSERT INTO {sensor_id} (timestamp, temperature, humidity) VALUES (?, ?, ?)", rows)
+                update_rollups(conn, rows, sensor_id)
+
+        rows_inserted.inc(len(rows), database=database, table=sensor_id)
+
+    def _query_sensors(self, select, params_per_sensor):
+        """
+        Run the same select for every sensor as one UNION ALL statement
+
+        Args:
+            select (str): Select statement with {table} in place of the table name, returning timestamp,
+                temperature and humidity
+            params_per_sensor (dict): Sensor id -> parameters of select
+
+        Returns:
+            dict: Sensor id -> list of (timestamp, temperature, humidity) rows
+        """
+        results = {sensor_id: [] for sensor_id in params_per_sensor}
+        if not results:
+            return results
+
+        # Wrapping each select lets it use its own ORDER BY / LIMIT inside the compound statement
+        statement = " UNION ALL ".join(
+            f"SELECT ? AS sensor_id, * FROM ({select.format(table=sensor_id)})" for sensor_id in params_per_sensor
+        )
+        params = [
+            param for sensor_id, sensor_params in params_per_sensor.items() for param in (sensor_id, *sensor_params)
+        ]
+
+        for sensor_id, *row in connections.reader(self.database_filepath).execute(statement, params):
+            results[sensor_id].append(tuple(row))
+
+        return results
+
+    @_timed_query("range")
+    def get_range(self, sensor_ids, start_time, end_time, resolution=None):
+        """
+        Get readings between start_time and end_time for several sensors, with local time text timestamps
+
+        Args:
+            start_time, end_time: Datetimes or dates, naive ones are local times
+            resolution (str): Rollup resolution to read bucket means from, None for raw readings
+        """
+        if resolution is None:
+            select = (
+                f"SELECT {LOCAL_ISO_SQL.format(column='timestamp')}, temperature, humidity FROM {{table}} "
+                "WHERE timestamp BETWEEN ? AND ?"
+            )
+        else:
+            select = (
+                f"SELECT {LOCAL_ISO_SQL.format(column='bucket')}, {MEAN_COLUMNS} "
+                f"FROM {rollup_table(resolution, '{table}')} WHERE bucket BETWEEN ? AND ?"
+            )
+
+        params = (to_epoch_ms(start_time), to_epoch_ms(end_time))
+        return self._query_sensors(select, {sensor_id: params for sensor_id in sensor_ids})
+
+    @_timed_query("range_arrays")
+    def get_range_arrays(self, sensor_ids, start_time, end_time, resolution=None):
+        """
+        Get readings between start_time and end_time for several sensors as contiguous NumPy arrays
+
+        Rows are converted to a structured array in chunks, so no per-row Python lists are kept around. Readings older
+        than a sensor's archive cutoff come from the archive for the resolutions it serves.
+
+        Returns:
+            dict: Sensor id -> dict of "timestamp" (datetime64[ms]), "temperature" and "humidity" (float64, NaN
+                for missing readings) arrays
+        """
+        import numpy as np
+
+        if resolution is None:
+            table, time_column, columns = "{table}", "timestamp", "temperature, humidity"
+        else:
+            table, time_column = rollup_table(resolution, "{table}"), "bucket"
+            columns = MEAN_COLUMNS
+
+        # Epoch integers are converted to local time once for the whole result instead of per row in sqlite. Rows are
+        # ordered by time within each sensor, which the grouping and archive cutoff below rely on, at no cost on the
+        # primary key.
+        select = (
+            f"SELECT {time_column}, {columns} FROM {table} WHERE {time_column} BETWEEN ? AND ? ORDER BY {time_column}"
+        )
+        # Integer sensor index instead of the id keeps the structured array numeric
+        statement = " UNION ALL ".join(
+            f"SELECT {index} AS sensor_index, * FROM ({select.format(table=sensor_id)})"
+            for index, sensor_id in enumerate(sensor_ids)
+        )
+        dtype = [("sensor_index", "i4"), ("timestamp", "i8"), ("temperature", "f8"), ("humidity", "f8")]
+
+        chunks = []
+        if sensor_ids:
+            cursor = connections.reader(self.database_filepath).execute(
+                statement, (to_epoch_ms(start_time), to_epoch_ms(end_time)) * len(sensor_ids)
+            )
+            while True:
+                rows = cursor.fetchmany(FETCH_CHUNK_SIZE)
+                if not rows:
+                    break
+                chunks.append(np.array(rows, dtype=dtype))
+
+        data = np.concatenate(chunks) if chunks else np.empty(0, dtype=dtype)
+        timestamps = to_local_datetime64(data["timestamp"])
+
+        # Rows come out grouped by sensor in statement order
+        bounds = np.searchsorted(data["sensor_index"], np.arange(len(sensor_ids) + 1))
+
+        results = {}
+        for index, sensor_id in enumerate(sensor_ids):
+            sensor_data = data[bounds[index] : bounds[index + 1]]
+            results[sensor_id] = {
+                "timestamp": timestamps[bounds[index] : bounds[index + 1]],
+                "temperature": np.ascontiguousarray(sensor_data["temperature"]),
+                "humidity": np.ascontiguousarray(sensor_data["humidity"]),
+            }
+
+        if (self.archive is not None) and (resolution in self.archive.resolutions):
+            archived = self.archive.get_range_arrays(sensor_ids, start_time, end_time)
+
+            for sensor_id in sensor_ids:
+                cutoff = self.archive.cutoff(sensor_id)
+                if cutoff is None:
+                    continue
+
+                # Rows left in sqlite before the cutoff by an interrupted archive run are already in the archive
+                hot = results[sensor_id]
+                hot_start = np.searchsorted(hot["timestamp"], np.datetime64(cutoff, "ms"))
+                results[sensor_id] = {
+                    column: np.concatenate([archived[sensor_id][column], values[hot_start:]])
+                    for column, values in hot.items()
+                }
+
+        return results
+
+    @_timed_query("count")
+    def count_readings(self, sensor_ids, start_time, end_time) -> int:
+        """
+        Count the readings of several sensors in the days from start_time to end_time from the daily rollups, which
+        cover archived readings too
+        """
+        select = f"SELECT sum(count) FROM {rollup_table('1d', '{table}')} WHERE bucket BETWEEN ? AND ?"
+        params = (bucket_start(to_epoch_ms(start_time), "1d"), to_epoch_ms(end_time))
+        results = self._query_sensors(select, {sensor_id: params for sensor_id in sensor_ids})
+
+        return sum(rows[0][0] or 0 for rows in results.values())
+
+    def iter_range(self, sensor_ids, start_time, end_time, resolution=None, chunk_size=ITER_CHUNK_SIZE):
+        """
+        Yield readings between start_time and end_time in chunks, sensor by sensor and oldest first
+
+        Rows come from a cursor over sqlite and one archive partition at a time, so memory use doesn't grow with the
+        size of the range.
+
+        Yields:
+            list: Chunk of (sensor_id, ISO timestamp, temperature, humidity) rows, None for missing values
+        """
+        if resolution is None:
+            time_column, columns = "timestamp", "temperature, humidity"
+        else:
+            time_column, columns = "bucket", MEAN_COLUMNS
+
+        start_ms, end_ms = to_epoch_ms(start_time), to_epoch_ms(end_time)
+
+        for sensor_id in sensor_ids:
+            cutoff = None
+            if (self.archive is not None) and (resolution in self.archive.resolutions):
+                import numpy as np
+
+                cutoff = self.archive.cutoff(sensor_id)
+
+                for chunk in self.archive.iter_range(sensor_id, start_time, end_time):
+                    timestamps = np.datetime_as_string(to_local_datetime64(chunk["timestamp"]), unit="ms")
+                    for first in range(0, len(timestamps), chunk_size):
+                        rows = zip(
+                            timestamps[first : first + chunk_size].tolist(),
+                            chunk["temperature"][first : first + chunk_size].tolist(),
+                            chunk["humidity"][first : first + chunk_size].tolist(),
+                        )
+                        # NaN marks missing readings in the archive
+                        yield [
+                            (sensor_id, timestamp, t if t == t else None, h if h == h else None)
+                            for timestamp, t, h in rows
+                        ]
+
+            table = sensor_id if resolution is None else rollup_table(resolution, sensor_id)
+            cursor = connections.reader(self.database_filepath).execute(
+                f"SELECT ?, {ISO_TIMESTAMP_SQL.format(column=time_column)}, {columns} FROM {table} "
+                f"WHERE {time_column} BETWEEN ? AND ? AND {time_column} >= ? ORDER BY {time_column}",
+                (sensor_id, start_ms, end_ms, EARLIEST_EPOCH_MS if cutoff is None else to_epoch_ms(cutoff)),
+            )
+            try:
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    yield rows
+            finally:
+                # Ends the read transaction if the consumer stops early, e.g. a client disconnecting
+                cursor.close()
+
+    @_timed_query("latest")
+    def get_latest(self, sensor_ids):
+        """Get the latest reading of each sensor with a local time text timestamp, an empty list if it has none"""
+        select = (
+            f"SELECT {LOCAL_ISO_SQL.format(column='timestamp')}, temperature, humidity FROM {{table}} "
+            "ORDER BY timestamp DESC LIMIT 1"
+        )
+
+        return self._query_sensors(select, {sensor_id: () for sensor_id in sensor_ids})
+
+    @_timed_query("since")
+    def get_since(self, last_timestamps):
+        """
+        Get readings newer than each sensor's last timestamp, oldest first
+
+        Args:
+            last_timestamps (dict): Sensor id -> last timestamp (local time text as returned by get_latest), None
+                for all readings
+        """
+        select = (
+            f"SELECT {LOCAL_ISO_SQL.format(column='timestamp')}, temperature, humidity FROM {{table}} "
+            "WHERE timestamp > ? ORDER BY timestamp"
+        )
+
+        return self._query_sensors(
+            select,
+            {
+                sensor_id: (EARLIEST_EPOCH_MS if last_timestamp is None else to_epoch_ms(last_timestamp),)
+                for sensor_id, last_timestamp in last_timestamps.items()
+            },
+        )
+
+
+def import_legacy_db(storage, sensor_id, legacy_filepath):
+    """
+    Copy readings from a per-sensor database file with a data table into the sensor's table in storage
+
+    Returns:
+        int: Number of readings imported
+    """
+    storage.create_table(sensor_id)
+
+    with connections.writer(storage.database_filepath) as conn:
+        # ATTACH and DETACH can't run inside a transaction
+        conn.execute("ATTACH DATABASE ? AS legacy", (legacy_filepath,))
+        try:
+            n_before = conn.execute(f"SELECT count(*) FROM {sensor_id}").fetchone()[0]
+            # Files upgraded in place with sensor_reading.schema already hold epoch milliseconds, only local time text
+            # is converted
+            conn.execute(
+                f"INSERT OR IGNORE INTO {sensor_id} (timestamp, temperature, humidity) "
+                "SELECT CASE WHEN typeof(timestamp) = 'integer' THEN timestamp "
+                f"ELSE {LOCAL_TEXT_TO_EPOCH_MS_SQL.format(column='timestamp')} END, temperature, humidity "
+                "FROM legacy.data"
+            )
+            n_imported = conn.execute(f"SELECT count(*) FROM {sensor_id}").fetchone()[0] - n_before
+
+            backfill_rollups(conn, sensor_id)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.execute("DETACH DATABASE legacy")
+
+    return n_imported
+
+
+if __name__ == "__main__":
+    # Import legacy files, e.g. python -m sensor_reading.storage bedroom=data/dht.db, defaults to LEGACY_DATABASES
+    legacy_databases = dict(arg.split("=", 1) for arg in sys.argv[1:]) or LEGACY_DATABASES
+
+    storage = SensorStorage()
+    for sensor_id, legacy_filepath in legacy_databases.items():
+        try:
+            n_imported = import_legacy_db(storage, sensor_id, legacy_filepath)
+            print(f"{legacy_filepath} -> {storage.database_filepath} {sensor_id}: {n_imported} readings imported")
+        except sqlite3.Error as e:
+            print(f"{legacy_filepath}: {e}")
+
+    connections.close_all()
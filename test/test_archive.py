@@ -0,0 +1,53 @@
+from datetime import datetime
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from sensor_reading.archive import SensorArchive, archive_sensor
+from sensor_reading.connection import connections
+from sensor_reading.storage import SensorStorage
+
+# Clocks went back from 02:00 BST to 01:00 GMT at 01:00 UTC
+FOLD_START_MS = 1698537600000  # 2023-10-29 00:00 UTC, 01:00 BST
+FOLD_END_MS = 1698544800000  # 2023-10-29 02:00 UTC, 02:00 GMT
+
+
+if __name__ == "__main__":
+    # Test archiving raw readings, run from the repo root: PYTHONPATH=. python test/test_archive.py
+    os.environ["TZ"] = "Europe/London"
+    time.tzset()
+
+    with tempfile.TemporaryDirectory() as directory:
+        archive = SensorArchive(os.path.join(directory, "archive"))
+        storage = SensorStorage(os.path.join(directory, "sensors.db"), archive)
+        storage.create_table("fold")
+
+        # Both occurrences of 01:00-02:00 local time are archived, not merged on their repeated wall-clock times
+        timestamps = range(FOLD_START_MS - 3600000, FOLD_END_MS + 3600000, 30000)
+        storage.insert("fold", [(timestamp, 10.0 + timestamp % 7, 80.0) for timestamp in timestamps])
+        expected = storage.get_range_arrays(["fold"], "2023-10-28", "2023-10-30")["fold"]
+
+        assert archive_sensor(storage, archive, "fold", datetime(2023, 11, 1)) == len(timestamps)
+        archived = storage.get_range_arrays(["fold"], "2023-10-28", "2023-10-30")["fold"]
+        assert len(archived["timestamp"]) == len(timestamps), len(archived["timestamp"])
+        for column, values in expected.items():
+            assert np.array_equal(archived[column], values), column
+
+        exported = [row for chunk in storage.iter_range(["fold"], "2023-10-28", "2023-10-30") for row in chunk]
+        assert len(exported) == len(timestamps)
+        assert exported[0][1] == "2023-10-29T00:00:00.000", exported[0]
+        print("readings of the repeated hour archived ok")
+
+        # Partitions from before epoch timestamps hold wall-clock milliseconds and are converted when read
+        legacy_filepath = os.path.join(directory, "archive", "legacy", "2023-07.npz")
+        os.makedirs(os.path.dirname(legacy_filepath))
+        local_ms = np.datetime64("2023-07-01T12:00", "ms").astype(np.int64) + 60000 * np.arange(10)
+        np.savez_compressed(legacy_filepath, timestamp=local_ms, temperature=np.full(10, 20.0), humidity=np.zeros(10))
+
+        legacy = archive.get_range_arrays(["legacy"], "2023-07-01", "2023-07-02")["legacy"]
+        assert str(legacy["timestamp"][0]) == "2023-07-01T12:00:00.000", legacy["timestamp"][0]
+        print("legacy partitions ok")
+
+        connections.close_all()
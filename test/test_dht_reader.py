@@ -0,0 +1,65 @@
+import os
+import tempfile
+import time
+
+from sensor_reading.dht_reader import DHTReader, FakeDHTBackend
+from sensor_reading.sensor import DHTDB, DHTSensorData
+
+if __name__ == "__main__":
+    # Test the DHT reader without GPIO, run from the repo root: PYTHONPATH=. python test/test_dht_reader.py
+
+    # Median filter drops spikes that passed the checksum
+    backend = FakeDHTBackend(failure_rate=0.0, spike_rate=0.1, seed=1)
+    reader = DHTReader(backend, n_samples=5, min_read_interval=0.0)
+    for i in range(20):
+        timestamp, temperature, humidity = reader.read_burst()
+        assert abs(temperature - 20.0) < 1.0, temperature
+    print("median filter ok", reader.stats())
+
+    # Failed reads are retried at most max_retries times instead of looping forever
+    backend = FakeDHTBackend(failure_rate=1.0)
+    reader = DHTReader(backend, max_retries=3, min_read_interval=0.001, max_backoff=0.01)
+    assert reader.read_burst() is None
+    assert backend.n_reads == 4, backend.n_reads
+    print("bounded retries ok", reader.stats())
+
+    # Thread publishes bursts to the queue and polling never blocks on the sensor
+    with tempfile.TemporaryDirectory() as directory:
+        os.makedirs(os.path.join(directory, "data"))
+        os.chdir(directory)
+
+        dht_db = DHTDB(DHTReader(FakeDHTBackend(seed=2), read_interval=0.05, min_read_interval=0.001))
+
+        start_time = time.perf_counter()
+        dht_db.get_new_reading()
+        print(f"poll time: {time.perf_counter() - start_time:.6f} s")
+
+        time.sleep(0.5)
+        assert dht_db.get_new_reading()
+        dht_db.close()
+        assert dht_db.reader.backend.closed
+
+        n_rows = len(dht_db.storage.get_range(["bedroom"], "0001-01-01", "9999-12-31")["bedroom"])
+        assert n_rows > 0
+        print(f"reader thread ok, {n_rows} readings stored", dht_db.reader.stats())
+
+        # Polls between bursts have nothing new but only fail after a failed burst
+        dht_db = DHTDB(DHTReader(FakeDHTBackend(seed=3), read_interval=60, min_read_interval=0.5))
+        assert dht_db.get_new_reading()
+        dht_db.close()
+
+        backend = FakeDHTBackend(failure_rate=1.0)
+        dht_db = DHTDB(DHTReader(backend, read_interval=60, max_retries=1, min_read_interval=0.001, max_backoff=0.01))
+        time.sleep(0.2)
+        assert not dht_db.get_new_reading()
+        assert dht_db.get_new_reading()
+        dht_db.close()
+        print("polls between bursts ok")
+
+    # Legacy in-memory sensor data reads through the same reader thread
+    sensor_data = DHTSensorData(DHTReader(FakeDHTBackend(seed=4), read_interval=0.05, min_read_interval=0.001))
+    time.sleep(0.3)
+    sensor_data.get_new_reading()
+    sensor_data.close()
+    assert sensor_data.timestamps and (len(sensor_data.timestamps) == len(sensor_data.temperature_datapoints))
+    print(f"legacy sensor data ok, {len(sensor_data.timestamps)} readings")
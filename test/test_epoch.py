@@ -0,0 +1,97 @@
+from datetime import datetime, timedelta
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from sensor_reading.connection import connections
+from sensor_reading.rollup import RESOLUTIONS, backfill_rollups, rollup_table
+from sensor_reading.schema import migrate
+from sensor_reading.storage import SensorStorage, import_legacy_db
+
+N_READINGS = 5000
+
+# Clocks went back from 02:00 BST to 01:00 GMT at 01:00 UTC
+FOLD_START_MS = 1698537600000  # 2023-10-29 00:00 UTC, 01:00 BST
+FOLD_END_MS = 1698544800000  # 2023-10-29 02:00 UTC, 02:00 GMT
+
+
+def read_rollups(conn, table_name):
+    return {
+        resolution: conn.execute(f"SELECT * FROM {rollup_table(resolution, table_name)} ORDER BY bucket").fetchall()
+        for resolution in RESOLUTIONS
+    }
+
+
+def create_legacy_db(legacy_filepath):
+    """Per-sensor file from before epoch storage, with local time text timestamps"""
+    start_time = datetime(2023, 1, 1)
+    conn = sqlite3.connect(legacy_filepath)
+    conn.execute("CREATE TABLE data (timestamp datetime, temperature real, humidity real)")
+    conn.executemany(
+        "INSERT INTO data VALUES (?, ?, ?)",
+        [(str(start_time + timedelta(minutes=2 * i)), 20.0 + i % 10, 50.0) for i in range(N_READINGS)],
+    )
+    conn.commit()
+    conn.close()
+
+
+if __name__ == "__main__":
+    # Test conversion to and from epoch timestamps, run from the repo root: PYTHONPATH=. python test/test_epoch.py
+    os.environ["TZ"] = "Europe/London"
+    time.tzset()
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        storage = SensorStorage("sensors.db")
+
+        # Legacy files import the same whether or not they were upgraded in place with sensor_reading.schema
+        create_legacy_db("legacy.db")
+        shutil.copy("legacy.db", "migrated.db")
+        conn = sqlite3.connect("migrated.db")
+        migrate(conn, "data")
+        conn.close()
+
+        assert import_legacy_db(storage, "text", "legacy.db") == N_READINGS
+        assert import_legacy_db(storage, "migrated", "migrated.db") == N_READINGS
+
+        readings = storage.get_range(["text", "migrated"], "0001-01-01", "9999-12-31")
+        assert readings["text"] == readings["migrated"]
+        assert readings["text"][0][0] == "2023-01-01 00:00:00.000", readings["text"][0]
+        print("legacy import of text and migrated files ok")
+
+        # Rollups updated on insert match a backfill across the hour repeated when clocks go back
+        storage.create_table("fold")
+        timestamps = range(FOLD_START_MS - 3600000, FOLD_END_MS + 3600000, 30000)
+        rows = [(timestamp, 10.0 + (timestamp // 60000) % 7, 80.0) for timestamp in timestamps]
+        for first in range(0, len(rows), 100):
+            storage.insert("fold", rows[first : first + 100])
+
+        with connections.writer(storage.database_filepath) as conn:
+            inserted = read_rollups(conn, "fold")
+            backfill_rollups(conn, "fold")
+            assert read_rollups(conn, "fold") == inserted
+
+            # Both occurrences of 01:00-02:00 local time get their own hour buckets
+            hours = conn.execute(
+                "SELECT bucket, count FROM fold_1h WHERE bucket >= ? AND bucket < ?", (FOLD_START_MS, FOLD_END_MS)
+            ).fetchall()
+            assert hours == [(FOLD_START_MS, 120), (FOLD_START_MS + 3600000, 120)], hours
+        print("rollups across DST fold ok")
+
+        # Missing temperatures count towards neither the sum nor the mean, the bucket count still has every reading
+        storage.create_table("gaps")
+        storage.insert("gaps", [(FOLD_START_MS + 30000 * i, None if i % 2 else 10.0, 80.0) for i in range(120)])
+
+        with connections.writer(storage.database_filepath) as conn:
+            inserted = read_rollups(conn, "gaps")
+            backfill_rollups(conn, "gaps")
+            assert read_rollups(conn, "gaps") == inserted
+            assert conn.execute("SELECT count, temperature_count FROM gaps_1h").fetchall() == [(120, 60)]
+
+        means = storage.get_range(["gaps"], "0001-01-01", "9999-12-31", "1h")["gaps"]
+        assert [row[1:] for row in means] == [(10.0, 80.0)], means
+        print("rollup means skip missing readings ok")
+
+        connections.close_all()
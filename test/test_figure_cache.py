@@ -0,0 +1,51 @@
+from datetime import date, datetime, time, timedelta
+import os
+import tempfile
+
+from db_plot import PlotlyLiveServer
+from figure_cache import FigureCache
+from sensor_reading.connection import connections
+from sensor_reading.latest import LatestReadingCache
+from sensor_reading.storage import SensorStorage
+
+
+def n_points(figure, name):
+    return len(next(trace for trace in figure["data"] if trace["name"] == name)["x"])
+
+
+if __name__ == "__main__":
+    # Test figure cache revalidation, run from the repo root: PYTHONPATH=. python test/test_figure_cache.py
+    with tempfile.TemporaryDirectory() as directory:
+        server = PlotlyLiveServer()
+        server.storage = SensorStorage(os.path.join(directory, "sensors.db"))
+        server.latest_cache = LatestReadingCache(server.storage, server.sensor_ids)
+        server.figure_cache = FigureCache(
+            server.storage.database_filepath,
+            lambda start_date, end_date: server.storage.count_readings(server.sensor_ids, start_date, end_date),
+        )
+        for sensor_id in server.sensor_ids:
+            server.storage.create_table(sensor_id)
+
+        day = date.today() - timedelta(days=30)
+        start_time = datetime.combine(day, time())
+        server.storage.insert("bedroom", [(start_time + timedelta(minutes=2 * i), 20.0, 50.0) for i in range(600)])
+
+        figure = server.get_cached_figure(day, day + timedelta(days=1))
+        assert server.get_cached_figure(day, day + timedelta(days=1)) is figure
+        assert server.figure_cache.stats()["hits"] == 1
+
+        # Readings written outside a closed range keep its figure
+        server.storage.insert("bedroom", [(datetime.now() - timedelta(minutes=1), 21.0, 50.0)])
+        assert server.get_cached_figure(day, day + timedelta(days=1)) is figure
+        assert server.figure_cache.stats()["invalidations"] == 0
+        print("closed range kept after writes outside it ok")
+
+        # Late readings in a closed range, e.g. from a storage worker outage, rebuild its figure however long after
+        late_rows = [(start_time + timedelta(hours=22, minutes=2 * i), 19.0, 50.0) for i in range(10)]
+        server.storage.insert("bedroom", late_rows)
+        figure = server.get_cached_figure(day, day + timedelta(days=1))
+        assert n_points(figure, "Bedroom") == 610, n_points(figure, "Bedroom")
+        assert server.figure_cache.stats()["invalidations"] == 1
+        print("closed range rebuilt after late readings ok")
+
+        connections.close_all()
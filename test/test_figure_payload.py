@@ -0,0 +1,52 @@
+from datetime import date, datetime, time, timedelta
+import json
+import os
+import tempfile
+
+from db_plot import create_app
+from sensor_reading.connection import connections
+from sensor_reading.storage import SensorStorage
+
+FIGURE_OUTPUT = "..live-update-graph.figure...live-tail-timestamps.data.."
+
+
+if __name__ == "__main__":
+    # Test the figure sent by the date range callback, run from the repo root:
+    #     PYTHONPATH=. python test/test_figure_payload.py
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        os.mkdir("data")
+
+        day = date.today() - timedelta(days=1)
+        start_time = datetime.combine(day, time())
+        storage = SensorStorage("data/sensors.db")
+        for sensor_id in ["bedroom", "livingroom", "outside"]:
+            storage.create_table(sensor_id)
+            storage.insert(sensor_id, [(start_time + timedelta(minutes=2 * i), 20.0 + i % 5, 50.0) for i in range(720)])
+
+        client = create_app().server.test_client()
+        response = client.post(
+            "/_dash-update-component",
+            json={
+                "output": FIGURE_OUTPUT,
+                "outputs": [
+                    {"id": "live-update-graph", "property": "figure"},
+                    {"id": "live-tail-timestamps", "property": "data"},
+                ],
+                "inputs": [
+                    {"id": "my-date-picker-range", "property": "start_date", "value": str(day)},
+                    {"id": "my-date-picker-range", "property": "end_date", "value": str(date.today())},
+                ],
+                "changedPropIds": ["my-date-picker-range.start_date"],
+            },
+        )
+        assert response.status_code == 200, response.status_code
+
+        # Temperatures are sent as base64 typed arrays, not JSON lists of numbers
+        figure = json.loads(response.get_data())["response"]["live-update-graph"]["figure"]
+        for trace in figure["data"]:
+            assert set(trace["y"]) == {"dtype", "bdata"}, trace["y"]
+            assert len(trace["x"]) >= 720, len(trace["x"])
+        print("update_output sends typed arrays ok")
+
+        connections.close_all()
@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta
+import os
+import tempfile
+import time
+
+from benchmark.synthetic import SyntheticSensorDB
+from sensor_reading.connection import connections
+from sensor_reading.ingest import IngestQueue, StorageWorker, StorageWorkerProcess
+from sensor_reading.storage import SensorStorage
+
+N_READINGS = 300
+
+
+def count_stored(storage, sensor_id):
+    return len(storage.get_range([sensor_id], "0001-01-01", "9999-12-31")[sensor_id])
+
+
+def count_rollups(storage, sensor_id):
+    conn = connections.reader(storage.database_filepath)
+    return conn.execute(f"SELECT sum(count) FROM {sensor_id}_1d").fetchone()[0]
+
+
+if __name__ == "__main__":
+    # Test the ingest queue and storage worker process, run from the repo root: PYTHONPATH=. python test/test_ingest.py
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        queue_filepath, database_filepath = "ingest_queue.db", "sensors.db"
+        storage = SensorStorage(database_filepath)
+
+        # Readings are kept while no worker runs and written once one starts
+        sensor_db = SyntheticSensorDB(database_filepath)
+        sensor_db.configure_ingest_queue(IngestQueue(queue_filepath))
+        for i in range(N_READINGS):
+            sensor_db.get_new_reading()
+            time.sleep(0.002)
+
+        assert sensor_db.ingest_queue.pending() == N_READINGS
+        assert count_stored(storage, "synthetic") == 0
+
+        storage_worker = StorageWorkerProcess(queue_filepath, database_filepath, 30, 0.5, "metrics.prom", 0.2)
+        storage_worker.start()
+        time.sleep(3)
+        assert count_stored(storage, "synthetic") == N_READINGS
+        print("queued readings written once the worker starts ok")
+
+        # Killed worker is restarted and nothing published meanwhile is lost
+        for i in range(N_READINGS):
+            sensor_db.get_new_reading()
+            time.sleep(0.002)
+            if i == N_READINGS // 2:
+                storage_worker.process.kill()
+
+        storage_worker.stop()
+        assert storage_worker.n_restarts >= 1
+        assert sensor_db.ingest_queue.pending() == 0
+        assert count_stored(storage, "synthetic") == count_rollups(storage, "synthetic") == 2 * N_READINGS
+        print(f"worker restarted {storage_worker.n_restarts} time(s), no readings lost ok")
+
+        # A batch stored before a crash but not removed from the queue is skipped when replayed
+        start_time = datetime.now() + timedelta(hours=1)
+        rows = [(start_time + timedelta(seconds=i), 20.0, 50.0) for i in range(10)]
+        for row in rows:
+            sensor_db.ingest_queue.put("synthetic", row)
+        storage.insert("synthetic", rows[:5])
+
+        StorageWorker(sensor_db.ingest_queue, storage, batch_size=30).write_batch(force=True)
+        assert sensor_db.ingest_queue.pending() == 0
+        assert count_stored(storage, "synthetic") == count_rollups(storage, "synthetic") == 2 * N_READINGS + 10
+        print("replayed readings stored once ok")
+
+        # Full queue holds publishers back up to the timeout, then drops readings
+        bounded_queue = IngestQueue("bounded_queue.db", max_pending=5, publish_timeout=0.2)
+        results = [bounded_queue.put("synthetic", row) for row in rows]
+        assert results == [True] * 5 + [False] * 5, results
+        assert bounded_queue.pending() == 5
+        print("backpressure ok")
+
+        connections.close_all()
@@ -0,0 +1,79 @@
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+
+from benchmark.stub_server import DEVICES_PATH, TOKEN_PATH, start_stub_server
+from sensor_reading.nest import NestAPIDB
+from sensor_reading.oauth import TokenManager
+
+TOKEN_EXPIRES_IN = 3  # in seconds
+REFRESH_MARGIN = 1  # in seconds
+
+
+def refresh_in_process(args):
+    token_url, cache_file = args
+    token_manager = TokenManager(token_url, "stub-client", "secret", "refresh", cache_file, REFRESH_MARGIN)
+    token_manager.refresh(margin=TOKEN_EXPIRES_IN - 1)
+
+    return token_manager.access_token
+
+
+if __name__ == "__main__":
+    # Test the token manager against the local stub OAuth endpoint, run from the repo root:
+    #     PYTHONPATH=. python test/test_nest_token.py
+    server, base_url = start_stub_server(token_expires_in=TOKEN_EXPIRES_IN)
+
+    class StubNestAPIDB(NestAPIDB):
+        token_url = f"{base_url}{TOKEN_PATH}"
+        devices_url = f"{base_url}{DEVICES_PATH}"
+        token_refresh_margin = REFRESH_MARGIN
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.makedirs(os.path.join(directory, "data"))
+        os.chdir(directory)
+        with open(StubNestAPIDB.api_config_file, "w") as filewrite:
+            json.dump({"client_id": "stub-client", "client_secret": "secret", "refresh_token": "refresh"}, filewrite)
+
+        # Token is refreshed in the background before it expires, so polling never gets a 401 or waits on auth
+        nest_db = StubNestAPIDB()
+
+        poll_times = []
+        for i in range(40):
+            start_time = time.perf_counter()
+            assert nest_db.get_new_reading()
+            poll_times.append(time.perf_counter() - start_time)
+            time.sleep(0.2)
+
+        assert server.n_unauthorized == 0, server.n_unauthorized
+        assert server.n_token_requests >= 3, server.n_token_requests
+        print(f"proactive refresh ok, max poll time {max(poll_times):.4f} s", nest_db.token_manager.stats())
+        nest_db.close()
+
+        # Restarting reuses the cached token without a token request
+        n_token_requests = server.n_token_requests
+        nest_db = StubNestAPIDB()
+        assert server.n_token_requests == n_token_requests
+        assert nest_db.get_new_reading()
+        assert nest_db.token_manager.stats()["cache_loads"] == 1
+        print("cached token reused on restart ok")
+
+        # Revoked token is dropped after a 401 and replaced
+        server.tokens.clear()
+        assert not nest_db.get_new_reading()
+        assert nest_db.get_new_reading()
+        print("401 invalidates token ok", nest_db.token_manager.stats())
+        nest_db.close()
+
+        # Processes due for a refresh at the same time share one token request through the cache file lock
+        time.sleep(TOKEN_EXPIRES_IN / 2)
+        n_token_requests = server.n_token_requests
+        with multiprocessing.get_context("fork").Pool(4) as pool:
+            tokens = pool.map(refresh_in_process, [(StubNestAPIDB.token_url, "data/oauth_token.json")] * 4)
+
+        assert len(set(tokens)) == 1, tokens
+        assert server.n_token_requests == n_token_requests + 1, server.n_token_requests
+        print("shared cache across processes ok")
+
+    server.shutdown()
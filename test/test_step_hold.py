@@ -0,0 +1,65 @@
+from datetime import date, datetime, time, timedelta
+import base64
+import os
+import tempfile
+
+import numpy as np
+
+from db_plot import PlotlyLiveServer
+from sensor_reading.connection import connections
+from sensor_reading.latest import LatestReadingCache
+from sensor_reading.storage import SensorStorage
+
+
+def trace_x(figure, name):
+    trace = next(trace for trace in figure["data"] if trace["name"] == name)
+    y = np.frombuffer(base64.b64decode(trace["y"]["bdata"]), dtype=trace["y"]["dtype"])
+    return np.asarray(trace["x"], dtype="datetime64[ms]"), y
+
+
+if __name__ == "__main__":
+    # Test the held last step of change-point sensors, run from the repo root:
+    #     PYTHONPATH=. python test/test_step_hold.py
+    with tempfile.TemporaryDirectory() as directory:
+        server = PlotlyLiveServer()
+        server.storage = SensorStorage(os.path.join(directory, "sensors.db"))
+        server.latest_cache = LatestReadingCache(server.storage, server.sensor_ids)
+        for sensor_id in server.sensor_ids:
+            server.storage.create_table(sensor_id)
+
+        # Closed one-day range: the outside value last changed at 23:00 and is held to the end of the day
+        day = date.today() - timedelta(days=2)
+        start_time = datetime.combine(day, time())
+        bedroom = [(start_time + timedelta(minutes=2 * i), 20.0, 50.0) for i in range(720)]
+        outside = [(start_time + timedelta(hours=hour), 5.0 + hour, 0.0) for hour in [0, 8, 16, 23]]
+        server.storage.insert("bedroom", bedroom)
+        server.storage.insert("outside", outside)
+
+        figure = server.get_updated_figure(day, day + timedelta(days=1))
+        x, y = trace_x(figure, "Outside")
+        assert x[-1] == np.datetime64(start_time + timedelta(days=1), "ms"), x[-1]
+        assert y[-1] == 28.0
+        assert np.all(np.diff(x) >= np.timedelta64(0)), x
+        print("closed range held to its end ok")
+
+        # Open one-day range: held to the newest stored reading, not past rows the live tail appends later
+        now = datetime.now().replace(microsecond=0)
+        first_time = max(datetime.combine(date.today(), time()), now - timedelta(hours=1))
+        n_readings = int((now - first_time).total_seconds() // 30)
+        bedroom = [(first_time + timedelta(seconds=30 * i), 21.0, 50.0) for i in range(n_readings)]
+        server.storage.insert("bedroom", bedroom)
+        server.storage.insert("outside", [(first_time, 7.0, 0.0)])
+
+        figure = server.get_updated_figure(date.today(), date.today() + timedelta(days=1))
+        x, y = trace_x(figure, "Outside")
+        assert x[-1] == np.datetime64(bedroom[-1][0], "ms"), (x[-1], bedroom[-1][0])
+        assert y[-1] == 7.0
+
+        last_timestamps = server.get_latest_timestamps()
+        server.storage.insert("outside", [(now + timedelta(seconds=1), 8.0, 0.0)])
+        extension, _ = server.get_figure_extension(last_timestamps)
+        appended = np.datetime64(datetime.fromisoformat(extension[0]["x"][0][0]), "ms")
+        assert appended > x[-1], (appended, x[-1])
+        print("open range held to the newest stored reading ok")
+
+        connections.close_all()
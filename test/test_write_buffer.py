@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta
+import os
+import sqlite3
+import tempfile
+
+from sensor_reading.connection import connections
+from sensor_reading.sensor_db import BaseSensorDB
+
+
+class BufferedDB(BaseSensorDB):
+    def __init__(self, database_filepath):
+        self.database_filepath = database_filepath
+        self.sensor_id = "buffered"
+        self._create_db_table()
+
+    def get_new_reading(self) -> bool:
+        return True
+
+
+def count_stored(sensor_db):
+    return len(sensor_db.storage.get_range([sensor_db.sensor_id], "0001-01-01", "9999-12-31")[sensor_db.sensor_id])
+
+
+if __name__ == "__main__":
+    # Test keeping buffered readings while writes fail, run from the repo root:
+    #     PYTHONPATH=. python test/test_write_buffer.py
+    with tempfile.TemporaryDirectory() as directory:
+        sensor_db = BufferedDB(os.path.join(directory, "sensors.db"))
+        sensor_db.configure_write_buffer(5, 300)
+        sensor_db.write_buffer_max = 12
+        start_time = datetime.now()
+
+        # Transient errors other than a busy database keep readings buffered, up to write_buffer_max
+        insert = sensor_db.storage.insert
+
+        def failing_insert(*args, **kwargs):
+            raise sqlite3.OperationalError("disk I/O error")
+
+        sensor_db.storage.insert = failing_insert
+        for i in range(20):
+            try:
+                sensor_db._insert_reading(start_time + timedelta(seconds=i), 20.0, 50.0)
+            except sqlite3.OperationalError:
+                pass
+
+        assert len(sensor_db._write_buffer) == 12, len(sensor_db._write_buffer)
+        assert sensor_db._write_buffer[0][0] == start_time + timedelta(seconds=8), sensor_db._write_buffer[0]
+
+        # Buffered readings are written once the database recovers
+        sensor_db.storage.insert = insert
+        sensor_db.flush()
+        assert (sensor_db._write_buffer, count_stored(sensor_db)) == ([], 12)
+        print("readings kept through write errors ok")
+
+        sensor_db.close()
+        connections.close_all()
@@ -0,0 +1,10 @@
+"""
+WSGI entry point for serving the dashboard with multiple worker processes:
+    gunicorn -c gunicorn.conf.py wsgi:server
+"""
+
+from dashboard_config import load_config
+from db_plot import create_app
+
+app = create_app(load_config())
+server = app.server